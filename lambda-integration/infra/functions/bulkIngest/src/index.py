@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Lambda functions that onboard the employees listed in a file (CSV or JSONL) dropped in S3
+
+``handler`` is triggered when a file is uploaded. The file is read with ranged GETs and processed
+by a pipeline of generators (lines, rows, validated registrations), so the memory used does not
+depend on the size of the file. Valid registrations are written to chunks of CHUNK_SIZE rows, the
+invalid ones to error files, and an output manifest lists them with the counts. The chunks are
+then passed to the Map state of the bulk onboarding state machine (BULK_STATE_MACHINE_ARN), which
+calls ``start_chunk_handler`` to start the account creation workflow of each row of a chunk.
+Bulk registrations have no WebSocket client: they are started with the BULK_CONNECTION_ID sentinel,
+which notifyUser does not notify, and their outcome is read from the executions listed in the results.
+S3 events and the chunk invocations can be delivered more than once: executions are named after the
+file (bulk) and the request id of each row (workflow), so a duplicate does not start them again.
+"""
+import os
+import csv
+import codecs
+import uuid
+from urllib.parse import unquote_plus
+import boto3
+from botocore.config import Config
+from aws_lambda_powertools import Tracer
+from aws_lambda_powertools import Logger
+from common import serialization
+from common import schema
+
+logger = Logger()
+tracer = Tracer()
+
+# Fields of a registration passed to the workflow (same as startWorkflow, without the WebSocket connection)
+FIELDS = ('firstname', 'lastname', 'birthdate', 'countrybirth', 'country', 'postalcode', 'city',
+          'street', 'email', 'idcard')
+
+# connection of the bulk registrations, skipped by notifyUser (same value in notifyUser)
+BULK_CONNECTION_ID = 'bulk'
+
+if 'CHUNK_SIZE' in os.environ and os.environ['CHUNK_SIZE']:
+    CHUNK_SIZE = int(os.environ['CHUNK_SIZE'])
+else:
+    CHUNK_SIZE = 500
+
+# size of the ranged GETs
+READ_SIZE = 1024 * 1024
+
+OUTPUT_PREFIX = os.environ.get('OUTPUT_PREFIX', 'output/')
+BULK_STATE_MACHINE_ARN = os.environ.get('BULK_STATE_MACHINE_ARN')
+STATE_MACHINE_ARN = os.environ.get('STATE_MACHINE_ARN')
+
+s3 = boto3.client('s3')
+sfn = boto3.client('stepfunctions', config=Config(retries={'mode': 'adaptive', 'max_attempts': 10}))
+
+@tracer.capture_lambda_handler(capture_response=False)
+@logger.inject_lambda_context
+def handler(event, _):
+    """Ingest the files of an S3 event notification, return their manifests"""
+    manifests = []
+    for record in event['Records']:
+        bucket = record['s3']['bucket']['name']
+        key = unquote_plus(record['s3']['object']['key'])
+        manifest = ingest(bucket, key)
+        if BULK_STATE_MACHINE_ARN and manifest['chunks']:
+            source = manifest['source']
+            start_execution(
+                BULK_STATE_MACHINE_ARN,
+                str(uuid.uuid5(uuid.NAMESPACE_URL, f"s3://{source['bucket']}/{source['key']}#{source['etag']}")),
+                {'manifest': manifest['manifest'], 'chunks': manifest['chunks']}
+            )
+        manifests.append(manifest)
+    return manifests
+
+@tracer.capture_lambda_handler(capture_response=False)
+@logger.inject_lambda_context
+def start_chunk_handler(event, _):
+    """Start the workflow of each registration of a chunk, write the execution (or error) of each one next to it"""
+    if not STATE_MACHINE_ARN:
+        raise RuntimeError('STATE_MACHINE_ARN env var is not set')
+    results = ChunkWriter(event['bucket'], event['key'].replace('/chunks/', '/results/'), size=0)
+    started = 0
+    for line in read_lines(event['bucket'], event['key']):
+        registration = serialization.loads(line)
+        registration['connectionId'] = BULK_CONNECTION_ID
+        try:
+            execution_arn = start_execution(STATE_MACHINE_ARN, registration['requestId'], registration)
+            results.add({'requestId': registration['requestId'], 'executionArn': execution_arn})
+            started += 1
+        except Exception as error:
+            logger.exception(error)
+            results.add({'requestId': registration['requestId'], 'error': str(error)})
+    results.flush()
+    return {'key': event['key'], 'started': started, 'failed': results.rows - started}
+
+def start_execution(state_machine_arn, name, execution_input):
+    """Start a named execution, return its ARN (also when it has already been started)"""
+    try:
+        return sfn.start_execution(stateMachineArn=state_machine_arn, name=name,
+                                   input=serialization.dumps(execution_input))['executionArn']
+    except sfn.exceptions.ExecutionAlreadyExists:
+        logger.info({'alreadyStarted': name})
+        return state_machine_arn.replace(':stateMachine:', ':execution:') + ':' + name
+
+def ingest(bucket, key):
+    """Split a bulk onboarding file in chunks of valid registrations and error files, return its manifest"""
+    head = s3.head_object(Bucket=bucket, Key=key)
+    prefix = OUTPUT_PREFIX + key + '/'
+    chunks = ChunkWriter(bucket, prefix + 'chunks/')
+    errors = ChunkWriter(bucket, prefix + 'errors/')
+
+    for line_number, registration, problems in validate(parse(key, read_lines(bucket, key, head))):
+        if problems:
+            errors.add({'line': line_number, 'errors': problems, 'row': registration})
+        else:
+            registration['requestId'] = str(uuid.uuid5(uuid.NAMESPACE_URL,
+                                                       f"s3://{bucket}/{key}#{head['ETag']}:{line_number}"))
+            chunks.add(registration)
+    chunks.flush()
+    errors.flush()
+
+    manifest = {
+        'source': {'bucket': bucket, 'key': key, 'etag': head['ETag'], 'size': head['ContentLength']},
+        'manifest': {'bucket': bucket, 'key': prefix + 'manifest.json'},
+        'rows': chunks.rows + errors.rows,
+        'valid': chunks.rows,
+        'invalid': errors.rows,
+        'chunks': chunks.written,
+        'errors': errors.written,
+        'results': prefix + 'results/'
+    }
+    s3.put_object(Bucket=bucket, Key=prefix + 'manifest.json', Body=serialization.dumps(manifest).encode('utf-8'),
+                  ContentType='application/json')
+    logger.info({'source': manifest['source'], 'valid': manifest['valid'], 'invalid': manifest['invalid'],
+                 'chunks': len(manifest['chunks'])})
+    return manifest
+
+def read_lines(bucket, key, head=None):
+    """Lines of an S3 object (with their line break), read with ranged GETs of READ_SIZE bytes"""
+    head = head or s3.head_object(Bucket=bucket, Key=key)
+    size = head['ContentLength']
+    rest = b''
+    for start in range(0, size, READ_SIZE):
+        body = s3.get_object(Bucket=bucket, Key=key, IfMatch=head['ETag'],
+                             Range=f'bytes={start}-{min(start + READ_SIZE, size) - 1}')['Body'].read()
+        if start == 0 and body.startswith(codecs.BOM_UTF8):
+            body = body[len(codecs.BOM_UTF8):]
+        lines = (rest + body).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8') + '\n'
+    if rest:
+        yield rest.decode('utf-8')
+
+def parse(key, lines):
+    """(line number, row) of a CSV (with a header) or JSONL file"""
+    if key.lower().endswith('.csv'):
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif key.lower().endswith(('.jsonl', '.ndjson')):
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = serialization.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else {'$invalid': line.strip()[:200]}
+    else:
+        raise ValueError(f'Unsupported file type: {key}, must be .csv or .jsonl')
+
+def validate(rows):
+    """(line number, registration, list of problems) of each row"""
+    for line_number, row in rows:
+        if '$invalid' in row:
+            yield line_number, row, ['invalid JSON object']
+            continue
+        registration = {field: str(row[field]).strip() for field in FIELDS if row.get(field) is not None}
+        yield line_number, registration, schema.registration.errors(registration)
+
+class ChunkWriter:
+    """Write JSONL objects of `size` rows (CHUNK_SIZE by default) under a prefix
+
+    With a size of 0, all the rows are written in a single object named prefix.
+    """
+
+    def __init__(self, bucket, prefix, size=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.size = CHUNK_SIZE if size is None else size
+        self.buffer = []
+        self.rows = 0
+        self.written = []
+
+    def add(self, item):
+        self.buffer.append(serialization.dumps(item))
+        self.rows += 1
+        if self.size and len(self.buffer) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        key = f'{self.prefix}{len(self.written):05d}.jsonl' if self.size else self.prefix
+        s3.put_object(Bucket=self.bucket, Key=key, Body='\n'.join(self.buffer).encode('utf-8'),
+                      ContentType='application/x-ndjson')
+        self.written.append({'bucket': self.bucket, 'key': key, 'rows': len(self.buffer)})
+        self.buffer = []
@@ -0,0 +1,172 @@
+import io
+import os
+import json
+import tracemalloc
+from unittest import mock
+from importlib import reload
+from dataclasses import dataclass
+import boto3
+import pytest
+from moto import mock_aws
+
+BUCKET = 'bulk'
+
+REGISTRATION = {
+    'firstname': 'Corinne', 'lastname': 'Berthier', 'birthdate': '1965-12-06', 'countrybirth': 'FR',
+    'country': 'FR', 'postalcode': '80000', 'city': 'Amiens', 'street': '8 Boulevard du Port',
+    'email': 'corinne.berthier@example.com', 'idcard': 'employees/berthier.jpeg'
+}
+
+@pytest.fixture
+def lambda_context():
+    """ mock Lambda context """
+    @dataclass
+    class LambdaContext:
+        function_name: str = "test"
+        memory_limit_in_mb: int = 128
+        invoked_function_arn: str = "arn:aws:lambda:eu-west-1:809313241:function:test"
+        aws_request_id: str = "52fdfc07-2182-154f-163f-5f0f9a621d72"
+
+    return LambdaContext()
+
+@pytest.fixture
+def index():
+    with mock.patch.dict(os.environ, {'AWS_DEFAULT_REGION': 'eu-west-1', 'CHUNK_SIZE': '3'}, clear=True), mock_aws():
+        from src import index
+        index = reload(index) # clients created in the mock
+        index.s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'})
+        yield index
+
+def s3_event(key):
+    return {'Records': [{'s3': {'bucket': {'name': BUCKET}, 'object': {'key': key}}}]}
+
+def read_jsonl(index, key):
+    body = index.s3.get_object(Bucket=BUCKET, Key=key)['Body'].read().decode('utf-8')
+    return [json.loads(line) for line in body.splitlines()]
+
+def csv_file(rows):
+    header = ','.join(REGISTRATION.keys())
+    return '\n'.join([header] + [','.join(f'"{row.get(field, "")}"' for field in REGISTRATION) for row in rows]) + '\n'
+
+def test_csv_file_should_be_split_in_chunks_and_errors(index, lambda_context):
+    rows = [dict(REGISTRATION, email=f'employee{i}@example.com') for i in range(7)]
+    rows[2]['idcard'] = ''
+    rows[5]['street'] = '8 Boulevard du Port\nBâtiment B' # quoted line break
+    index.s3.put_object(Bucket=BUCKET, Key='incoming/acme+corp.csv', Body=('﻿' + csv_file(rows)).encode('utf-8'))
+
+    manifest = index.handler(s3_event('incoming/acme%2Bcorp.csv'), lambda_context)[0]
+
+    assert (manifest['rows'], manifest['valid'], manifest['invalid']) == (7, 6, 1)
+    assert [chunk['rows'] for chunk in manifest['chunks']] == [3, 3]
+    first = read_jsonl(index, manifest['chunks'][0]['key'])
+    assert first[0]['firstname'] == 'Corinne' and first[0]['requestId']
+    assert read_jsonl(index, manifest['chunks'][1]['key'])[1]['street'] == '8 Boulevard du Port\nBâtiment B'
+    errors = read_jsonl(index, manifest['errors'][0]['key'])
+    assert errors == [{'line': 4, 'errors': ['idcard is required'], 'row': mock.ANY}]
+    stored = json.loads(index.s3.get_object(Bucket=BUCKET, Key=manifest['manifest']['key'])['Body'].read())
+    assert stored == manifest
+
+def test_jsonl_file_should_report_invalid_lines(index, lambda_context):
+    lines = [json.dumps(REGISTRATION), '{"firstname": "Corinne"', '', json.dumps(dict(REGISTRATION, unexpected='x'))]
+    index.s3.put_object(Bucket=BUCKET, Key='incoming/acme.jsonl', Body='\n'.join(lines).encode('utf-8'))
+
+    manifest = index.handler(s3_event('incoming/acme.jsonl'), lambda_context)[0]
+
+    assert (manifest['valid'], manifest['invalid']) == (2, 1)
+    assert read_jsonl(index, manifest['errors'][0]['key'])[0]['errors'] == ['invalid JSON object']
+    # unknown fields are not passed to the workflow
+    assert 'unexpected' not in read_jsonl(index, manifest['chunks'][0]['key'])[1]
+
+def test_request_ids_should_be_stable_for_the_same_file(index, lambda_context):
+    index.s3.put_object(Bucket=BUCKET, Key='incoming/acme.csv', Body=csv_file([REGISTRATION]).encode('utf-8'))
+
+    first = index.ingest(BUCKET, 'incoming/acme.csv')
+    second = index.ingest(BUCKET, 'incoming/acme.csv')
+
+    assert read_jsonl(index, first['chunks'][0]['key']) == read_jsonl(index, second['chunks'][0]['key'])
+
+def test_unsupported_file_should_raise_error(index, lambda_context):
+    index.s3.put_object(Bucket=BUCKET, Key='incoming/acme.xlsx', Body=b'PK')
+    with pytest.raises(ValueError, match=r"Unsupported file type.*"):
+        index.handler(s3_event('incoming/acme.xlsx'), lambda_context)
+
+def test_lines_should_be_read_across_ranges(index):
+    with mock.patch.object(index, 'READ_SIZE', 7):
+        index.s3.put_object(Bucket=BUCKET, Key='lines.txt', Body='première ligne\n\nderniÈre'.encode('utf-8'))
+        assert list(index.read_lines(BUCKET, 'lines.txt')) == ['première ligne\n', '\n', 'derniÈre']
+        index.s3.put_object(Bucket=BUCKET, Key='empty.txt', Body=b'')
+        assert not list(index.read_lines(BUCKET, 'empty.txt'))
+
+def test_chunks_should_start_the_bulk_state_machine_then_the_workflows(index, lambda_context):
+    sfn = index.sfn
+    role = 'arn:aws:iam::123456789012:role/sfn'
+    definition = json.dumps({'StartAt': 'Done', 'States': {'Done': {'Type': 'Succeed'}}})
+    bulk = sfn.create_state_machine(name='bulk', definition=definition, roleArn=role)['stateMachineArn']
+    workflow = sfn.create_state_machine(name='workflow', definition=definition, roleArn=role)['stateMachineArn']
+    index.s3.put_object(Bucket=BUCKET, Key='incoming/acme.csv', Body=csv_file([REGISTRATION] * 4).encode('utf-8'))
+
+    with mock.patch.object(index, 'BULK_STATE_MACHINE_ARN', bulk), \
+         mock.patch.object(index, 'STATE_MACHINE_ARN', workflow):
+        manifest = index.handler(s3_event('incoming/acme.csv'), lambda_context)[0]
+        execution = sfn.list_executions(stateMachineArn=bulk)['executions'][0]
+        chunks = json.loads(sfn.describe_execution(executionArn=execution['executionArn'])['input'])['chunks']
+        results = [index.start_chunk_handler(chunk, lambda_context) for chunk in chunks]
+
+    assert chunks == manifest['chunks']
+    assert [result['started'] for result in results] == [3, 1]
+    executions = sfn.list_executions(stateMachineArn=workflow)['executions']
+    assert len(executions) == 4
+    execution_input = json.loads(sfn.describe_execution(executionArn=executions[0]['executionArn'])['input'])
+    assert execution_input['connectionId'] == index.BULK_CONNECTION_ID
+    started = read_jsonl(index, manifest['results'] + '00000.jsonl')
+    assert all(result['executionArn'] for result in started)
+
+def test_redelivered_events_should_not_start_executions_again(index, lambda_context):
+    sfn = index.sfn
+    role = 'arn:aws:iam::123456789012:role/sfn'
+    definition = json.dumps({'StartAt': 'Done', 'States': {'Done': {'Type': 'Succeed'}}})
+    bulk = sfn.create_state_machine(name='bulk', definition=definition, roleArn=role)['stateMachineArn']
+    workflow = sfn.create_state_machine(name='workflow', definition=definition, roleArn=role)['stateMachineArn']
+    index.s3.put_object(Bucket=BUCKET, Key='incoming/acme.csv', Body=csv_file([REGISTRATION] * 2).encode('utf-8'))
+
+    with mock.patch.object(index, 'BULK_STATE_MACHINE_ARN', bulk), \
+         mock.patch.object(index, 'STATE_MACHINE_ARN', workflow):
+        manifest = index.handler(s3_event('incoming/acme.csv'), lambda_context)[0]
+        index.handler(s3_event('incoming/acme.csv'), lambda_context)
+        results = [index.start_chunk_handler(manifest['chunks'][0], lambda_context) for _ in range(2)]
+
+    assert len(sfn.list_executions(stateMachineArn=bulk)['executions']) == 1
+    assert [result['started'] for result in results] == [2, 2]
+    executions = sfn.list_executions(stateMachineArn=workflow)['executions']
+    assert sorted(execution['name'] for execution in executions) == sorted(row['requestId'] for row in read_jsonl(index, manifest['chunks'][0]['key']))
+
+class RangeServer:
+    """Serve the ranged GETs of an object without copying it (moto reads the whole object for each range)"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def head_object(self, **_):
+        return {'ContentLength': len(self.data), 'ETag': '"etag"'}
+
+    def get_object(self, Range, **_):
+        start, end = (int(position) for position in Range[len('bytes='):].split('-'))
+        return {'Body': io.BytesIO(self.data[start:end + 1])}
+
+    def put_object(self, **_):
+        return {}
+
+def test_memory_should_not_depend_on_file_size(index):
+    """Peak memory of the ingestion of a file 10 times bigger (run with -s to see the results)"""
+    peaks = []
+    line = json.dumps(REGISTRATION) + '\n'
+    for count in (2000, 20000):
+        server = RangeServer((line * count).encode('utf-8'))
+        tracemalloc.start()
+        with mock.patch.object(index, 'READ_SIZE', 64 * 1024), mock.patch.object(index, 'CHUNK_SIZE', 500), \
+             mock.patch.object(index, 's3', server):
+            index.ingest(BUCKET, f'incoming/{count}.jsonl')
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        print(f'\n{count} rows, {len(server.data) / 1e6:.1f} MB: peak {peaks[-1] / 1e6:.2f} MB')
+    assert peaks[1] < 2 * peaks[0]
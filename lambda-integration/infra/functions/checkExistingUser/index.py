@@ -12,14 +12,26 @@
 # NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
 # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-"""Lambda function that lookups for a user in DynamoDB table, throw an error if (s)he exists"""
+"""Lambda function that lookups for a user in DynamoDB table, throw an error if (s)he exists
+
+A user with the same name (``fullname`` index) always exists. With FUZZY_MATCHING, the users
+sharing the phonetic key of the name (``phonetic`` index, see common.phonetic) are also ranked: a
+user with the same normalized name exists, the similar ones are returned as ``duplicateCandidates``
+for the fraud review. The users stored without a phonetic key are only found by the exact lookup.
+
+With PRIME_CONNECTIONS, the connection to DynamoDB is opened in the init phase (see common.priming).
+"""
 import os
 import boto3
 from aws_lambda_powertools import Tracer
 from aws_lambda_powertools import Logger
 from boto3.dynamodb.conditions import Key
+from common import eventlog
+from common import phonetic
+from common import priming
 
 logger = Logger()
+event_log = eventlog.from_env(logger)
 tracer = Tracer()
 
 ddb = boto3.resource('dynamodb')
@@ -30,11 +42,27 @@ if 'USER_TABLE' not in os.environ or os.environ['USER_TABLE'] is None:
 USER_TABLE = os.environ['USER_TABLE']
 table = ddb.Table(USER_TABLE)
 
+FUZZY_MATCHING = os.environ.get('FUZZY_MATCHING', 'false').lower() == 'true'
+
+if 'SIMILARITY_THRESHOLD' in os.environ and os.environ['SIMILARITY_THRESHOLD']:
+    SIMILARITY_THRESHOLD = float(os.environ['SIMILARITY_THRESHOLD'])
+else:
+    SIMILARITY_THRESHOLD = 0.8
+
+# connection of the first invocation, opened in the init phase (PRIME_CONNECTIONS) or by a warm-up event
+primer = priming.from_env(logger).add('userTable', lambda: table.query(
+    IndexName='fullname',
+    Select='COUNT',
+    Limit=1,
+    KeyConditionExpression=Key('lastname').eq('priming') & Key('firstname').eq('priming'),
+)).init()
+
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler()
+@event_log.capture
+@primer.warmup
 def handler(event, _):
     """Check if a user already exists in the dynamodb table"""
-
     response = table.query(
         Select='SPECIFIC_ATTRIBUTES',
         IndexName='fullname',
@@ -45,4 +73,36 @@ def handler(event, _):
     if response['Count'] > 0:
         raise ValueError('User already exists')
 
+    if FUZZY_MATCHING:
+        return check_similar_users(event)
+
+    event['duplicateCandidates'] = []
+    return event
+
+def check_similar_users(event):
+    """Rank the users with the same phonetic key, raise an error if one has the same name"""
+    query = {
+        'IndexName': 'phonetic',
+        'ProjectionExpression': 'id, lastname, firstname, birthdate',
+        'KeyConditionExpression': Key('name_key').eq(phonetic.name_key(event['lastname'], event['firstname']))
+    }
+    users = []
+    while True:
+        response = table.query(**query)
+        users.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    candidates = phonetic.rank(event['lastname'], event['firstname'], users, SIMILARITY_THRESHOLD)
+    if candidates and candidates[0]['score'] == 1.0:
+        raise ValueError('User already exists')
+
+    if candidates:
+        logger.info({'duplicateCandidates': [candidate['id'] for candidate in candidates]})
+    event['duplicateCandidates'] = [{
+        'id': candidate['id'],
+        'score': candidate['score'],
+        'sameBirthdate': candidate.get('birthdate') == event.get('birthdate')
+    } for candidate in candidates]
     return event
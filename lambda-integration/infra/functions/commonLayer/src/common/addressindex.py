@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Local index of the French addresses, built from the BAN (Base Adresse Nationale) dataset
+
+``build`` compiles the BAN CSV files (https://adresse.data.gouv.fr/data/ban/adresses/latest/csv)
+into a single file, opened with ``AddressIndex`` through a read-only memory map, so a container
+only pages in the postcodes it looks up. The file holds fixed-size little-endian sections:
+
+ * postcodes: sorted (postcode, first street, end street, first posting, end posting) records,
+ * streets: (name offset, name length, city offset, city length, first number, number count),
+ * numbers: sorted house numbers of each street (number * 32 + suffix code),
+ * postings: sorted (trigram << 32 | street) entries of each postcode, the street trigram index,
+ * strings: street and city names (UTF-8).
+
+``AddressIndex.search`` returns a response in the same shape as the address API (``features`` with
+a ``label`` and a ``score`` between 0 and 1), so the same threshold applies to both. A house number
+that is not in the index is left out of the label and caps the score, so the address is not
+verified locally (the address API is called instead).
+
+Build an index with ``python -m common.addressindex adresses-80.csv.gz [...] ban.idx``.
+"""
+import re
+import sys
+import csv
+import gzip
+import mmap
+import time
+import bisect
+import struct
+import unicodedata
+from array import array
+
+MAGIC = b'BANIDX01'
+SECTIONS = ('postcodes', 'streets', 'numbers', 'postings', 'strings')
+HEADER = struct.Struct('<8s' + 'QQ' * len(SECTIONS))
+POSTCODE_FIELDS = 5
+STREET_FIELDS = 6
+
+SUFFIXES = ['', 'bis', 'ter', 'quater', 'quinquies'] + [chr(code) for code in range(ord('a'), ord('z') + 1)]
+SUFFIX_CODES = {suffix: code for code, suffix in enumerate(SUFFIXES)}
+
+ABBREVIATIONS = {
+    'av': 'avenue', 'ave': 'avenue', 'bd': 'boulevard', 'bld': 'boulevard', 'bvd': 'boulevard',
+    'ch': 'chemin', 'che': 'chemin', 'crs': 'cours', 'imp': 'impasse', 'pl': 'place', 'r': 'rue',
+    'rte': 'route', 'sq': 'square', 'st': 'saint', 'ste': 'sainte', 'all': 'allee', 'fg': 'faubourg'
+}
+# 'r' is rather the abbreviation of 'rue' than a suffix
+NUMBER = re.compile(r'^\s*(\d+)\s*('
+                    + '|'.join(sorted(set(SUFFIXES[1:]) - set(ABBREVIATIONS), key=len, reverse=True))
+                    + r')?\b[\s,]*(.*)$', re.IGNORECASE)
+
+# weight of each part in the score
+STREET_WEIGHT = 0.7
+CITY_WEIGHT = 0.15
+NUMBER_WEIGHT = 0.15
+# score of a street without the house number of the query, below any sensible confidence threshold
+UNKNOWN_NUMBER_SCORE = 0.5
+# candidates fully scored, among the streets sharing the most trigrams with the query
+CANDIDATES = 5
+
+def normalize(text):
+    """Lower case, without accents and punctuation, with the usual abbreviations expanded"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char if char.isalnum() else ' ' for char in text if not unicodedata.combining(char))
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in text.split())
+
+def trigrams(normalized):
+    """Set of the trigrams of a normalized text, encoded as integers"""
+    padded = (' ' + normalized + ' ').encode('ascii', 'ignore')
+    return {padded[i] << 16 | padded[i + 1] << 8 | padded[i + 2] for i in range(len(padded) - 2)}
+
+def similarity(first, second):
+    """Dice coefficient of two trigram sets"""
+    if not first or not second:
+        return 0.0
+    return 2 * len(first & second) / (len(first) + len(second))
+
+def encode_number(number, suffix=''):
+    """House number and suffix (bis, ter, letter...) as a single sortable integer"""
+    return int(number) * 32 + SUFFIX_CODES[suffix.strip().lower()]
+
+def format_number(code):
+    suffix = SUFFIXES[code % 32]
+    return str(code // 32) + (' ' + suffix if suffix else '')
+
+def split_street(street):
+    """Split '8 bis Boulevard du Port' into the encoded number (or None) and the street name"""
+    match = NUMBER.match(street)
+    if match is None:
+        return None, street
+    return encode_number(match.group(1), match.group(2) or ''), match.group(3)
+
+def read_rows(source):
+    """Rows of a BAN CSV file (optionally gzipped)"""
+    opener = gzip.open if source.endswith('.gz') else open
+    with opener(source, 'rt', encoding='utf-8', newline='') as file:
+        yield from csv.DictReader(file, delimiter=';')
+
+def build(sources, path):
+    """Compile BAN CSV files into an index file, return the number of addresses indexed"""
+    postcodes = {}
+    count = 0
+    for source in sources:
+        for row in read_rows(source):
+            try:
+                number = encode_number(row['numero'], row.get('rep') or '')
+                postcode = int(row['code_postal'])
+            except (KeyError, ValueError):
+                continue
+            streets = postcodes.setdefault(postcode, {})
+            streets.setdefault((row['nom_voie'], row['nom_commune']), set()).add(number)
+            count += 1
+
+    sections = {name: array('I') for name in ('postcodes', 'streets', 'numbers')}
+    postings = array('Q')
+    strings = bytearray()
+    offsets = {}
+
+    def store(text):
+        if text not in offsets:
+            offsets[text] = len(strings)
+            strings.extend(text.encode('utf-8'))
+        return offsets[text], len(text.encode('utf-8'))
+
+    street_id = 0
+    for postcode in sorted(postcodes):
+        first_street, first_posting = street_id, len(postings)
+        entries = set()
+        for (name, city), numbers in sorted(postcodes[postcode].items()):
+            sections['streets'].extend(store(name) + store(city) + (len(sections['numbers']), len(numbers)))
+            sections['numbers'].extend(sorted(numbers))
+            entries.update(trigram << 32 | street_id for trigram in trigrams(normalize(name)))
+            street_id += 1
+        postings.extend(sorted(entries))
+        sections['postcodes'].extend((postcode, first_street, street_id, first_posting, len(postings)))
+
+    sections['postings'] = postings
+    sections['strings'] = strings
+    with open(path, 'wb') as file:
+        file.write(b'\0' * HEADER.size)
+        positions = []
+        for name in SECTIONS:
+            data = bytes(sections[name]) if name == 'strings' else sections[name].tobytes()
+            file.write(b'\0' * (-file.tell() % 8))  # sections are aligned on 8 bytes
+            positions.extend((file.tell(), len(data)))
+            file.write(data)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, *positions))
+    return count
+
+class AddressIndex:
+    """Read-only view of an index file built with ``build``"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = HEADER.unpack_from(self.map)
+        if header[0] != MAGIC:
+            raise ValueError(f'{path} is not an address index')
+        view = memoryview(self.map)
+        sections = {}
+        for position, name in enumerate(SECTIONS):
+            offset, length = header[1 + 2 * position], header[2 + 2 * position]
+            section = view[offset:offset + length]
+            sections[name] = section if name == 'strings' else section.cast('Q' if name == 'postings' else 'I')
+        self.postcodes = sections['postcodes']
+        self.postcode_keys = self.postcodes[::POSTCODE_FIELDS]
+        self.streets = sections['streets']
+        self.numbers = sections['numbers']
+        self.postings = sections['postings']
+        self.strings = sections['strings']
+
+    def search(self, street, postcode, city):
+        """Best matching address of the postcode, in the same shape as the address API response"""
+        try:
+            postcode_key = int(postcode)
+        except ValueError:
+            return {'features': []}
+        position = bisect.bisect_left(self.postcode_keys, postcode_key)
+        if position == len(self.postcode_keys) or self.postcode_keys[position] != postcode_key:
+            return {'features': []}
+        record = POSTCODE_FIELDS * position
+        first_street, end_street, first_posting, end_posting = self.postcodes[record + 1:record + POSTCODE_FIELDS]
+
+        number, name = split_street(street)
+        query = trigrams(normalize(name))
+        hits = self._count_hits(query, first_posting, end_posting, end_street - first_street)
+        candidates = sorted(hits, key=hits.get, reverse=True)[:CANDIDATES]
+
+        best = None
+        normalized_city = trigrams(normalize(city))
+        for candidate in candidates:
+            street_name, city_name, street_number, number_score = self._street(candidate, number)
+            score = (STREET_WEIGHT * similarity(query, trigrams(normalize(street_name)))
+                     + CITY_WEIGHT * similarity(normalized_city, trigrams(normalize(city_name)))
+                     + NUMBER_WEIGHT * number_score)
+            if number is not None and street_number is None:
+                score = min(score, UNKNOWN_NUMBER_SCORE)
+            if best is None or score > best['score']:
+                label = ' '.join(filter(None, (street_number, street_name, f'{postcode_key:05d}', city_name)))
+                best = {'label': label, 'score': score, 'street': street_name, 'postcode': f'{postcode_key:05d}',
+                        'city': city_name, 'housenumber': street_number}
+        return {'features': [] if best is None else [{'properties': best}]}
+
+    def _count_hits(self, query, first_posting, end_posting, street_count):
+        """Number of query trigrams of each street, trigrams shared by most streets (e.g. 'rue') are skipped"""
+        ranges = []
+        for trigram in query:
+            start = bisect.bisect_left(self.postings, trigram << 32, first_posting, end_posting)
+            end = bisect.bisect_left(self.postings, (trigram + 1) << 32, start, end_posting)
+            if end > start:
+                ranges.append((start, end))
+        common = max(8, street_count // 4)
+        selective = [(start, end) for start, end in ranges if end - start <= common] or ranges
+        hits = {}
+        for start, end in selective:
+            for entry in self.postings[start:end]:
+                street_id = entry & 0xFFFFFFFF
+                hits[street_id] = hits.get(street_id, 0) + 1
+        return hits
+
+    def _street(self, street_id, number):
+        """Name, city, matched house number (label part, None if not in the index) and number score of a street"""
+        record = STREET_FIELDS * street_id
+        name_offset, name_length, city_offset, city_length, first_number, number_count = \
+            self.streets[record:record + STREET_FIELDS]
+        name = str(self.strings[name_offset:name_offset + name_length], 'utf-8')
+        city = str(self.strings[city_offset:city_offset + city_length], 'utf-8')
+        if number is None:
+            return name, city, None, 0.5
+        end = first_number + number_count
+        exact = bisect.bisect_left(self.numbers, number, first_number, end)
+        if exact < end and self.numbers[exact] == number:
+            return name, city, format_number(number), 1.0
+        # unknown number, or known with another suffix (e.g. 8 bis instead of 8)
+        return name, city, None, 0.0
+
+    def close(self):
+        self.streets = self.numbers = self.postings = self.strings = self.postcodes = self.postcode_keys = None
+        self.map.close()
+
+def main(args):
+    if len(args) < 2:
+        print('usage: python -m common.addressindex <ban csv file>... <index file>', file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    count = build(args[:-1], args[-1])
+    print(f'{count} addresses indexed in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Circuit breaker around a slow or failing dependency, with its state shared by all the containers
+
+The state (closed, open or half open) is stored in a DynamoDB item and cached for ``refresh``
+seconds by each container. Calls and failures are counted per window of ``window`` seconds with
+atomic counters. Failures and slow calls are written at once, healthy calls are counted locally and
+written with them, or every ``batch`` calls or ``batch_interval`` seconds, so a closed circuit does
+not cost a write per call. When the error rate or the slow call rate of a window reaches its
+threshold, the circuit opens and calls are rejected with ``CircuitOpen`` without reaching the
+dependency. After ``cooldown`` seconds, a single container gets to send a probe (half open): its
+success closes the circuit, its failure opens it again. Every transition is published as a metric.
+The errors ``is_failure`` rejects (e.g. invalid input) count as healthy calls. ``check`` lets the
+callers skip their own costs (e.g. a rate limiter token) while the circuit is open.
+"""
+import os
+import time
+import uuid
+import boto3
+from aws_lambda_powertools.metrics import MetricUnit
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# metric published on each transition
+TRANSITION_METRICS = {
+    OPEN: 'CircuitOpened',
+    HALF_OPEN: 'CircuitHalfOpened',
+    CLOSED: 'CircuitClosed'
+}
+
+class CircuitOpen(Exception):
+    """Call rejected without calling the dependency (error name used by the workflow)"""
+
+class CircuitBreaker:
+    """Circuit breaker whose state is shared through a DynamoDB table (partition key 'circuit')"""
+
+    def __init__(self, table, name, error_rate=0.5, slow_rate=0.5, slow_call=1.0, min_calls=10,
+                 window=10, cooldown=30, refresh=1.0, batch=10, batch_interval=1.0, is_failure=None,
+                 metrics=None, clock=time.time):
+        self.table = table
+        self.name = name
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_call = slow_call
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.refresh = refresh
+        self.batch = batch
+        self.batch_interval = batch_interval
+        self.is_failure = is_failure or (lambda error: True)
+        self.metrics = metrics
+        self.clock = clock
+        self.state = CLOSED
+        self.until = 0
+        self.checked_at = None
+        # healthy calls not written yet, and the counters item they belong to
+        self.successes = 0
+        self.successes_key = None
+        self.written_at = clock()
+
+    def call(self, function, *args, **kwargs):
+        """Call function if the circuit allows it and record the outcome, raise CircuitOpen otherwise"""
+        probe = self.before()
+        start = self.clock()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as error:
+            self.after(probe, not self.is_failure(error), self.clock() - start)
+            raise
+        self.after(probe, True, self.clock() - start)
+        return result
+
+    def check(self):
+        """Raise CircuitOpen if the circuit rejects calls, without taking the half open probe"""
+        now = self.clock()
+        if self.checked_at is None or now - self.checked_at >= self.refresh:
+            self._load(now)
+        if self.state != CLOSED and now < self.until:
+            self._metric('CircuitRejected')
+            raise CircuitOpen(f'Circuit open for {self.name}, retry later')
+
+    def before(self):
+        """Check the circuit before a call, return the probe id if this call is the half open probe"""
+        now = self.clock()
+        if self.checked_at is None or now - self.checked_at >= self.refresh:
+            self._load(now)
+        if self.state == CLOSED:
+            return None
+        # cooldown is over, or the previous probe never reported back
+        if now >= self.until:
+            probe = str(uuid.uuid4())
+            if self._transition(HALF_OPEN, now + self.cooldown, now, probe=probe):
+                return probe
+        self._metric('CircuitRejected')
+        raise CircuitOpen(f'Circuit open for {self.name}, retry later')
+
+    def after(self, probe, success, elapsed):
+        """Record the outcome of a call, open or close the circuit when needed"""
+        now = self.clock()
+        healthy = success and elapsed < self.slow_call
+        if probe is not None:
+            self._transition(CLOSED if healthy else OPEN, now + self.cooldown, now, expected_probe=probe)
+            return
+        # counters restart from zero each time the circuit changes state
+        key = f'{self.name}#{int(self.until)}#{int(now // self.window)}'
+        if key != self.successes_key:
+            # healthy calls of a previous window can no longer change its rates
+            self.successes = 0
+            self.successes_key = key
+        if healthy:
+            # healthy calls alone cannot open the circuit
+            self.successes += 1
+            if self.successes >= self.batch or now - self.written_at >= self.batch_interval:
+                self._count(key, now, 0, 0)
+            return
+        counts = self._count(key, now, 0 if success else 1, 0 if elapsed < self.slow_call else 1)
+        calls = int(counts['calls'])
+        if calls >= self.min_calls and (int(counts['failures']) >= self.error_rate * calls
+                                        or int(counts['slow']) >= self.slow_rate * calls):
+            self._transition(OPEN, now + self.cooldown, now)
+
+    def _count(self, key, now, failures, slow):
+        """Add the healthy calls not written yet and this outcome to the counters, return them"""
+        calls = self.successes + (1 if failures or slow else 0)
+        counts = self.table.update_item(
+            Key={'circuit': key},
+            UpdateExpression='ADD calls :calls, failures :failures, slow :slow SET expires_at = :expires_at',
+            ExpressionAttributeValues={
+                ':calls': calls,
+                ':failures': failures,
+                ':slow': slow,
+                ':expires_at': int(now) + 3600
+            },
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+        self.successes = 0
+        self.written_at = now
+        return counts
+
+    def _load(self, now):
+        """Refresh the cached state of the circuit"""
+        item = self.table.get_item(Key={'circuit': self.name}).get('Item', {})
+        self.state = item.get('state', CLOSED)
+        self.until = float(item.get('until', 0))
+        self.checked_at = now
+
+    def _transition(self, state, until, now, probe=None, expected_probe=None):
+        """Conditionally move the circuit to state, return False if another container did it first"""
+        values = {':state': state, ':until': int(until), ':probe': probe or '-'}
+        if expected_probe is not None:
+            condition = 'probe = :expected_probe'
+            values[':expected_probe'] = expected_probe
+        elif state == OPEN:
+            condition = 'attribute_not_exists(#state) OR #state = :closed'
+            values[':closed'] = CLOSED
+        else:
+            condition = '#state <> :closed AND #until <= :now'
+            values.update({':closed': CLOSED, ':now': int(now)})
+        try:
+            self.table.update_item(
+                Key={'circuit': self.name},
+                UpdateExpression='SET #state = :state, #until = :until, probe = :probe',
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#state': 'state', '#until': 'until'},
+                ExpressionAttributeValues=values
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            self.checked_at = None
+            return False
+        self.state = state
+        self.until = int(until)
+        self.checked_at = now
+        self._metric(TRANSITION_METRICS[state])
+        return True
+
+    def _metric(self, name):
+        if self.metrics is not None:
+            self.metrics.add_metric(name=name, unit=MetricUnit.Count, value=1)
+
+def from_env(name, metrics=None, is_failure=None):
+    """Circuit breaker configured by env vars (CIRCUIT_BREAKER_*), None if CIRCUIT_BREAKER_TABLE is not set"""
+    if not os.environ.get('CIRCUIT_BREAKER_TABLE'):
+        return None
+    return CircuitBreaker(
+        boto3.resource('dynamodb').Table(os.environ['CIRCUIT_BREAKER_TABLE']),
+        name,
+        error_rate=float(os.environ.get('CIRCUIT_BREAKER_ERROR_RATE', '0.5')),
+        slow_rate=float(os.environ.get('CIRCUIT_BREAKER_SLOW_RATE', '0.5')),
+        slow_call=float(os.environ.get('CIRCUIT_BREAKER_SLOW_CALL', '1')),
+        min_calls=int(os.environ.get('CIRCUIT_BREAKER_MIN_CALLS', '10')),
+        cooldown=int(os.environ.get('CIRCUIT_BREAKER_COOLDOWN', '30')),
+        batch=int(os.environ.get('CIRCUIT_BREAKER_BATCH', '10')),
+        is_failure=is_failure,
+        metrics=metrics
+    )
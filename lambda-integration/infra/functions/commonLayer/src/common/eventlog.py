@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Logging of the incoming events of the handlers, sampled and without personal data
+
+``EventLog.capture`` replaces the ``POWERTOOLS_LOGGER_LOG_EVENT`` option of the powertools logger:
+ * the event is only logged for a sample of the invocations (``EVENT_LOG_SAMPLE_RATE``), and always
+   when the invocation fails,
+ * the personal data is redacted by a ``Redactor``, compiled once from field paths,
+ * the records under the level of the logger (e.g. debug) are kept in memory during the invocation
+   and only written when it fails.
+"""
+import os
+import random
+import logging
+import functools
+from collections import deque
+
+REDACTED = '***'
+
+# keys remembered per node of the paths
+MAX_TRANSITIONS = 1000
+
+# personal data of the registration, at any depth (event, identity, user, Payload...)
+PII_PATHS = ('**.firstname', '**.firstnames', '**.lastname', '**.birthdate', '**.email', '**.street',
+             '**.address', '**.postalcode', '**.city', '**.idcard', '**.idcards')
+
+class _Node:
+    __slots__ = ('children', 'any_depth', 'terminal')
+
+    def __init__(self):
+        self.children = {}
+        self.any_depth = False
+        self.terminal = False
+
+class _State:
+    """Set of the path nodes reached by a key path, with its transitions computed once per key"""
+    __slots__ = ('nodes', 'terminal', 'transitions')
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.terminal = any(node.terminal for node in nodes)
+        self.transitions = {}
+
+class Redactor:
+    """Replace the values matching field paths by REDACTED
+
+    Paths are dotted keys, ``*`` matches any key and ``**`` any number of keys. Lists do not count
+    in the paths: ``**.city`` also redacts ``{"addresses": [{"city": ...}]}``. The paths are compiled
+    in a tree and the set of nodes reached by each key is computed once, so redacting a value only
+    costs a dict lookup per key.
+    """
+
+    def __init__(self, paths=PII_PATHS):
+        root = _Node()
+        for path in paths:
+            node = root
+            for key in path.split('.'):
+                node = node.children.setdefault(key, _Node())
+                if key == '**':
+                    node.any_depth = True
+            node.terminal = True
+        self.states = {}
+        self.root = self._state(self._closure([root]))
+
+    @staticmethod
+    def _closure(nodes):
+        # '**' also matches no key at all
+        result = []
+        pending = list(nodes)
+        while pending:
+            node = pending.pop()
+            if node not in result:
+                result.append(node)
+                if '**' in node.children:
+                    pending.append(node.children['**'])
+        return frozenset(result)
+
+    def _state(self, nodes):
+        if nodes not in self.states:
+            self.states[nodes] = _State(nodes)
+        return self.states[nodes]
+
+    def _next(self, state, key):
+        if key not in state.transitions:
+            nodes = []
+            for node in state.nodes:
+                nodes.extend(child for name, child in node.children.items() if name in (key, '*'))
+                if node.any_depth:
+                    nodes.append(node)
+            state.transitions[key] = self._state(self._closure(nodes)) if nodes else None
+            if len(state.transitions) > MAX_TRANSITIONS: # unexpected keys sent by a client
+                return state.transitions.pop(key)
+        return state.transitions[key]
+
+    def redact(self, value, state=None):
+        """Copy of value, the values matching the paths replaced by REDACTED"""
+        state = state or self.root
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                child = self._next(state, key)
+                if child is None:
+                    result[key] = item
+                elif child.terminal:
+                    result[key] = REDACTED
+                else:
+                    result[key] = self.redact(item, child)
+            return result
+        if isinstance(value, list):
+            return [self.redact(item, state) for item in value]
+        return value
+
+class RecordBuffer(logging.Filter):
+    """Filter of the logger handler keeping the records under a level instead of writing them"""
+
+    def __init__(self, handler, level, capacity=500):
+        super().__init__()
+        self.handler = handler
+        self.level = level
+        self.records = deque(maxlen=capacity)
+        self.flushing = False
+
+    def filter(self, record):
+        if self.flushing or record.levelno >= self.level:
+            return True
+        self.records.append(record)
+        return False
+
+    def flush(self):
+        """Write the buffered records"""
+        self.flushing = True
+        try:
+            while self.records:
+                self.handler.handle(self.records.popleft())
+        finally:
+            self.flushing = False
+
+    def clear(self):
+        self.records.clear()
+
+def record_buffer(logger, capacity):
+    """RecordBuffer of the handler of a powertools logger, shared by the loggers of the same service"""
+    handler = logger.registered_handler
+    for existing in handler.filters:
+        if isinstance(existing, RecordBuffer):
+            return existing
+    buffer = RecordBuffer(handler, logger.log_level, capacity)
+    handler.addFilter(buffer)
+    # the records under the level of the logger now reach the handler, which keeps them
+    logger.setLevel(logging.DEBUG)
+    return buffer
+
+class EventLog:
+    """Sampled and redacted logging of the events of a handler, see ``capture``"""
+
+    def __init__(self, logger, sample_rate=1.0, redactor=None, buffer_size=500):
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self.redactor = redactor or Redactor()
+        self.buffer = record_buffer(logger, buffer_size) if buffer_size else None
+
+    def capture(self, handler):
+        """Decorator of a Lambda handler (under ``inject_lambda_context``)"""
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if self.buffer is not None:
+                self.buffer.clear() # records of a previous invocation of the container
+            sampled = random.random() < self.sample_rate
+            if sampled:
+                self.logger.info({'event': self.redactor.redact(event)})
+            try:
+                return handler(event, context)
+            except Exception:
+                if self.buffer is not None:
+                    self.buffer.flush()
+                if not sampled:
+                    self.logger.error({'event': self.redactor.redact(event)})
+                raise
+            finally:
+                if self.buffer is not None:
+                    self.buffer.clear()
+        return wrapper
+
+def from_env(logger):
+    """EventLog configured by env vars (EVENT_LOG_SAMPLE_RATE and EVENT_LOG_BUFFER_SIZE)"""
+    try:
+        sample_rate = float(os.environ.get('EVENT_LOG_SAMPLE_RATE', '1'))
+        buffer_size = int(os.environ.get('EVENT_LOG_BUFFER_SIZE', '500'))
+    except ValueError as error:
+        raise RuntimeError('EVENT_LOG_SAMPLE_RATE or EVENT_LOG_BUFFER_SIZE env var is incorrect') from error
+    if not 0 <= sample_rate <= 1:
+        raise RuntimeError('EVENT_LOG_SAMPLE_RATE env var is incorrect, must be between 0 and 1')
+    return EventLog(logger, sample_rate, buffer_size=buffer_size)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Machine readable zone (MRZ) of the identity documents
+
+``parse`` looks for the MRZ among the lines of text read on a document and returns the holder's
+names and birthdate once the check digits are valid. It supports the ICAO 9303 formats (TD1 for
+ID cards: 3 lines of 30 characters, TD2: 2 lines of 36, TD3 for passports: 2 lines of 44) and the
+French national ID card issued before 2021 (2 lines of 36).
+"""
+import re
+from datetime import date
+
+FILLER = '<'
+WEIGHTS = (7, 3, 1)
+
+# OCR confusions fixed in the numeric fields only (dates, check digits)
+DIGITS = str.maketrans({'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'Z': '2', 'S': '5', 'G': '6', 'B': '8'})
+MRZ_LINE = re.compile(r'^[A-Z0-9<]+$')
+
+def check_digit(value):
+    """ICAO 9303 check digit: digits count as themselves, letters from 10 (A) to 35 (Z), fillers as 0"""
+    total = 0
+    for position, char in enumerate(value):
+        if char.isdigit():
+            number = int(char)
+        elif char.isalpha():
+            number = ord(char) - ord('A') + 10
+        else:
+            number = 0
+        total += number * WEIGHTS[position % 3]
+    return str(total % 10)
+
+def valid(value, digit):
+    return check_digit(value) == digit
+
+def clean(text):
+    """MRZ line as read by the OCR: without spaces, with the usual misreadings of the filler fixed"""
+    return text.upper().replace(' ', '').replace('«', FILLER * 2).replace('‹', FILLER)
+
+def numeric(value):
+    return value.translate(DIGITS)
+
+def birthdate(value, today=None):
+    """YYMMDD birthdate in the past (the century is not in the MRZ), as YYYY-MM-DD"""
+    today = today or date.today()
+    year, month, day = int(value[0:2]), int(value[2:4]), int(value[4:6])
+    century = 1900 if 2000 + year > today.year else 2000
+    return date(century + year, month, day).isoformat()
+
+def names(value):
+    """SURNAME<<GIVEN<NAMES as (lastname, [firstnames])"""
+    lastname, _, firstnames = value.strip(FILLER).partition(FILLER * 2)
+    return lastname.replace(FILLER, ' ').strip(), [name for name in firstnames.split(FILLER) if name]
+
+def result(lastname, firstnames, birth):
+    if not lastname or not firstnames:
+        return None
+    return {'firstnames': firstnames, 'lastname': lastname, 'birthdate': birth}
+
+def parse_td1(lines):
+    first, second, third = lines
+    second = numeric(second[0:7]) + second[7] + numeric(second[8:15]) + second[15:29] + numeric(second[29])
+    composite = first[5:30] + second[0:7] + second[8:15] + second[18:29]
+    if not (valid(second[0:6], second[6]) and valid(composite, second[29])):
+        return None
+    lastname, firstnames = names(third)
+    return result(lastname, firstnames, birthdate(second[0:6]))
+
+def parse_td2_td3(lines):
+    first, second = lines
+    length = len(second)
+    second = (second[0:9] + numeric(second[9]) + second[10:13] + numeric(second[13:20]) + second[20]
+              + numeric(second[21:28]) + second[28:length - 1] + numeric(second[length - 1]))
+    composite = second[0:10] + second[13:20] + second[21:length - 1]
+    if not (valid(second[0:9], second[9]) and valid(second[13:19], second[19])
+            and valid(composite, second[length - 1])):
+        return None
+    lastname, firstnames = names(first[5:])
+    return result(lastname, firstnames, birthdate(second[13:19]))
+
+def parse_french_id(lines):
+    """French ID card before 2021: IDFRA + surname on the first line, given names on the second one"""
+    first, second = lines
+    if not first.startswith('IDFRA'):
+        return None
+    # the department (positions 4-6) is not numeric in Corsica (2A, 2B)
+    second = (numeric(second[0:4]) + second[4:7] + numeric(second[7:13]) + second[13:27] + numeric(second[27:34])
+              + second[34] + numeric(second[35]))
+    if not (valid(second[0:12], second[12]) and valid(second[27:33], second[33])
+            and valid(first + second[0:35], second[35])):
+        return None
+    # given names are separated by 2 fillers, a single filler replaces the hyphen of compound names
+    firstnames = [name.replace(FILLER, '-') for name in second[13:27].split(FILLER * 2) if name.strip(FILLER)]
+    return result(first[5:30].strip(FILLER).replace(FILLER, ' '), firstnames, birthdate(second[27:33]))
+
+# consecutive lines and length of each format, with its parser
+FORMATS = (
+    (3, 30, parse_td1),
+    (2, 44, parse_td2_td3),
+    (2, 36, parse_french_id),
+    (2, 36, parse_td2_td3),
+)
+
+def parse(lines):
+    """Holder's identity ({firstnames, lastname, birthdate}) read in the MRZ, None without a valid MRZ"""
+    candidates = [clean(line) for line in lines]
+    candidates = [line for line in candidates if MRZ_LINE.match(line)]
+    for count, length, parser in FORMATS:
+        for start in range(len(candidates) - count + 1):
+            group = candidates[start:start + count]
+            if all(len(line) == length for line in group):
+                try:
+                    identity = parser(group)
+                except ValueError:  # invalid date
+                    continue
+                if identity is not None:
+                    return identity
+    return None
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Phonetic keys and similarity of the names, to find the users registered twice with small differences
+
+``name_key`` is written with each user (``phonetic`` index of the user table): the registrations
+sharing it with a user are the candidates, ranked by ``rank`` with an edit distance on the
+normalized names. Accents, case, punctuation, the order of the first names, most French spelling
+variants (PH/F, C/K/QU, silent final letters...) and vowel typos do not change the key.
+"""
+import re
+import unicodedata
+
+# French spellings of the same sound, applied in this order to a normalized word
+RULES = [(re.compile(pattern), replacement) for pattern, replacement in (
+    (r'^H', ''),
+    (r'PH', 'F'),
+    (r'GU(?=[EIY])|G(?=[EIY])', lambda match: 'G' if match.group() == 'GU' else 'J'),
+    (r'SCH|SH|CH', 'X'),
+    (r'C([EIY])', r'S\1'),
+    (r'CK|QU|C|Q', 'K'),
+    (r'GN', 'N'),
+    (r'W|BV', 'V'),
+    (r'Z', 'S'),
+    (r'(?<=.)H', ''),
+    (r'EAU|AU', 'O'),
+    (r'(ER|EZ|ET)$', 'E'),
+    (r'(?<=.)[STDX]$', ''),
+    (r'(.)\1+', r'\1')
+)]
+VOWELS = re.compile(r'(?<=.)[AEIOUY]+')
+
+# longest phonetic code kept for a name
+CODE_LENGTH = 8
+
+def normalize(name):
+    """Upper case words of a name, without accents and punctuation"""
+    text = unicodedata.normalize('NFKD', name.upper().replace('Œ', 'OE').replace('Æ', 'AE'))
+    text = ''.join(char if 'A' <= char <= 'Z' else ' ' for char in text if not unicodedata.combining(char))
+    return text.split()
+
+def phonetic(word):
+    """Phonetic code of a normalized word: first sound and following consonant sounds"""
+    for pattern, replacement in RULES:
+        word = pattern.sub(replacement, word)
+    return VOWELS.sub('', word)[:CODE_LENGTH]
+
+def name_key(lastname, firstname):
+    """Key of a user: code of the last name (particles included) and lowest code of the first names"""
+    firstnames = normalize(firstname)
+    first = min(phonetic(word) for word in firstnames) if firstnames else ''
+    return phonetic(''.join(normalize(lastname))) + '#' + first
+
+def distance(first, second, maximum):
+    """Edit distance (with transpositions) of two strings, maximum + 1 as soon as it exceeds maximum"""
+    if abs(len(first) - len(second)) > maximum:
+        return maximum + 1
+    previous2 = None
+    previous = list(range(len(second) + 1))
+    for i, char in enumerate(first, 1):
+        current = [i] + [0] * len(second)
+        for j, other in enumerate(second, 1):
+            cost = 0 if char == other else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and j > 1 and char == second[j - 2] and first[i - 2] == other):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > maximum:
+            return maximum + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def similarity(first, second, threshold=0.0):
+    """1 - edit distance / length, 0 if it is lower than threshold"""
+    length = max(len(first), len(second))
+    if length == 0:
+        return 1.0
+    maximum = int(length * (1 - threshold))
+    edits = distance(first, second, maximum)
+    return 0.0 if edits > maximum else 1 - edits / length
+
+# score of the first names when some are missing ('Corinne' and 'Corinne Marie')
+SUBSET_SCORE = 0.9
+
+def comparable(lastname, firstname):
+    # first names in alphabetical order: 'Marie Corinne' is 'Corinne Marie'
+    return ''.join(normalize(lastname)), tuple(sorted(normalize(firstname)))
+
+def rank(lastname, firstname, users, threshold=0.8, limit=5):
+    """Users (with lastname and firstname) whose name is similar enough, most similar first
+
+    Each user is returned with a ``score``: the average similarity of the last and first names,
+    1.0 when the normalized names are the same.
+    """
+    last, first = comparable(lastname, firstname)
+    candidates = []
+    for user in users:
+        other_last, other_first = comparable(user['lastname'], user['firstname'])
+        # a name below 2 * threshold - 1 cannot reach the threshold on average
+        last_score = similarity(last, other_last, 2 * threshold - 1)
+        first_score = 0.0
+        if last_score:
+            first_score = similarity(' '.join(first), ' '.join(other_first), 2 * threshold - 1)
+            if first_score < SUBSET_SCORE and (set(first) <= set(other_first) or set(other_first) <= set(first)):
+                first_score = SUBSET_SCORE
+        score = (last_score + first_score) / 2
+        if score >= threshold:
+            candidates.append(dict(user, score=round(score, 3)))
+    candidates.sort(key=lambda candidate: candidate['score'], reverse=True)
+    return candidates[:limit]
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Priming of the connections of a function (DNS lookup, TCP and TLS handshakes) before its first invocation
+
+The first call of a boto3 client or of a requests session opens its connection, a new container pays
+it in the first invocation. The calls registered with ``Primer.add`` are read-only (e.g. a GetItem of
+a key that does not exist): they are made in the init phase when ``PRIME_CONNECTIONS`` is true, or
+when the function receives a warm-up event (``{"warmup": true}``, see ``Primer.warmup``). An error
+returned by the service (``ClientError``) still means the connection is open.
+
+Each call is made twice: the first one (cold) opens the connection, the second one (warm) reuses it,
+the difference is the latency saved to the first invocation. Both are logged (``connectionPriming``)
+and published as metrics.
+"""
+import os
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait
+from botocore.exceptions import ClientError
+from aws_lambda_powertools.metrics import MetricUnit
+
+# priming never delays the init phase longer than this, the connections not open yet are left to the handler
+PRIMING_TIMEOUT_SECONDS = 2.0
+
+def is_warmup(event):
+    return isinstance(event, dict) and event.get('warmup') is True
+
+class Primer:
+    """Calls opening the connections of a function, made concurrently and timed"""
+
+    def __init__(self, logger, metrics=None, enabled=False, timeout=PRIMING_TIMEOUT_SECONDS,
+                 clock=time.perf_counter):
+        self.logger = logger
+        self.metrics = metrics
+        self.enabled = enabled
+        self.timeout = timeout
+        self.clock = clock
+        self.targets = {}
+        self.report = None
+
+    def add(self, name, call):
+        """Register a read-only call (without arguments) opening a connection"""
+        self.targets[name] = call
+        return self
+
+    def time(self, call):
+        """Duration of a call in milliseconds"""
+        start = self.clock()
+        try:
+            call()
+        except ClientError:
+            pass # answered by the service: the connection is open
+        return (self.clock() - start) * 1000
+
+    def prime_target(self, call):
+        cold = self.time(call)
+        warm = self.time(call)
+        return {'cold': round(cold, 1), 'warm': round(warm, 1), 'saved': round(max(cold - warm, 0), 1)}
+
+    def prime(self):
+        """Open the connections of all the targets, return (and log) the report"""
+        start = self.clock()
+        executor = ThreadPoolExecutor(max_workers=max(len(self.targets), 1))
+        futures = {name: executor.submit(self.prime_target, call) for name, call in self.targets.items()}
+        done, _ = wait(futures.values(), timeout=self.timeout)
+        executor.shutdown(wait=False)
+
+        report = {'primed': {}, 'failed': {}}
+        for name, future in futures.items():
+            if future not in done:
+                report['failed'][name] = 'timeout'
+            elif future.exception() is not None:
+                report['failed'][name] = str(future.exception())
+            else:
+                report['primed'][name] = future.result()
+        report['duration'] = round((self.clock() - start) * 1000, 1)
+        report['saved'] = round(sum(target['saved'] for target in report['primed'].values()), 1)
+
+        self.report = report
+        if report['failed']:
+            self.logger.warning({'connectionPriming': report})
+        else:
+            self.logger.info({'connectionPriming': report})
+        if self.metrics is not None:
+            self.metrics.add_metric(name='ConnectionPrimingTime', unit=MetricUnit.Milliseconds, value=report['duration'])
+            self.metrics.add_metric(name='ConnectionPrimingSaved', unit=MetricUnit.Milliseconds, value=report['saved'])
+        return report
+
+    def init(self):
+        """Prime the connections in the init phase, if enabled (PRIME_CONNECTIONS)"""
+        if self.enabled:
+            self.prime()
+        return self
+
+    def warmup(self, handler):
+        """Decorator answering the warm-up events with the priming report, without calling the handler"""
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if is_warmup(event):
+                return {'warmup': self.report if self.report is not None else self.prime()}
+            return handler(event, context)
+        return wrapper
+
+def from_env(logger, metrics=None):
+    """Primer enabled by the PRIME_CONNECTIONS env var (PRIME_CONNECTIONS_TIMEOUT in seconds)"""
+    enabled = os.environ.get('PRIME_CONNECTIONS', 'false').lower()
+    if enabled not in ('true', 'false'):
+        raise RuntimeError('PRIME_CONNECTIONS env var is incorrect, must be "true" or "false"')
+    try:
+        timeout = float(os.environ.get('PRIME_CONNECTIONS_TIMEOUT', str(PRIMING_TIMEOUT_SECONDS)))
+    except ValueError as error:
+        raise RuntimeError('PRIME_CONNECTIONS_TIMEOUT env var is incorrect') from error
+    return Primer(logger, metrics, enabled == 'true', timeout)
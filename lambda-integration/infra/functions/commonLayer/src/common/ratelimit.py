@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Fixed window rate limiter shared by all the containers of the functions calling a rate limited API
+
+Calls are limited to ``rate`` per one-second window (aligned on the clock, not a token bucket: there
+is no burst carried over from one window to the next). The tokens taken in each window are counted
+in DynamoDB with an atomic (conditional) counter. Each container leases ``lease`` tokens at once and
+consumes them locally, so only one call in ``lease`` needs a round trip to DynamoDB; the tokens a
+container leased but did not use are lost for the window. The default lease is a tenth of the rate,
+so at low rates (10/s or less) it is a single token, i.e. one conditional write per call: raise
+RATE_LIMIT_LEASE to trade some throughput for fewer writes. When the window is exhausted, ``acquire``
+waits for the next window if the time left allows it, or fails fast with ``RateLimitExceeded``.
+"""
+import os
+import time
+import threading
+import boto3
+
+class RateLimitExceeded(Exception):
+    """No token available in time (error name used by the workflow to retry later)"""
+
+class FixedWindowLimiter:
+    """Distributed rate limiter allowing `rate` calls per one-second window"""
+
+    def __init__(self, table, name, rate, lease=None, max_wait=1.0, clock=time.time, sleep=time.sleep):
+        self.table = table
+        self.name = name
+        self.rate = int(rate)
+        self.lease = min(self.rate, lease or max(1, self.rate // 10))
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self.window = None
+        self.tokens = 0
+        self.exhausted = False
+        self.coordination_calls = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, time_left=None):
+        """Take a token, waiting at most max_wait (or time_left if lower), raise RateLimitExceeded otherwise"""
+        wait = self.max_wait if time_left is None else max(0.0, min(self.max_wait, time_left))
+        deadline = self.clock() + wait
+        while True:
+            now = self.clock()
+            window = int(now)
+            with self.lock:
+                if window != self.window:
+                    self.window = window
+                    self.tokens = 0
+                    self.exhausted = False
+                if self.tokens == 0 and not self.exhausted:
+                    self.tokens = self._lease(window)
+                    self.exhausted = self.tokens == 0
+                if self.tokens > 0:
+                    self.tokens -= 1
+                    return
+            if window + 1 > deadline:
+                raise RateLimitExceeded(f'Rate limit of {self.rate}/s reached for {self.name}')
+            self.sleep(window + 1 - now)
+
+    def _lease(self, window):
+        """Take up to `lease` tokens of the window in DynamoDB, return the number of tokens obtained"""
+        for count in sorted({self.lease, 1}, reverse=True):
+            self.coordination_calls += 1
+            try:
+                self.table.update_item(
+                    Key={'bucket': f'{self.name}#{window}'},
+                    UpdateExpression='ADD taken :count SET expires_at = :expires_at',
+                    ConditionExpression='attribute_not_exists(taken) OR taken <= :limit',
+                    ExpressionAttributeValues={
+                        ':count': count,
+                        ':limit': self.rate - count,
+                        ':expires_at': window + 3600
+                    }
+                )
+                return count
+            except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+                continue
+        return 0
+
+def time_left(context, margin=0.0):
+    """Seconds left before the function times out, minus a margin (None if the context does not tell)"""
+    remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    remaining = remaining() if callable(remaining) else None
+    if not isinstance(remaining, (int, float)):
+        return None
+    return remaining / 1000 - margin
+
+def from_env(name, rate_variable):
+    """Rate limiter configured by env vars (RATE_LIMIT_TABLE and the rate), None if rate limiting is not enabled"""
+    if not os.environ.get('RATE_LIMIT_TABLE') or not os.environ.get(rate_variable):
+        return None
+    return FixedWindowLimiter(
+        boto3.resource('dynamodb').Table(os.environ['RATE_LIMIT_TABLE']),
+        name,
+        int(os.environ[rate_variable]),
+        lease=int(os.environ['RATE_LIMIT_LEASE']) if os.environ.get('RATE_LIMIT_LEASE') else None,
+        max_wait=float(os.environ.get('RATE_LIMIT_MAX_WAIT', '1'))
+    )
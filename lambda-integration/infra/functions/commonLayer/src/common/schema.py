@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Validation of the registrations, with a JSON schema compiled once (at import) into a validator
+
+Only the keywords used by the registration schema are supported (``type``, ``required``,
+``properties``, ``minLength``, ``maxLength``, ``pattern``, ``enum``, ``format`` date and email, and
+``maxItems`` and ``items`` for the lists).
+Unlike a JSON schema validator stopping at the first error, ``Validator.errors`` returns the error
+of each invalid field, so the user can fix them all at once. ``Validator.subset`` gives the
+validator of the fields a step receives.
+"""
+import re
+from datetime import date
+
+# same constraints as the model of the API (UserModel), plus the fields required by the workflow
+REGISTRATION_SCHEMA = {
+    'type': 'object',
+    'required': ['firstname', 'lastname', 'birthdate', 'countrybirth', 'country', 'postalcode', 'city',
+                 'street', 'email', 'idcard'],
+    'properties': {
+        'firstname': {'type': 'string', 'minLength': 1, 'maxLength': 100},
+        'lastname': {'type': 'string', 'minLength': 1, 'maxLength': 100},
+        'birthdate': {'type': 'string', 'pattern': r'^\d{4}-\d{2}-\d{2}$', 'format': 'date'},
+        'countrybirth': {'type': 'string', 'maxLength': 2},
+        'country': {'type': 'string', 'enum': ['FR']},
+        'postalcode': {'type': 'string', 'pattern': r'^\d{2}[ ]?\d{3}$'},
+        'city': {'type': 'string', 'minLength': 1, 'maxLength': 100},
+        'street': {'type': 'string', 'minLength': 1, 'maxLength': 200},
+        'email': {'type': 'string', 'minLength': 6, 'maxLength': 254, 'format': 'email'},
+        'idcard': {'type': 'string', 'minLength': 1, 'maxLength': 1024},
+        # other images of the same document (e.g. the back of the card), optional
+        'idcards': {'type': 'array', 'maxItems': 3, 'items': {'type': 'string', 'minLength': 1, 'maxLength': 1024}},
+        'connectionId': {'type': 'string'}
+    }
+}
+
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+class ValidationError(ValueError):
+    """Invalid input, with the error of each invalid field"""
+
+    def __init__(self, errors, prefix='Invalid registration'):
+        super().__init__(prefix + ': ' + ', '.join(errors))
+        self.errors = errors
+
+def is_past_date(value):
+    try:
+        return date.fromisoformat(value) <= date.today()
+    except ValueError:
+        return False
+
+FORMATS = {
+    'date': (is_past_date, 'must be a valid date in the past'),
+    'email': (lambda value: EMAIL.match(value) is not None, 'must be a valid email address')
+}
+
+def compile_property(schema):
+    """(test, message) pairs checking a value against the schema of a property"""
+    checks = []
+    if schema.get('type') == 'string':
+        checks.append((lambda value: isinstance(value, str), 'must be a string'))
+    if schema.get('type') == 'array':
+        checks.append((lambda value: isinstance(value, list), 'must be a list'))
+    if 'maxItems' in schema:
+        checks.append((lambda value, length=schema['maxItems']: len(value) <= length,
+                       f"must have at most {schema['maxItems']} items"))
+    if 'items' in schema:
+        # each check of the items applies to all of them
+        for test, message in compile_property(schema['items']):
+            checks.append((lambda value, test=test: all(test(item) for item in value), 'items ' + message))
+    if 'minLength' in schema:
+        checks.append((lambda value, length=schema['minLength']: len(value) >= length,
+                       f"must be at least {schema['minLength']} characters long"))
+    if 'maxLength' in schema:
+        checks.append((lambda value, length=schema['maxLength']: len(value) <= length,
+                       f"must be at most {schema['maxLength']} characters long"))
+    if 'pattern' in schema:
+        checks.append((lambda value, search=re.compile(schema['pattern']).search: search(value) is not None,
+                       f"must match {schema['pattern']}"))
+    if 'enum' in schema:
+        checks.append((frozenset(schema['enum']).__contains__, f"must be one of {', '.join(schema['enum'])}"))
+    if 'format' in schema:
+        checks.append(FORMATS[schema['format']])
+    return tuple(checks)
+
+class Validator:
+    """Validator of an object schema, compiled once"""
+
+    def __init__(self, properties, required):
+        self.properties = properties
+        self.required = required
+
+    @classmethod
+    def compile(cls, schema):
+        properties = tuple((name, compile_property(definition)) for name, definition in schema['properties'].items())
+        return cls(properties, tuple(schema.get('required', ())))
+
+    def subset(self, fields):
+        """Validator of some fields only (e.g. the fields projected for a step)"""
+        return Validator(tuple((name, checks) for name, checks in self.properties if name in fields),
+                         tuple(name for name in self.required if name in fields))
+
+    def errors(self, data):
+        """Error of each invalid field (an empty list if data is valid)"""
+        if not isinstance(data, dict):
+            return ['must be an object']
+        errors = [f'{name} is required' for name in self.required if data.get(name) in (None, '')]
+        for name, checks in self.properties:
+            value = data.get(name)
+            if value is None or value == '':
+                continue
+            for test, message in checks:
+                if not test(value):
+                    errors.append(f'{name} {message}')
+                    break
+        return errors
+
+    def validate(self, data, prefix='Invalid registration'):
+        """Raise a ValidationError with all the errors if data is not valid"""
+        errors = self.errors(data)
+        if errors:
+            raise ValidationError(errors, prefix)
+        return data
+
+registration = Validator.compile(REGISTRATION_SCHEMA)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Serialization of the payloads passed between the steps of the workflow
+
+ * ``dumps`` / ``loads`` use orjson when available and fall back to the standard ``json`` module.
+ * ``project`` keeps only the fields a step needs (dotted paths for nested fields).
+ * ``offload`` moves oversized values to S3 and replaces them with a reference, ``resolve`` loads them back.
+ * Serialized sizes and time spent encoding are accumulated and published with ``report``.
+"""
+import json
+import time
+from aws_lambda_powertools.metrics import MetricUnit
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the packaging
+    orjson = None
+
+ENCODER = 'orjson' if orjson is not None else 'json'
+
+# Step Functions state and SQS message are both limited to 256 KB
+MAX_PAYLOAD_SIZE = 256 * 1024
+
+S3_REF = '$s3ref'
+
+class SerializationStats:
+    """Accumulate serialized sizes and encoding time for the current invocation"""
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.max_bytes = 0
+        self.seconds = 0.0
+
+    def record(self, size, seconds):
+        self.count += 1
+        self.bytes += size
+        self.max_bytes = max(self.max_bytes, size)
+        self.seconds += seconds
+
+    def reset(self):
+        self.__init__()
+
+    def as_dict(self):
+        return {
+            'encoder': ENCODER,
+            'count': self.count,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'milliseconds': round(self.seconds * 1000, 3)
+        }
+
+stats = SerializationStats()
+
+def dumps(obj):
+    """Serialize obj to a JSON string"""
+    start = time.perf_counter()
+    data = _encode(obj)
+    stats.record(len(data.encode('utf-8')), time.perf_counter() - start)
+    return data
+
+def _encode(obj):
+    """Serialize obj to a JSON string without recording it in the stats"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+def loads(data):
+    """Deserialize a JSON string (or bytes)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def project(payload, fields):
+    """Return a copy of payload that only contains the given fields
+
+    Fields are top-level keys or dotted paths (``user.lastname``), missing fields are ignored.
+    """
+    result = {}
+    for field in fields:
+        source = payload
+        path = field.split('.')
+        for key in path[:-1]:
+            source = source.get(key) if isinstance(source, dict) else None
+        if not isinstance(source, dict) or path[-1] not in source:
+            continue
+        target = result
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = source[path[-1]]
+    return result
+
+def offload(payload, s3, bucket, prefix, threshold=MAX_PAYLOAD_SIZE // 4):
+    """Move the top-level values of payload bigger than threshold (bytes, serialized) to S3
+
+    Each value is stored in ``s3://bucket/prefix/<field>.json`` and replaced by ``{"$s3ref": "<key>"}``.
+    Values are not recorded in the stats, only the body the caller serializes is.
+    """
+    result = {}
+    for field, value in payload.items():
+        data = _encode(value)
+        if len(data.encode('utf-8')) > threshold:
+            key = prefix + '/' + field + '.json'
+            s3.put_object(Bucket=bucket, Key=key, Body=data.encode('utf-8'), ContentType='application/json')
+            result[field] = {S3_REF: key}
+        else:
+            result[field] = value
+    return result
+
+def resolve(payload, s3, bucket):
+    """Replace the S3 references created by ``offload`` with the original values"""
+    result = {}
+    for field, value in payload.items():
+        if isinstance(value, dict) and set(value) == {S3_REF}:
+            value = loads(s3.get_object(Bucket=bucket, Key=value[S3_REF])['Body'].read())
+        result[field] = value
+    return result
+
+def report(metrics=None, logger=None):
+    """Publish serialization stats as metrics and/or log them, then reset them"""
+    if stats.count > 0:
+        if metrics is not None:
+            metrics.add_metric(name='SerializedBytes', unit=MetricUnit.Bytes, value=stats.bytes)
+            metrics.add_metric(name='SerializationTime', unit=MetricUnit.Milliseconds, value=stats.seconds * 1000)
+        if logger is not None:
+            logger.info({'serialization': stats.as_dict()})
+    stats.reset()
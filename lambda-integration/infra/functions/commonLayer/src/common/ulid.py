@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Time ordered identifiers (ULID: 48 bits of milliseconds and 80 random bits, in Crockford base 32)
+
+The ids of a ``Generator`` are strictly increasing, even within a millisecond or if the clock goes
+back. An optional prefix (e.g. a shard, see ``shard_of``) is prepended, so the ids of a shard can be
+read by creation time with ``lower_bound`` and ``upper_bound``.
+"""
+import os
+import time
+import base64
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+LENGTH = 26
+RANDOM_BITS = 80
+
+# base64.b32encode alphabet to Crockford's
+TRANSLATION = bytes.maketrans(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567', ALPHABET.encode('ascii'))
+DECODING = {char: value for value, char in enumerate(ALPHABET)}
+
+def encode(value):
+    """26 characters of a 128 bits integer"""
+    # 136 bits of which the first 130 are the 26 characters
+    return base64.b32encode((value << 6).to_bytes(17, 'big')).translate(TRANSLATION)[:LENGTH].decode('ascii')
+
+def timestamp(ulid):
+    """Creation time of an id (without prefix)"""
+    milliseconds = 0
+    for char in ulid[:10]:
+        milliseconds = milliseconds << 5 | DECODING[char]
+    return datetime.fromtimestamp(milliseconds / 1000, timezone.utc)
+
+def milliseconds(moment):
+    return int(moment.timestamp() * 1000)
+
+def lower_bound(moment, prefix=''):
+    """Lowest id created at moment (datetime)"""
+    return prefix + encode(milliseconds(moment) << RANDOM_BITS)
+
+def upper_bound(moment, prefix=''):
+    """Highest id created at moment (datetime)"""
+    return prefix + encode(milliseconds(moment) << RANDOM_BITS | (1 << RANDOM_BITS) - 1)
+
+def shard_of(key, shards):
+    """Shard (2 digits) of a key, e.g. the request id, the same for every attempt of a request"""
+    return '%02d' % (int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:4], 'big') % shards)
+
+class Generator:
+    """Monotonic ids of a process, thread safe"""
+
+    def __init__(self, clock=time.time, randbytes=os.urandom):
+        self.clock = clock
+        self.randbytes = randbytes
+        self.lock = threading.Lock()
+        self.last = 0
+
+    def new(self, prefix=''):
+        """New id, greater than the previous ones"""
+        with self.lock:
+            value = int(self.clock() * 1000) << RANDOM_BITS | int.from_bytes(self.randbytes(10), 'big')
+            if value <= self.last:
+                # same millisecond (or clock back): the previous id + 1, the timestamp moves on overflow
+                value = self.last + 1
+            self.last = value
+        return prefix + encode(value)
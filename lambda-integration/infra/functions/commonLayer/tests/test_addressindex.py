@@ -0,0 +1,103 @@
+import os
+import gzip
+import time
+import random
+import pytest
+from common import addressindex
+from common.addressindex import AddressIndex
+
+SAMPLE = os.path.join(os.path.dirname(__file__), 'res', 'ban-sample.csv')
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('ban') / 'ban.idx')
+    addressindex.build([SAMPLE], path)
+    index = AddressIndex(path)
+    yield index
+    index.close()
+
+def best(response):
+    assert len(response['features']) == 1
+    return response['features'][0]['properties']
+
+def test_exact_address_should_match_with_full_score(index):
+    result = best(index.search('8 Boulevard du Port', '80000', 'Amiens'))
+
+    assert result['label'] == '8 Boulevard du Port 80000 Amiens'
+    assert result['score'] == pytest.approx(1.0)
+
+def test_abbreviations_accents_and_suffix_should_match(index):
+    assert best(index.search('8bis bd du port', '80000', 'AMIENS'))['label'] == '8 bis Boulevard du Port 80000 Amiens'
+    assert best(index.search('12 r de l\'hotel de ville', '80000', 'Amiens'))['score'] > 0.95
+    assert best(index.search('4 av du General Foch', '80000', 'Amiens'))['score'] > 0.95
+
+def test_typo_should_lower_score(index):
+    result = best(index.search('8 Boulevrd du Prt', '80000', 'Amiens'))
+
+    assert result['label'] == '8 Boulevard du Port 80000 Amiens'
+    assert 0.5 < result['score'] < 0.95
+
+def test_unknown_house_number_should_not_be_verified(index):
+    for street in ('99 Boulevard du Port', '8 ter Boulevard du Port'):
+        result = best(index.search(street, '80000', 'Amiens'))
+
+        assert result['score'] == addressindex.UNKNOWN_NUMBER_SCORE
+        assert result['label'] == 'Boulevard du Port 80000 Amiens'
+        assert result['housenumber'] is None
+
+def test_street_of_another_postcode_should_not_match_well(index):
+    result = best(index.search('15 Chemin de Halage', '80000', 'Amiens'))
+
+    assert 'Halage' not in result['label']
+    assert result['score'] < 0.5
+
+def test_unknown_postcode_should_return_no_feature(index):
+    assert index.search('8 Boulevard du Port', '99999', 'Amiens') == {'features': []}
+    assert index.search('8 Boulevard du Port', 'abc', 'Amiens') == {'features': []}
+
+def test_leading_zero_postcode_should_be_kept(index):
+    assert best(index.search('2 av Alsace Lorraine', '01000', 'Bourg en Bresse'))['postcode'] == '01000'
+
+def test_invalid_file_should_raise_error(tmp_path):
+    path = tmp_path / 'invalid.idx'
+    path.write_bytes(b'\0' * 1024)
+    with pytest.raises(ValueError, match=r".*is not an address index"):
+        AddressIndex(str(path))
+
+STREET_TYPES = ['Rue', 'Avenue', 'Boulevard', 'Place', 'Impasse', 'Chemin', 'Allée', 'Route']
+NAMES = ['Victor Hugo', 'Jean Jaurès', 'de la République', 'Pasteur', 'du Général de Gaulle', 'des Lilas',
+         'de la Gare', 'Gambetta', 'Voltaire', 'Émile Zola', 'des Écoles', 'du Moulin', 'de la Paix', 'Carnot']
+
+def generate_ban(path, postcodes=100, streets=150, numbers=40):
+    """Synthetic BAN file with the size of a big department (600 000 addresses by default)"""
+    rng = random.Random(42)
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        file.write('id;numero;rep;nom_voie;code_postal;nom_commune\n')
+        for postcode in range(1000, 1000 + postcodes):
+            for street in range(streets):
+                name = f'{rng.choice(STREET_TYPES)} {rng.choice(NAMES)} {street}'
+                for number in range(1, numbers + 1):
+                    file.write(f';{number};;{name};{postcode:05d};Commune {postcode}\n')
+
+def test_benchmark_index(tmp_path):
+    """Index size, build time and lookup latency (run with -s to see the results)"""
+    source, path = str(tmp_path / 'ban.csv.gz'), str(tmp_path / 'ban.idx')
+    generate_ban(source)
+    start = time.perf_counter()
+    count = addressindex.build([source], path)
+    build_time = time.perf_counter() - start
+
+    index = AddressIndex(path)
+    queries = [(f'{n} rue victor hugo {s}', f'{p:05d}', f'Commune {p}')
+               for p, s, n in zip(range(1000, 1100), range(0, 150, 3), range(1, 40))]
+    start = time.perf_counter()
+    for _ in range(20):
+        results = [index.search(*query) for query in queries]
+    lookup_time = (time.perf_counter() - start) / (20 * len(queries))
+    index.close()
+
+    print(f'\n{count} addresses, index: {os.path.getsize(path) / 1e6:.1f} MB '
+          f'({os.path.getsize(source) / 1e6:.1f} MB gzipped CSV), build: {build_time:.1f}s, '
+          f'lookup: {lookup_time * 1e6:.0f}us')
+    assert count == 600000
+    assert all(result['features'] for result in results)
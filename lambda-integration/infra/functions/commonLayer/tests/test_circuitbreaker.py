@@ -0,0 +1,182 @@
+import os
+from unittest import mock
+import boto3
+import pytest
+from moto import mock_aws
+from common import circuitbreaker
+from common.circuitbreaker import CircuitBreaker, CircuitOpen, CLOSED, OPEN, HALF_OPEN
+
+@pytest.fixture
+def table():
+    with mock_aws():
+        ddb = boto3.resource('dynamodb', region_name='eu-west-1')
+        yield ddb.create_table(
+            TableName='circuitBreaker',
+            KeySchema=[{'AttributeName': 'circuit', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'circuit', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def breaker(table, clock, **kwargs):
+    return CircuitBreaker(table, 'address-api', min_calls=4, cooldown=30, metrics=mock.MagicMock(),
+                          clock=clock, **kwargs)
+
+def ok():
+    return 'ok'
+
+def failing():
+    raise RuntimeError('Request Error')
+
+def fail_calls(container, count):
+    for _ in range(count):
+        with pytest.raises(RuntimeError):
+            container.call(failing)
+
+def metric_names(container):
+    return [call.kwargs['name'] for call in container.metrics.add_metric.call_args_list]
+
+def test_closed_circuit_should_call_function(table):
+    container = breaker(table, FakeClock())
+
+    assert container.call(ok) == 'ok'
+    assert container.state == CLOSED
+
+def test_error_rate_should_open_circuit_and_reject_calls(table):
+    clock = FakeClock()
+    container = breaker(table, clock)
+    container.call(ok)
+    container.call(ok)
+    fail_calls(container, 2)
+
+    assert container.state == OPEN
+    function = mock.Mock()
+    with pytest.raises(CircuitOpen):
+        container.call(function)
+    function.assert_not_called()
+    assert metric_names(container) == ['CircuitOpened', 'CircuitRejected']
+
+def test_slow_calls_should_open_circuit(table):
+    clock = FakeClock()
+    container = breaker(table, clock, slow_call=1.0)
+
+    def slow():
+        clock.now += 2
+        return 'ok'
+
+    for _ in range(4):
+        assert container.call(slow) == 'ok'
+
+    assert container.state == OPEN
+
+def test_healthy_calls_should_be_written_in_batches(table):
+    clock = FakeClock()
+    container = breaker(table, clock, batch=5)
+    with mock.patch.object(table, 'update_item', wraps=table.update_item) as update_item:
+        for _ in range(4):
+            container.call(ok)
+        update_item.assert_not_called()
+
+        container.call(ok)
+        assert update_item.call_count == 1
+        assert update_item.call_args.kwargs['ExpressionAttributeValues'][':calls'] == 5
+
+        container.call(ok)
+        fail_calls(container, 1)
+        # the healthy call not written yet is counted with the failure
+        assert update_item.call_args.kwargs['ExpressionAttributeValues'][':calls'] == 2
+
+def test_state_should_be_shared_between_containers(table):
+    clock = FakeClock()
+    first, second = breaker(table, clock), breaker(table, clock)
+    second.call(ok) # state cached while closed, healthy call not written yet
+    fail_calls(first, 4)
+
+    clock.now += 1 # cached state expired
+    with pytest.raises(CircuitOpen):
+        second.call(ok)
+    assert metric_names(second) == ['CircuitRejected'] # the transition is published once
+
+def test_single_probe_after_cooldown_should_close_circuit(table):
+    clock = FakeClock()
+    first, second = breaker(table, clock), breaker(table, clock)
+    fail_calls(first, 4)
+    clock.now += 30
+
+    probe = first.before()
+    assert probe is not None and first.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        second.call(ok)
+
+    first.after(probe, True, 0.1)
+    assert first.state == CLOSED
+    clock.now += 1
+    assert second.call(ok) == 'ok'
+    # failures counted before the circuit opened do not open it again
+    fail_calls(second, 1)
+    assert second.state == CLOSED
+    assert metric_names(first) == ['CircuitOpened', 'CircuitHalfOpened', 'CircuitClosed']
+
+def test_failed_probe_should_open_circuit_again(table):
+    clock = FakeClock()
+    container = breaker(table, clock)
+    fail_calls(container, 4)
+    clock.now += 30
+
+    fail_calls(container, 1)
+
+    assert container.state == OPEN
+    clock.now += 29
+    with pytest.raises(CircuitOpen):
+        container.call(ok)
+
+def test_lost_probe_should_be_replaced_after_cooldown(table):
+    clock = FakeClock()
+    first, second = breaker(table, clock), breaker(table, clock)
+    fail_calls(first, 4)
+    clock.now += 30
+    assert first.before() is not None # container killed before reporting
+
+    clock.now += 30
+    assert second.call(ok) == 'ok'
+    assert second.state == CLOSED
+
+def test_check_should_reject_without_taking_the_probe(table):
+    clock = FakeClock()
+    container = breaker(table, clock)
+    container.check()
+    fail_calls(container, 4)
+
+    with pytest.raises(CircuitOpen):
+        container.check()
+    clock.now += 30
+    container.check()
+    assert container.state == OPEN
+    assert container.call(ok) == 'ok' # the probe is still available
+    assert container.state == CLOSED
+
+def test_errors_that_are_not_failures_should_not_open_circuit(table):
+    container = breaker(table, FakeClock(), is_failure=lambda error: not isinstance(error, ValueError))
+
+    for _ in range(4):
+        with pytest.raises(ValueError):
+            container.call(mock.Mock(side_effect=ValueError('Invalid parameters')))
+
+    assert container.state == CLOSED
+
+def test_from_env_without_table_should_disable_breaker():
+    with mock.patch.dict(os.environ, {}, clear=True):
+        assert circuitbreaker.from_env('address-api') is None
+
+def test_from_env_should_configure_breaker():
+    with mock.patch.dict(os.environ, {'CIRCUIT_BREAKER_TABLE': 'circuitBreaker', 'CIRCUIT_BREAKER_MIN_CALLS': '20',
+                                      'AWS_DEFAULT_REGION': 'eu-west-1'}, clear=True):
+        container = circuitbreaker.from_env('address-api')
+    assert container.min_calls == 20
+    assert container.cooldown == 30
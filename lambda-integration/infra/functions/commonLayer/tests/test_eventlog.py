@@ -0,0 +1,102 @@
+import io
+import json
+import timeit
+from unittest import mock
+import pytest
+from aws_lambda_powertools import Logger
+from common import eventlog
+
+EVENT = {
+    'firstname': 'Corinne', 'lastname': 'Berthier', 'birthdate': '1965-12-06', 'countrybirth': 'FR',
+    'country': 'FR', 'postalcode': '80000', 'city': 'Amiens', 'street': '8 Boulevard du Port',
+    'email': 'corinne.berthier@example.com', 'idcard': 'berthier.jpeg',
+    'requestId': '52fdfc07-2182-154f-163f-5f0f9a621d72',
+    'identity': {'firstname': 'CORINNE', 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'},
+    'user': [{'Payload': {'address': '8 Boulevard du Port 80000 Amiens', 'addressStatus': 'VERIFIED'}}]
+}
+
+def logger(name):
+    stream = io.StringIO()
+    return Logger(service=name, stream=stream), stream
+
+def records(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_redactor_should_redact_pii_at_any_depth():
+    redacted = eventlog.Redactor().redact(EVENT)
+
+    assert redacted['firstname'] == eventlog.REDACTED
+    assert redacted['identity'] == {'firstname': '***', 'lastname': '***', 'birthdate': '***'}
+    assert redacted['user'][0]['Payload'] == {'address': '***', 'addressStatus': 'VERIFIED'}
+    assert (redacted['country'], redacted['requestId']) == ('FR', EVENT['requestId'])
+    assert EVENT['firstname'] == 'Corinne' # not modified
+
+def test_redactor_should_match_wildcards():
+    redactor = eventlog.Redactor(('Records.*.key', 'a.**.b'))
+
+    assert redactor.redact({'Records': [{'s3': {'key': 1}, 'key': 2}], 'key': 3}) == \
+        {'Records': [{'s3': {'key': '***'}, 'key': 2}], 'key': 3}
+    assert redactor.redact({'a': {'b': 1, 'c': {'d': {'b': 2}}}, 'b': 3}) == \
+        {'a': {'b': '***', 'c': {'d': {'b': '***'}}}, 'b': 3}
+
+def test_sampled_invocation_should_log_redacted_event():
+    log, stream = logger('sampled')
+    handler = eventlog.EventLog(log, sample_rate=0.1).capture(lambda event, _: event['requestId'])
+
+    with mock.patch('common.eventlog.random.random', side_effect=[0.05, 0.5]):
+        handler(EVENT, None)
+        handler(EVENT, None)
+
+    logged = records(stream)
+    assert len(logged) == 1
+    assert logged[0]['message']['event']['lastname'] == eventlog.REDACTED
+
+def test_failed_invocation_should_log_event_and_buffered_records():
+    log, stream = logger('failed')
+    def handler(event, _):
+        log.debug('extracting %s', event['idcard'])
+        log.info('extracted')
+        if event.get('fail'):
+            raise ValueError('Could not extract information from the ID Card')
+    handler = eventlog.EventLog(log, sample_rate=0).capture(handler)
+
+    handler(EVENT, None)
+    assert [record['message'] for record in records(stream)] == ['extracted'] # debug record discarded
+    with pytest.raises(ValueError):
+        handler(dict(EVENT, fail=True), None)
+
+    logged = records(stream)[1:]
+    assert [record['level'] for record in logged] == ['INFO', 'DEBUG', 'ERROR']
+    assert logged[1]['message'] == 'extracting berthier.jpeg'
+    assert logged[2]['message']['event']['fail'] is True
+
+def test_loggers_of_a_service_should_share_the_buffer():
+    log, _ = logger('shared')
+    assert eventlog.EventLog(log).buffer is eventlog.EventLog(Logger(service='shared')).buffer
+    assert eventlog.EventLog(log, buffer_size=0).buffer is None
+
+@pytest.mark.parametrize('variables', [{'EVENT_LOG_SAMPLE_RATE': '2'}, {'EVENT_LOG_BUFFER_SIZE': 'x'}])
+def test_invalid_env_should_raise_error(variables):
+    with mock.patch.dict('os.environ', variables), pytest.raises(RuntimeError, match=r"EVENT_LOG_.*incorrect"):
+        eventlog.from_env(Logger(service='env'))
+
+def test_benchmark_event_logging():
+    """Log bytes and time per invocation, whole event logged vs sampled (run with -s to see the results)"""
+    number = 1000
+    def handler(event, _):
+        log.debug({'step': 'extraction', 'idcard': event['idcard']})
+        return event['requestId']
+
+    log, stream = logger('bench-full')
+    full = timeit.timeit(lambda: (log.info({'event': EVENT}), handler(EVENT, None)), number=number)
+    full_bytes = len(stream.getvalue())
+
+    results = []
+    for rate in (1, 0.1, 0.01):
+        log, stream = logger(f'bench-{rate}')
+        captured = eventlog.EventLog(log, sample_rate=rate).capture(handler)
+        seconds = timeit.timeit(lambda: captured(EVENT, None), number=number)
+        results.append(f"sampled {rate}: {len(stream.getvalue()) / number:.0f} bytes, {seconds / number * 1e6:.1f}us")
+        assert len(stream.getvalue()) <= full_bytes
+    print(f"\nwhole event: {full_bytes / number:.0f} bytes, {full / number * 1e6:.1f}us per invocation, "
+          + ', '.join(results))
@@ -0,0 +1,47 @@
+from datetime import date
+import pytest
+from common import mrz
+
+ANNA = {'firstnames': ['ANNA', 'MARIA'], 'lastname': 'ERIKSSON', 'birthdate': '1974-08-12'}
+
+# ICAO 9303 specimens
+TD1 = ['I<UTOD231458907<<<<<<<<<<<<<<<', '7408122F1204159UTO<<<<<<<<<<<6', 'ERIKSSON<<ANNA<MARIA<<<<<<<<<<']
+TD2 = ['I<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<', 'D231458907UTO7408122F1204159<<<<<<<6']
+TD3 = ['P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<', 'L898902C36UTO7408122F1204159ZE184226B<<<<<10']
+# French ID card issued before 2021
+FRENCH_ID = ['IDFRABERTHIER<<<<<<<<<<<<<<<<<750123', '9409923102854CORINNE<<<<<<<6512068F4']
+# issued in Corse-du-Sud: the department (2A) is not numeric
+CORSICAN_ID = ['IDFRABERTHIER<<<<<<<<<<<<<<<<<2A0123', '94092A0028541CORINNE<<<<<<<6512068F0']
+
+def test_check_digit():
+    assert mrz.check_digit('L898902C3') == '6'
+    assert mrz.check_digit('740812') == '2'
+    assert mrz.check_digit('<<<<<<') == '0'
+
+@pytest.mark.parametrize('lines', [TD1, TD2, TD3])
+def test_icao_formats_should_be_parsed(lines):
+    assert mrz.parse(['REPUBLIC OF UTOPIA', 'Surname / Nom'] + lines + ['signature']) == ANNA
+
+def test_french_id_card_should_be_parsed():
+    assert mrz.parse(FRENCH_ID) == {'firstnames': ['CORINNE'], 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'}
+
+def test_corsican_id_card_should_be_parsed():
+    assert mrz.parse(CORSICAN_ID) == {'firstnames': ['CORINNE'], 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'}
+
+def test_ocr_errors_should_be_fixed():
+    # spaces, filler read as '«' and O instead of 0 in a date
+    lines = ['P<UTOERIKSSON«ANNA<MARIA <<<<<<<<<<<<<<<<<<<', 'L898902C36UTO74O8122F1204159ZE184226B<<<<<10']
+
+    assert mrz.parse(lines) == ANNA
+
+def test_invalid_check_digit_should_not_be_parsed():
+    assert mrz.parse([TD3[0], TD3[1].replace('7408122', '7408132')]) is None
+    assert mrz.parse([FRENCH_ID[0], FRENCH_ID[1].replace('CORINNE', 'CORINNA')]) is None
+
+def test_truncated_mrz_should_not_be_parsed():
+    assert mrz.parse(['IDFRABERTHIER<', '9409923102854CORINNE', '<<<<<<6512068F4']) is None
+    assert mrz.parse([]) is None
+
+def test_birthdate_should_be_in_the_past():
+    assert mrz.birthdate('051231', today=date(2022, 3, 1)) == '2005-12-31'
+    assert mrz.birthdate('231231', today=date(2022, 3, 1)) == '1923-12-31'
@@ -0,0 +1,55 @@
+import random
+import timeit
+import pytest
+from common import phonetic
+
+@pytest.mark.parametrize('first, second', [
+    (('Berthier', 'Corinne Marie'), ('BERTHIER', 'Marie-Corinne')),
+    (('Berthier', 'Corinne'), ('Berhtier', 'Corine')),
+    (('Lefèvre', 'Chloé'), ('Lefebvre', 'Chloe')),
+    (('Le Gall', 'Jean'), ('Legall', 'Jehan')),
+    (('Dupont', 'Philippe'), ('Dupond', 'Filipe')),
+    (('Müller', 'Gaëlle'), ('Mueller', 'Gael')),
+    (('Nguyen', 'Guy'), ('NGUYEN', 'Gui'))
+])
+def test_name_variants_should_have_the_same_key(first, second):
+    assert phonetic.name_key(*first) == phonetic.name_key(*second)
+
+def test_different_names_should_have_different_keys():
+    assert phonetic.name_key('Berthier', 'Corinne') != phonetic.name_key('Bertin', 'Corinne')
+    assert phonetic.name_key('Berthier', 'Corinne') != phonetic.name_key('Berthier', 'Paul')
+    assert phonetic.name_key('Berthier', 'Gérard') != phonetic.name_key('Berthier', 'Guerard')
+
+def test_distance_should_count_transpositions_and_stop_at_maximum():
+    assert phonetic.distance('BERTHIER', 'BERHTIER', 3) == 1
+    assert phonetic.distance('BERTHIER', 'BERTIER', 3) == 1
+    assert phonetic.distance('BERTHIER', 'MARTIN', 2) == 3
+    assert phonetic.distance('', 'ABC', 5) == 3
+
+def test_rank_should_return_similar_users_most_similar_first():
+    users = [
+        {'id': '1', 'lastname': 'Bertin', 'firstname': 'Karine'},
+        {'id': '2', 'lastname': 'Berhtier', 'firstname': 'Corine'},
+        {'id': '3', 'lastname': 'BERTHIER', 'firstname': 'Marie Corinne'},
+        {'id': '4', 'lastname': 'Berthier', 'firstname': 'Corinne Marie'},
+        {'id': '5', 'lastname': 'Berthier', 'firstname': 'Corinne'}
+    ]
+
+    candidates = phonetic.rank('Berthier', 'Corinne Marie', users)
+
+    # same names in another order, then a missing first name; a typo in each name is not enough
+    assert [(candidate['id'], candidate['score']) for candidate in candidates] == [('3', 1.0), ('4', 1.0), ('5', 0.95)]
+    assert [candidate['id'] for candidate in phonetic.rank('Berthier', 'Corinne', users)][-1] == '2'
+
+def test_benchmark_lookup_scoring():
+    """Time of the key and of the ranking of the candidates of a query (run with -s to see the results)"""
+    rng = random.Random(42)
+    def typo(name):
+        i = rng.randrange(len(name) - 1)
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    users = [{'id': str(i), 'lastname': typo('Berthier'), 'firstname': typo('Corinne')} for i in range(50)]
+    number = 200
+    key = timeit.timeit(lambda: phonetic.name_key('Berthier', 'Corinne Marie'), number=number)
+    ranking = timeit.timeit(lambda: phonetic.rank('Berthier', 'Corinne', users), number=number)
+    print(f"\nname key: {key / number * 1e6:.1f}us, ranking of {len(users)} candidates: {ranking / number * 1e3:.2f}ms")
+    assert ranking / number < 0.01
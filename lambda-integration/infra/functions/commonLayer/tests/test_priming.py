@@ -0,0 +1,107 @@
+import os
+import time
+import timeit
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+import pytest
+import requests
+from botocore.exceptions import ClientError
+from common import priming
+
+def invalid_job(**_):
+    raise ClientError({'Error': {'Code': 'InvalidJobIdException', 'Message': 'Invalid job id'}}, 'GetDocumentAnalysis')
+
+def test_prime_should_report_the_latency_saved_by_each_connection():
+    clock = iter([0.0, 0.0, 0.3, 0.3, 0.32, 0.32])
+    logger = mock.Mock()
+    metrics = mock.Mock()
+    primer = priming.Primer(logger, metrics, clock=lambda: next(clock)).add('textract', invalid_job)
+
+    report = primer.prime()
+
+    # an error returned by the service means the connection is open
+    assert report == {
+        'primed': {'textract': {'cold': 300.0, 'warm': 20.0, 'saved': 280.0}},
+        'failed': {},
+        'duration': 320.0,
+        'saved': 280.0
+    }
+    logger.info.assert_called_once_with({'connectionPriming': report})
+    assert [call.kwargs['name'] for call in metrics.add_metric.call_args_list] == [
+        'ConnectionPrimingTime', 'ConnectionPrimingSaved']
+
+def test_prime_should_not_fail_on_connection_errors_and_slow_targets():
+    def unreachable():
+        raise requests.ConnectionError('Name or service not known')
+    logger = mock.Mock()
+    primer = priming.Primer(logger, timeout=0.1).add('api', unreachable).add('slow', lambda: time.sleep(0.5))
+
+    report = primer.prime()
+
+    assert report['failed'] == {'api': 'Name or service not known', 'slow': 'timeout'}
+    assert report['primed'] == {} and report['saved'] == 0
+    logger.warning.assert_called_once()
+
+def test_init_should_only_prime_when_enabled():
+    call = mock.Mock()
+    with mock.patch.dict(os.environ, {'PRIME_CONNECTIONS': 'false'}):
+        priming.from_env(mock.Mock()).add('table', call).init()
+    call.assert_not_called()
+
+    with mock.patch.dict(os.environ, {'PRIME_CONNECTIONS': 'true'}):
+        primer = priming.from_env(mock.Mock()).add('table', call).init()
+    assert call.call_count == 2 and 'table' in primer.report['primed']
+
+def test_incorrect_env_var_should_raise_error():
+    with mock.patch.dict(os.environ, {'PRIME_CONNECTIONS': 'yes'}), pytest.raises(RuntimeError):
+        priming.from_env(mock.Mock())
+    with mock.patch.dict(os.environ, {'PRIME_CONNECTIONS_TIMEOUT': 'soon'}), pytest.raises(RuntimeError):
+        priming.from_env(mock.Mock())
+
+def test_warmup_event_should_prime_without_calling_the_handler():
+    call = mock.Mock()
+    handler = mock.Mock(return_value='result')
+    primer = priming.Primer(mock.Mock()).add('table', call)
+    wrapped = primer.warmup(handler)
+
+    first = wrapped({'warmup': True}, None)
+    second = wrapped({'warmup': True}, None)
+
+    assert first == second == {'warmup': primer.report}
+    # already primed by the first warm-up event
+    assert call.call_count == 2
+    handler.assert_not_called()
+    assert wrapped({'warmup': 'true', 'idcard': 'card.png'}, None) == 'result'
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def log_message(self, *args):
+        pass
+
+def test_benchmark_first_request():
+    """First request of a new session vs after priming (run with -s to see the results, local TCP only: no DNS nor TLS)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/search/'
+    number = 200
+    try:
+        cold = timeit.timeit(lambda: requests.Session().get(url), number=number)
+        sessions = []
+        for _ in range(number):
+            session = requests.Session()
+            priming.Primer(mock.Mock()).add('api', lambda: session.head(url)).prime()
+            sessions.append(session)
+        sessions = iter(sessions)
+        primed = timeit.timeit(lambda: next(sessions).get(url), number=number)
+    finally:
+        server.shutdown()
+    print(f"\nfirst request: {cold / number * 1000:.2f} ms cold, {primed / number * 1000:.2f} ms primed")
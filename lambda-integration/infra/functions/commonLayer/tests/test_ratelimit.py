@@ -0,0 +1,111 @@
+import os
+import threading
+from unittest import mock
+import boto3
+import pytest
+from moto import mock_aws
+from common import ratelimit
+from common.ratelimit import FixedWindowLimiter, RateLimitExceeded
+
+@pytest.fixture
+def table():
+    with mock_aws():
+        ddb = boto3.resource('dynamodb', region_name='eu-west-1')
+        yield ddb.create_table(
+            TableName='rateLimit',
+            KeySchema=[{'AttributeName': 'bucket', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'bucket', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+class AtomicTable:
+    """moto does not make conditional updates atomic across threads, DynamoDB does"""
+
+    def __init__(self, table):
+        self.table = table
+        self.meta = table.meta
+        self.lock = threading.Lock()
+
+    def update_item(self, **kwargs):
+        with self.lock:
+            return self.table.update_item(**kwargs)
+
+class FakeClock:
+    def __init__(self, now=1000.25):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def test_tokens_should_be_leased_in_batches(table):
+    clock = FakeClock()
+    bucket = FixedWindowLimiter(table, 'textract', rate=10, lease=5, clock=clock, sleep=clock.sleep)
+
+    for _ in range(10):
+        bucket.acquire(time_left=0)
+
+    assert bucket.coordination_calls == 2
+    assert table.get_item(Key={'bucket': 'textract#1000'})['Item']['taken'] == 10
+    with pytest.raises(RateLimitExceeded):
+        bucket.acquire(time_left=0)
+
+def test_should_wait_for_next_window_when_time_allows(table):
+    clock = FakeClock(1000.75)
+    bucket = FixedWindowLimiter(table, 'textract', rate=1, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire()
+    bucket.acquire(time_left=5)
+
+    assert clock.now == 1001
+
+def test_should_fail_fast_when_deadline_is_close(table):
+    clock = FakeClock(1000.25)
+    bucket = FixedWindowLimiter(table, 'textract', rate=1, max_wait=2, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire()
+    with pytest.raises(RateLimitExceeded):
+        bucket.acquire(time_left=0.5)
+    assert clock.now == 1000.25
+
+def test_concurrent_containers_should_share_the_rate(table):
+    """Simulate 16 containers, each with its own local cache, taking tokens at the same time"""
+    clock = FakeClock()
+    shared = AtomicTable(table)
+    granted = []
+    barrier = threading.Barrier(16)
+
+    def container():
+        bucket = FixedWindowLimiter(shared, 'address', rate=50, lease=4, clock=clock, sleep=clock.sleep)
+        barrier.wait()
+        count = 0
+        try:
+            while True:
+                bucket.acquire(time_left=0)
+                count += 1
+        except RateLimitExceeded:
+            granted.append((count, bucket.coordination_calls))
+
+    threads = [threading.Thread(target=container) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(count for count, _ in granted) == 50
+    # much fewer DynamoDB calls than tokens
+    assert sum(calls for _, calls in granted) < 50
+
+def test_time_left_from_context():
+    context = mock.Mock()
+    context.get_remaining_time_in_millis.return_value = 3000
+    assert ratelimit.time_left(context, 0.5) == 2.5
+    assert ratelimit.time_left(None) is None
+
+@mock.patch.dict(os.environ, {'AWS_DEFAULT_REGION': 'eu-west-1'}, clear=True)
+def test_from_env_should_be_disabled_without_table():
+    assert ratelimit.from_env('textract', 'TEXTRACT_RATE_LIMIT') is None
+    with mock.patch.dict(os.environ, {'RATE_LIMIT_TABLE': 'rateLimit', 'TEXTRACT_RATE_LIMIT': '10'}):
+        assert ratelimit.from_env('textract', 'TEXTRACT_RATE_LIMIT').rate == 10
@@ -0,0 +1,71 @@
+import timeit
+from datetime import date, timedelta
+import pytest
+from common import schema
+
+REGISTRATION = {
+    'firstname': 'Corinne', 'lastname': 'Berthier', 'birthdate': '1965-12-06', 'countrybirth': 'FR',
+    'country': 'FR', 'postalcode': '80 000', 'city': 'Amiens', 'street': '8 Boulevard du Port',
+    'email': 'corinne.berthier@example.com', 'idcard': 'berthier.jpeg'
+}
+
+def test_valid_registration_should_have_no_errors():
+    assert schema.registration.errors(REGISTRATION) == []
+    assert schema.registration.validate(REGISTRATION) is REGISTRATION
+
+def test_errors_should_list_each_invalid_field():
+    registration = dict(REGISTRATION, firstname='', countrybirth='FRA', email='c@b', idcard=42)
+    del registration['city']
+
+    assert schema.registration.errors(registration) == [
+        'firstname is required', 'city is required', 'countrybirth must be at most 2 characters long',
+        'email must be at least 6 characters long', 'idcard must be a string'
+    ]
+
+def test_countrybirth_should_only_be_limited_to_2_characters():
+    # same constraint as the model of the API
+    assert schema.registration.errors(dict(REGISTRATION, countrybirth='F')) == []
+
+@pytest.mark.parametrize('birthdate', ['1965-02-30', (date.today() + timedelta(days=1)).isoformat()])
+def test_birthdate_should_be_a_real_date_in_the_past(birthdate):
+    assert schema.registration.errors(dict(REGISTRATION, birthdate=birthdate)) == [
+        'birthdate must be a valid date in the past'
+    ]
+
+@pytest.mark.parametrize('idcards, error', [
+    ('berthier-back.jpeg', 'idcards must be a list'),
+    (['1.jpeg', '2.jpeg', '3.jpeg', '4.jpeg'], 'idcards must have at most 3 items'),
+    (['berthier-back.jpeg', 42], 'idcards items must be a string'),
+    (['berthier-back.jpeg', ''], 'idcards items must be at least 1 characters long')
+])
+def test_other_images_should_be_a_short_list_of_keys(idcards, error):
+    assert schema.registration.errors(dict(REGISTRATION, idcards=['berthier-back.jpeg'])) == []
+    assert schema.registration.errors(dict(REGISTRATION, idcards=idcards)) == [error]
+
+def test_validate_should_raise_all_errors():
+    with pytest.raises(schema.ValidationError, match=r"^Invalid parameters: postalcode must match .*, email must be") as error:
+        schema.registration.validate(dict(REGISTRATION, postalcode='8000', email='corinne@example'), 'Invalid parameters')
+
+    assert len(error.value.errors) == 2
+    assert isinstance(error.value, ValueError)
+
+def test_subset_should_only_check_the_projected_fields():
+    address = schema.registration.subset(('street', 'city', 'postalcode'))
+
+    assert address.errors({'street': '8 Boulevard du Port', 'city': 'Amiens', 'postalcode': '80000'}) == []
+    assert address.errors({'street': '8 Boulevard du Port', 'postalcode': 'x'}) == [
+        'city is required', r'postalcode must match ^\d{2}[ ]?\d{3}$'
+    ]
+    assert address.errors('not an object') == ['must be an object']
+
+def test_benchmark_validation():
+    """Validation overhead per event, compiled once vs compiled for each event (run with -s to see the results)"""
+    number = 2000
+    invalid = dict(REGISTRATION, birthdate='06/12/1965', email='x')
+    compiled = timeit.timeit(lambda: schema.registration.errors(REGISTRATION), number=number)
+    errors = timeit.timeit(lambda: schema.registration.errors(invalid), number=number)
+    uncompiled = timeit.timeit(lambda: schema.Validator.compile(schema.REGISTRATION_SCHEMA).errors(REGISTRATION),
+                               number=number)
+    print(f"\nvalid: {compiled / number * 1e6:.1f}us, invalid: {errors / number * 1e6:.1f}us, "
+          f"compiled per event: {uncompiled / number * 1e6:.1f}us")
+    assert compiled < uncompiled
@@ -0,0 +1,78 @@
+import json
+import timeit
+from unittest import mock
+import boto3
+import pytest
+from moto import mock_aws
+from common import serialization
+
+REGISTRATION = {
+    "firstname": "Corinne",
+    "lastname": "Berthier",
+    "birthdate": "1965-12-06",
+    "requestId": "52fdfc07-2182-154f-163f-5f0f9a621d72",
+    "identity": {"firstname": "CORINNE", "lastname": "BERTHIER", "birthdate": "1965-12-06"},
+    "error": {"Error": "ValueError", "Cause": json.dumps({"errorMessage": "Could not extract", "stackTrace": ["x" * 500] * 500})}
+}
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client('s3', region_name='eu-west-1')
+        client.create_bucket(Bucket='payloads', CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'})
+        yield client
+
+def test_dumps_loads_roundtrip():
+    assert serialization.loads(serialization.dumps(REGISTRATION)) == REGISTRATION
+
+def test_dumps_without_orjson_should_fall_back_to_json():
+    with mock.patch.object(serialization, 'orjson', None):
+        data = serialization.dumps(REGISTRATION)
+        assert serialization.loads(data) == REGISTRATION
+    assert json.loads(data) == REGISTRATION
+
+def test_project_should_keep_only_requested_fields():
+    result = serialization.project(REGISTRATION, ('firstname', 'identity.birthdate', 'missing', 'firstname.nested'))
+
+    assert result == {"firstname": "Corinne", "identity": {"birthdate": "1965-12-06"}}
+
+def test_offload_should_move_big_values_to_s3(s3):
+    result = serialization.offload(REGISTRATION, s3, 'payloads', 'dlq/123', threshold=1024)
+
+    assert result['firstname'] == "Corinne"
+    assert result['error'] == {'$s3ref': 'dlq/123/error.json'}
+    assert len(serialization.dumps(result)) < 1024
+    assert serialization.resolve(result, s3, 'payloads') == REGISTRATION
+
+def test_offload_should_not_record_stats(s3):
+    serialization.stats.reset()
+
+    serialization.offload(REGISTRATION, s3, 'payloads', 'dlq/123', threshold=1024)
+
+    assert serialization.stats.count == 0
+
+def test_report_should_publish_metrics_and_reset():
+    serialization.stats.reset()
+    serialization.dumps(REGISTRATION)
+    metrics = mock.MagicMock()
+
+    serialization.report(metrics)
+
+    names = [call.kwargs['name'] for call in metrics.add_metric.call_args_list]
+    assert names == ['SerializedBytes', 'SerializationTime']
+    assert metrics.add_metric.call_args_list[0].kwargs['value'] == len(serialization.dumps(REGISTRATION).encode('utf-8'))
+    serialization.stats.reset()
+    serialization.report(metrics)
+    assert metrics.add_metric.call_count == 2
+
+def test_benchmark_encoders():
+    """Compare orjson and json encoding time (run with -s to see the results)"""
+    number = 200
+    fast = timeit.timeit(lambda: serialization.dumps(REGISTRATION), number=number)
+    with mock.patch.object(serialization, 'orjson', None):
+        stdlib = timeit.timeit(lambda: serialization.dumps(REGISTRATION), number=number)
+    size = len(serialization.dumps(REGISTRATION))
+    projected = len(serialization.dumps(serialization.project(REGISTRATION, ('firstname', 'lastname', 'birthdate'))))
+    print(f"\n{serialization.ENCODER}: {fast / number * 1e6:.1f}us, json: {stdlib / number * 1e6:.1f}us, "
+          f"size: {size} bytes, projected: {projected} bytes")
+    assert projected < size
@@ -0,0 +1,54 @@
+import string
+import random
+import timeit
+import threading
+from datetime import datetime, timezone
+from common import ulid
+
+def test_encoding_should_match_the_ulid_spec():
+    # 2016-07-30T22:36:16.385Z, example of the spec
+    assert ulid.encode(1469918176385 << 80)[:10] == '01ARYZ6S41'
+    assert ulid.timestamp('01ARYZ6S41TSV4RRFFQ69G5FAV') == datetime(2016, 7, 30, 22, 36, 16, 385000, timezone.utc)
+    assert ulid.encode((1 << 128) - 1) == '7' + 'Z' * 25
+
+def test_ids_should_increase_within_a_millisecond_and_when_the_clock_goes_back():
+    clock = iter([1000.0, 1000.0, 1000.0, 999.0])
+    generator = ulid.Generator(clock=lambda: next(clock), randbytes=lambda _: b'\xff' * 10)
+
+    ids = [generator.new() for _ in range(4)]
+
+    assert ids == sorted(ids) and len(set(ids)) == 4
+    # random part overflow moves the timestamp on
+    assert ulid.timestamp(ids[1]) == datetime.fromtimestamp(1000.001, timezone.utc)
+
+def test_ids_should_be_unique_across_threads():
+    generator = ulid.Generator()
+    ids = []
+    def generate():
+        ids.extend(generator.new() for _ in range(1000))
+    threads = [threading.Thread(target=generate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == 4000
+
+def test_bounds_should_select_the_ids_of_a_time_range():
+    start = datetime(2022, 3, 1, 10, tzinfo=timezone.utc)
+    generator = ulid.Generator(clock=lambda: start.timestamp() + 0.5)
+    shard = ulid.shard_of('52fdfc07-2182-154f-163f-5f0f9a621d72', 8)
+    user_id = generator.new(shard + '-')
+
+    assert ulid.lower_bound(start, shard + '-') <= user_id <= ulid.upper_bound(start.replace(second=1), shard + '-')
+    assert not user_id <= ulid.upper_bound(start, shard + '-')
+    assert shard == ulid.shard_of('52fdfc07-2182-154f-163f-5f0f9a621d72', 8) and 0 <= int(shard) < 8
+
+def test_benchmark_generators():
+    """ULID vs 16 random characters (run with -s to see the results)"""
+    number = 20000
+    characters = string.ascii_letters + string.digits
+    generator = ulid.Generator()
+    choice = timeit.timeit(lambda: ''.join(random.choice(characters) for i in range(16)), number=number)
+    ulids = timeit.timeit(lambda: generator.new('03-'), number=number)
+    print(f"\nrandom.choice: {number / choice:,.0f} ids/s, ulid: {number / ulids:,.0f} ids/s")
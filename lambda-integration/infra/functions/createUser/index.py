@@ -12,19 +12,25 @@
 # NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
 # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-"""Lambda function that insert a user in DynamoDB"""
+"""Lambda function that insert a user in DynamoDB
+
+With PRIME_CONNECTIONS, the connection to DynamoDB is opened in the init phase (see common.priming).
+"""
 import os
-import string
-import random
 from datetime import datetime
 from aws_lambda_powertools import Tracer
 from aws_lambda_powertools import Logger
 from pynamodb.models import Model
 from pynamodb.attributes import (
-    UnicodeAttribute, UTCDateTimeAttribute
+    UnicodeAttribute, UnicodeSetAttribute, UTCDateTimeAttribute
 )
+from common import eventlog
+from common import phonetic
+from common import ulid
+from common import priming
 
 logger = Logger()
+event_log = eventlog.from_env(logger)
 tracer = Tracer()
 
 if 'USER_TABLE' not in os.environ or os.environ['USER_TABLE'] is None:
@@ -32,6 +38,13 @@ if 'USER_TABLE' not in os.environ or os.environ['USER_TABLE'] is None:
 
 USER_TABLE = os.environ['USER_TABLE']
 
+# the writes of the 'created' index (users by creation time) are spread on the shards
+USER_SHARDS = int(os.environ.get('USER_SHARDS', '8'))
+if not 0 < USER_SHARDS < 100:
+    raise RuntimeError('USER_SHARDS env var is incorrect, must be between 1 and 99')
+
+ids = ulid.Generator()
+
 class User(Model):
     """Model for a User to be inserted in DynamoDB"""
 
@@ -46,17 +59,31 @@ class User(Model):
     birthdate = UnicodeAttribute()
     birthcountry = UnicodeAttribute()
     address = UnicodeAttribute()
+    # PENDING_VERIFICATION when the address API was unavailable (see verifyAddress)
+    address_status = UnicodeAttribute(null=True)
     email = UnicodeAttribute()
     idcardref = UnicodeAttribute()
+    # partition of the 'created' index, also the prefix of the id
+    shard = UnicodeAttribute(null=True)
+    # key of the phonetic index, to find the similar users (see checkExistingUser)
+    name_key = UnicodeAttribute(null=True)
+    # similar users found when this one registered, for the fraud review
+    duplicate_of = UnicodeSetAttribute(null=True)
     created_at = UTCDateTimeAttribute()
     updated_at = UTCDateTimeAttribute()
 
+# connection of the first invocation, opened in the init phase (PRIME_CONNECTIONS) or by a warm-up event
+primer = priming.from_env(logger).add('userTable', User.describe_table).init()
+
 @tracer.capture_lambda_handler()
 @logger.inject_lambda_context
+@event_log.capture
+@primer.warmup
 def handler(event, _):
 
-    characters = string.ascii_letters + string.digits
-    user_id = ''.join(random.choice(characters) for i in range(16))
+    # same shard for all the attempts of a request
+    shard = ulid.shard_of(event['user'].get('requestId') or ids.new(), USER_SHARDS)
+    user_id = ids.new(shard + '-')
     now = datetime.utcnow()
 
     user = User(id = user_id,
@@ -65,8 +92,12 @@ def handler(event, _):
         birthdate=event['user']['birthdate'],
         birthcountry=event['user']['countrybirth'],
         address=event['user']['address'],
+        address_status=event['user'].get('addressStatus'),
         email=event['user']['email'],
         idcardref=event['user']['idcard'],
+        shard=shard,
+        name_key=phonetic.name_key(event['user']['lastname'], event['user']['firstname']),
+        duplicate_of={candidate['id'] for candidate in event.get('duplicateCandidates', [])} or None,
         created_at = now,
         updated_at = now
     )
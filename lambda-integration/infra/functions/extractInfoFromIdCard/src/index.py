@@ -12,44 +12,307 @@
 # NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
 # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-"""Lambda function that extract information from an ID Card picture, using Amazon Textract"""
+"""Lambda function that extract information from an ID Card picture, using Amazon Textract
+
+When MRZ_FAST_PATH is enabled, the text of the document is first read with text detection (faster
+and cheaper) to parse its machine readable zone (MRZ). The form analysis is only used for documents
+without a valid MRZ.
+
+When EXTRACTION_CACHE_TABLE is set, the extraction is started as soon as the ID card is uploaded
+(``upload_handler``, on the S3 events of the upload bucket) and its result is stored in the table:
+the workflow then gets it from the table, or waits for it if it is still in progress. The results are
+keyed by the S3 key and the ETag of the image, so an ID card uploaded again under the same key is read again.
+
+Some fields are printed on the back of the document (e.g. the MRZ of the French ID cards since 2021):
+the keys of its other images (``idcards``) are read concurrently with the first one, and the reading
+stops as soon as all the fields are found and the images still being read cannot take precedence
+over them (the invocation waits, at most READ_DRAIN_SECONDS, for the Textract calls already made). The extractions started on upload are only used for the
+documents of a single image.
+
+With PRIME_CONNECTIONS, the connections to Textract and DynamoDB are opened in the init phase (see
+common.priming).
+"""
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
+from urllib.parse import unquote_plus
 import boto3
 from aws_lambda_powertools import Tracer
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools import Metrics
+from aws_lambda_powertools.metrics import MetricUnit
 from trp import Document
+from common import ratelimit
+from common import mrz
+from common import schema
+from common import serialization
+from common import eventlog
+from common import priming
 
 logger = Logger()
+event_log = eventlog.from_env(logger)
 tracer = Tracer()
+metrics = Metrics()
 
 textract = boto3.client('textract', region_name=os.environ['AWS_REGION'])
+s3 = boto3.client('s3', region_name=os.environ['AWS_REGION'])
 
 if 'UPLOAD_BUCKET' not in os.environ or os.environ['UPLOAD_BUCKET'] is None or not os.environ['UPLOAD_BUCKET']:
     raise RuntimeError('UPLOAD_BUCKET env var is not set')
 
 UPLOAD_BUCKET = os.environ["UPLOAD_BUCKET"]
 
+# Textract TPS shared by all the containers (disabled if TEXTRACT_RATE_LIMIT is not set)
+limiter = ratelimit.from_env('textract', 'TEXTRACT_RATE_LIMIT')
+
+# time kept for the Textract call itself when waiting for a token
+TEXTRACT_CALL_SECONDS = 10
+
+MRZ_FAST_PATH = os.environ.get('MRZ_FAST_PATH', 'false').lower() == 'true'
+
+# DetectDocumentText has its own TPS quota
+detect_limiter = ratelimit.from_env('textract-detect', 'TEXTRACT_DETECT_RATE_LIMIT')
+
+# results of the extractions started on upload (disabled if EXTRACTION_CACHE_TABLE is not set)
+cache = (boto3.resource('dynamodb').Table(os.environ['EXTRACTION_CACHE_TABLE'])
+         if os.environ.get('EXTRACTION_CACHE_TABLE') else None)
+
+# ID cards uploaded but never submitted expire
+CACHE_TTL_SECONDS = int(os.environ.get('EXTRACTION_CACHE_TTL', str(24 * 3600)))
+
+# time the workflow waits for an extraction in progress before extracting by itself
+CACHE_WAIT_SECONDS = float(os.environ.get('EXTRACTION_CACHE_WAIT', '5'))
+CACHE_POLL_SECONDS = 0.2
+
+IN_PROGRESS = 'IN_PROGRESS'
+DONE = 'DONE'
+FAILED = 'FAILED'
+
+# fields of the registration schema this step receives
+IDCARD = schema.registration.subset(('idcard',))
+IDCARDS = schema.registration.subset(('idcards',))
+
+REQUIRED_FIELDS = ('firstnames', 'lastname', 'birthdate')
+
+# precedence of the readings when the images disagree: the MRZ (with check digits) before the printed fields
+MRZ = 'mrz'
+FORMS = 'forms'
+SOURCES = (MRZ, FORMS)
+
+# one thread per image of a document, all sharing the Textract client
+executor = ThreadPoolExecutor(
+    max_workers=1 + schema.REGISTRATION_SCHEMA['properties']['idcards']['maxItems'])
+
+# time given to the images still being read once the fields are settled, so that no thread keeps running
+# (and calling Textract) while the container is frozen
+READ_DRAIN_SECONDS = float(os.environ.get('READ_DRAIN_SECONDS', str(TEXTRACT_CALL_SECONDS)))
+
+# connections of the first invocation, opened in the init phase (PRIME_CONNECTIONS) or by a warm-up event
+primer = priming.from_env(logger, metrics).add(
+    'textract', lambda: textract.get_document_analysis(JobId='priming'))
+if limiter is not None:
+    primer.add('rateLimitTable', lambda: limiter.table.get_item(Key={'bucket': 'priming'}))
+if detect_limiter is not None:
+    primer.add('detectRateLimitTable', lambda: detect_limiter.table.get_item(Key={'bucket': 'priming'}))
+if cache is not None:
+    primer.add('extractionCacheTable', lambda: cache.get_item(Key={'s3key': 'priming'}))
+    primer.add('uploadBucket', lambda: s3.head_bucket(Bucket=UPLOAD_BUCKET))
+primer.init()
+
+@tracer.capture_lambda_handler(capture_response=False)
+@logger.inject_lambda_context
+@metrics.log_metrics
+@event_log.capture
+@primer.warmup
+def handler(event, context):
+    if IDCARD.errors(event):
+        raise ValueError('Missing idcard parameter')
+    s3key = event['idcard']
+    IDCARDS.validate(event, 'Invalid idcards parameter')
+    others = [key for key in dict.fromkeys(event.get('idcards') or []) if key != s3key]
+    if others:
+        return extract_document([s3key] + others, context)
+
+    if cache is None:
+        return extract(s3key, context)
+
+    # no extraction started on upload (e.g. S3 event not received yet): extract now and store it
+    key = cache_key(s3key, s3.head_object(Bucket=UPLOAD_BUCKET, Key=s3key)['ETag'])
+    item = get_cached(key)
+    if item is None and claim(key):
+        metrics.add_metric(name='ExtractionCacheHit', unit=MetricUnit.Count, value=0)
+        return extract_and_cache(s3key, key, context)
+
+    item = wait_for_extraction(key, item, context)
+    hit = item is not None and item['status'] == DONE
+    # the average of the metric is the hit rate
+    metrics.add_metric(name='ExtractionCacheHit', unit=MetricUnit.Count, value=1 if hit else 0)
+    if hit:
+        logger.info({'extraction': 'cache'})
+        return serialization.loads(item['result'])
+
+    # the extraction on upload failed or takes too long
+    return extract(s3key, context)
+
 @tracer.capture_lambda_handler(capture_response=False)
 @logger.inject_lambda_context
-def handler(event, _):
+@metrics.log_metrics
+@event_log.capture
+def upload_handler(event, context):
+    """Extract the information of the ID cards as soon as they are uploaded (S3 events)"""
+    for record in event['Records']:
+        s3key = unquote_plus(record['s3']['object']['key'])
+        key = cache_key(s3key, record['s3']['object']['eTag'])
+        if not claim(key):
+            continue # already extracted or in progress (S3 events can be delivered twice)
+        try:
+            extract_and_cache(s3key, key, context)
+        except Exception as error: # the workflow extracts it again
+            logger.warning({'s3key': s3key, 'error': str(error)})
+
+def cache_key(s3key, etag):
+    """Key of the extraction of a version of the image (the ETag is quoted by HeadObject, not in S3 events)"""
+    return s3key + '#' + etag.strip('"')
+
+def get_cached(key):
+    return cache.get_item(Key={'s3key': key}, ConsistentRead=True).get('Item')
+
+def claim(key):
+    """Mark the extraction of key as in progress, False if it has already been started"""
+    try:
+        cache.update_item(
+            Key={'s3key': key},
+            UpdateExpression='SET #status = :status, expires_at = :expires_at',
+            ConditionExpression='attribute_not_exists(s3key)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':status': IN_PROGRESS, ':expires_at': int(time.time()) + CACHE_TTL_SECONDS}
+        )
+        return True
+    except cache.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+def store(key, status, result=None):
+    cache.update_item(
+        Key={'s3key': key},
+        UpdateExpression='SET #status = :status, #result = :result',
+        ExpressionAttributeNames={'#status': 'status', '#result': 'result'},
+        ExpressionAttributeValues={':status': status, ':result': serialization.dumps(result)}
+    )
+
+def extract_and_cache(s3key, key, context):
     try:
-        if not event['idcard']:
-            raise KeyError('idcard empty')
-    except KeyError as error:
-        raise ValueError('Missing idcard parameter') from error
-    else:
-        s3key = event['idcard']
-
-    response = extract_info_from_id(UPLOAD_BUCKET, s3key)
-
-    result = {
-        'firstnames': None,
-        'lastname': None,
-        'birthdate': None
-    }
-    doc = Document(response)
-    for field in doc.pages[0].form.fields:
+        result = extract(s3key, context)
+    except Exception:
+        store(key, FAILED)
+        raise
+    store(key, DONE, result)
+    return result
+
+def wait_for_extraction(key, item, context):
+    """Cached item of key, once it is not in progress anymore or after CACHE_WAIT_SECONDS"""
+    wait = CACHE_WAIT_SECONDS
+    remaining = ratelimit.time_left(context, TEXTRACT_CALL_SECONDS)
+    if remaining is not None:
+        wait = max(0, min(wait, remaining))
+    deadline = time.monotonic() + wait
+    if item is None:
+        item = get_cached(key)
+    while item is not None and item['status'] == IN_PROGRESS and time.monotonic() < deadline:
+        time.sleep(CACHE_POLL_SECONDS)
+        item = get_cached(key)
+    return item
+
+def extract(s3key, context):
+    """Extract the first names, last name and birthdate from the ID card"""
+    return complete(read_image(s3key, context)[1])
+
+def extract_document(s3keys, context):
+    """Extract the fields of a document from its images, read concurrently until the fields are settled"""
+    stop = threading.Event()
+    futures = {executor.submit(read_image, s3key, context, stop.is_set): index for index, s3key in enumerate(s3keys)}
+    pending = set(futures.values())
+    readings = []
+    error = None
+    try:
+        for future in as_completed(futures):
+            pending.discard(futures[future])
+            try:
+                reading = future.result()
+            except ValueError as image_error: # the other images may have the fields
+                error = error or image_error
+                reading = None
+            if reading is not None:
+                readings.append((SOURCES.index(reading[0]), futures[future], reading[1]))
+            if readings and settled(readings, pending):
+                logger.info({'extraction': 'document', 'images': len(s3keys), 'read': len(readings)})
+                return merge(readings)
+    finally:
+        # the images not read yet are cancelled, the ones being read stop before the form analysis
+        stop.set()
+        for future in futures:
+            future.cancel()
+        drain(futures, context)
+
+    if not readings:
+        raise error
+    return complete(merge(readings))
+
+def drain(futures, context):
+    """Wait for the images still being read, at most READ_DRAIN_SECONDS (and the time left)"""
+    timeout = READ_DRAIN_SECONDS
+    remaining = ratelimit.time_left(context)
+    if remaining is not None:
+        timeout = max(0, min(timeout, remaining))
+    running = wait(futures, timeout=timeout).not_done
+    if running:
+        logger.warning({'imagesStillRead': len(running)})
+
+def merge(readings):
+    """Fields of the (source, image, fields) readings, each one taken from the MRZ first, then from the first image"""
+    result = dict.fromkeys(REQUIRED_FIELDS)
+    for _, _, fields in sorted(readings, key=lambda reading: reading[:2]):
+        for field in REQUIRED_FIELDS:
+            if result[field] is None:
+                result[field] = fields.get(field)
+    return result
+
+def settled(readings, pending):
+    """True if the readings give all the fields, and none of the images still pending can change them"""
+    if pending:
+        # best reading a pending image can still give: its MRZ with the fast path, its form otherwise
+        best = (SOURCES.index(MRZ if MRZ_FAST_PATH else FORMS), min(pending))
+        readings = [reading for reading in readings if reading[:2] < best]
+    result = merge(readings)
+    return all(result[field] is not None for field in REQUIRED_FIELDS)
+
+def complete(result):
+    if any(result[field] is None for field in REQUIRED_FIELDS):
+        raise ValueError('Could not extract all information from the ID Card')
+    return result
+
+def read_image(s3key, context, cancelled=lambda: False):
+    """(source, fields) read on an image (None for the fields not found), None if cancelled"""
+    if cancelled():
+        return None
+    if MRZ_FAST_PATH:
+        identity = mrz.parse(text_lines(detect_text(UPLOAD_BUCKET, s3key,
+                                                    ratelimit.time_left(context, TEXTRACT_CALL_SECONDS))))
+        if identity is not None:
+            logger.info({'extraction': 'mrz'})
+            return MRZ, identity
+        logger.info({'extraction': 'forms', 'reason': 'no valid MRZ'})
+
+    if cancelled():
+        return None
+    response = extract_info_from_id(UPLOAD_BUCKET, s3key, ratelimit.time_left(context, TEXTRACT_CALL_SECONDS))
+    return FORMS, form_fields(Document(response).pages[0].form.fields)
+
+def form_fields(fields):
+    """Fields read in the key-value pairs of the form analysis"""
+    result = dict.fromkeys(REQUIRED_FIELDS)
+    for field in fields:
         if any(x in field.key.text for x in ["Prénom", "Given name"]):
             result['firstnames'] = field.value.text.split(', ')
         elif any(x in field.key.text for x in ["DATE DE NAISS", "Date of birth", "Né(e) le"]):
@@ -57,13 +320,12 @@ def handler(event, _):
             result['birthdate'] = datetime.strftime(datetime.strptime(bdate, "%d %m %Y"), '%Y-%m-%d')
         elif any(x in field.key.text for x in ["Nom", "NOM", "Surname"]):
             result['lastname'] = field.value.text
-
-    if result['firstnames'] is None or result['lastname'] is None or result['birthdate'] is None:
-        raise ValueError('Could not extract all information from the ID Card')
-
     return result
 
-def extract_info_from_id(bucket, s3key):
+def extract_info_from_id(bucket, s3key, time_left=None):
+    if limiter is not None:
+        limiter.acquire(time_left)
+
     try:
         response = textract.analyze_document(
             Document={
@@ -76,4 +338,36 @@ def extract_info_from_id(bucket, s3key):
         )
         return response
     except Exception as error:
-        raise ValueError('Could not extract information from the ID Card') from error
\ No newline at end of file
+        raise ValueError('Could not extract information from the ID Card') from error
+
+def detect_text(bucket, s3key, time_left=None):
+    if detect_limiter is not None:
+        detect_limiter.acquire(time_left)
+
+    try:
+        return textract.detect_document_text(
+            Document={
+                'S3Object' : {
+                    'Bucket': bucket,
+                    'Name': s3key
+                }
+            }
+        )
+    except Exception as error:
+        raise ValueError('Could not extract information from the ID Card') from error
+
+def text_lines(response):
+    """Text of the lines read on the document, the lines of the same row (e.g. a MRZ line split by the OCR) joined"""
+    rows = []
+    blocks = [block for block in response['Blocks'] if block['BlockType'] == 'LINE']
+    for block in sorted(blocks, key=lambda block: block['Geometry']['BoundingBox']['Top']):
+        box = block['Geometry']['BoundingBox']
+        # the middle of the block is within the previous row
+        if rows and box['Top'] + box['Height'] / 2 < rows[-1]['bottom']:
+            rows[-1]['blocks'].append(block)
+            rows[-1]['bottom'] = max(rows[-1]['bottom'], box['Top'] + box['Height'])
+        else:
+            rows.append({'blocks': [block], 'bottom': box['Top'] + box['Height']})
+    return [' '.join(block['Text'] for block in sorted(row['blocks'],
+                                                       key=lambda block: block['Geometry']['BoundingBox']['Left']))
+            for row in rows]
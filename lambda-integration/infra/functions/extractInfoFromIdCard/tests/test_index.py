@@ -15,8 +15,12 @@
 import pytest
 import os
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock, TestCase
 from importlib import reload
+from urllib.parse import quote_plus
 from dataclasses import dataclass
 # import botocore.session
 # from botocore.stub import Stubber
@@ -37,13 +41,22 @@ def load_mock_file(path):
     expected_response_file = open(os.path.join(os.path.dirname(__file__),path), 'r')
     return json.load(expected_response_file)
 
-def extract_happy_path(_, __):
+def extract_happy_path(*_):
     return load_mock_file('res/happy_path.json')
 
-def extract_no_id(_, __):
+def extract_no_id(*_):
     return load_mock_file('res/no_id.json')
 
-def extract_raise_error(_, __):
+def detect_passport(*_):
+    return load_mock_file('res/detect_passport.json')
+
+def detect_id_card(*_):
+    return load_mock_file('res/detect_id_card.json')
+
+def detect_old_id_card(*_):
+    return load_mock_file('res/detect_old_id_card.json')
+
+def extract_raise_error(*_):
     raise ValueError('Could not extract information from the ID Card')
 
 with mock.patch.dict(os.environ, {'UPLOAD_BUCKET':'my_bucket', 'AWS_REGION':'eu-central-1'}, clear=True):
@@ -79,3 +92,280 @@ class ExtractInfoFromIdCardTest(TestCase):
     def test_empty_input_should_raise_error(self, lambda_context):
         with pytest.raises(ValueError, match=r"Missing idcard parameter"):
             index.handler({'idcard':''}, lambda_context)
+
+    def test_extract_should_take_a_token_before_calling_textract(self):
+        limiter = mock.Mock()
+        with mock.patch.object(index, 'limiter', limiter), \
+             mock.patch.object(index.textract, 'analyze_document', return_value={}) as analyze:
+            index.extract_info_from_id('my_bucket', 'id_card.jpeg', 12.5)
+
+        limiter.acquire.assert_called_once_with(12.5)
+        analyze.assert_called_once()
+
+    @mock.patch('src.index.MRZ_FAST_PATH', True)
+    @mock.patch('src.index.extract_info_from_id', side_effect=extract_happy_path)
+    @mock.patch('src.index.detect_text', side_effect=detect_passport)
+    def test_passport_mrz_should_skip_form_analysis(self, detect, extract):
+        result = index.handler({"idcard":"passport.jpeg"}, mock.MagicMock())
+
+        assert result == {'firstnames': ['CORINNE', 'MARIE'], 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'}
+        detect.assert_called_once()
+        extract.assert_not_called()
+
+    @mock.patch('src.index.MRZ_FAST_PATH', True)
+    @mock.patch('src.index.extract_info_from_id', side_effect=extract_happy_path)
+    @mock.patch('src.index.detect_text', side_effect=detect_id_card)
+    def test_id_card_mrz_should_skip_form_analysis(self, _, extract):
+        result = index.handler({"idcard":"id_card.jpeg"}, mock.MagicMock())
+
+        assert result == {'firstnames': ['CORINNE', 'MARIE'], 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'}
+        extract.assert_not_called()
+
+    @mock.patch('src.index.MRZ_FAST_PATH', True)
+    @mock.patch('src.index.extract_info_from_id', side_effect=extract_happy_path)
+    @mock.patch('src.index.detect_text', side_effect=detect_old_id_card)
+    def test_invalid_mrz_should_fall_back_to_form_analysis(self, detect, extract):
+        result = index.handler({"idcard":"id_card.jpeg"}, mock.MagicMock())
+
+        assert result == {'firstnames': ['CORINNE'], 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'}
+        detect.assert_called_once()
+        extract.assert_called_once()
+
+    def test_text_lines_should_join_blocks_of_the_same_row(self):
+        lines = index.text_lines(detect_passport())
+
+        assert lines[-2].replace(' ', '') == 'P<FRABERTHIER<<CORINNE<MARIE<<<<<<<<<<<<<<<<'
+        assert lines[-1] == '19AB123454FRA6512068F2905143<<<<<<<<<<<<<<06'
+
+    def test_detect_should_take_a_token_before_calling_textract(self):
+        limiter = mock.Mock()
+        with mock.patch.object(index, 'detect_limiter', limiter), \
+             mock.patch.object(index.textract, 'detect_document_text', return_value={}) as detect:
+            index.detect_text('my_bucket', 'id_card.jpeg', 12.5)
+
+        limiter.acquire.assert_called_once_with(12.5)
+        detect.assert_called_once()
+
+# list prices per page (first million pages a month)
+TEXTRACT_PRICES = {'detect_document_text': 0.0015, 'analyze_document': 0.05}
+
+def test_benchmark_extraction_paths():
+    """Textract cost and local processing time of each path (run with -s to see the results)"""
+    import timeit
+    fixtures = {
+        'passport (MRZ)': detect_passport,
+        'ID card since 2021 (MRZ)': detect_id_card,
+        'ID card before 2021 (forms)': detect_old_id_card
+    }
+    for name, detect in fixtures.items():
+        for fast_path in (False, True):
+            with mock.patch.object(index, 'MRZ_FAST_PATH', fast_path), mock.patch.object(index.logger, 'info'), \
+                 mock.patch.object(index, 'detect_text', side_effect=detect) as detect_call, \
+                 mock.patch.object(index, 'extract_info_from_id', side_effect=extract_happy_path) as extract_call:
+                context = mock.MagicMock()
+                seconds = timeit.timeit(lambda: index.handler({'idcard': 'id_card.jpeg'}, context), number=20) / 20
+                cost = (detect_call.call_count * TEXTRACT_PRICES['detect_document_text']
+                        + extract_call.call_count * TEXTRACT_PRICES['analyze_document']) / 20
+            print(f"\n{name}, MRZ fast path {'on' if fast_path else 'off'}: "
+                  f"${cost * 1000:.2f} per 1000 documents, {seconds * 1000:.2f}ms of processing (without Textract)")
+
+IDENTITY = {'firstnames': ['CORINNE'], 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'}
+
+@pytest.fixture
+def cache():
+    """ extraction cache table (moto) """
+    from moto import mock_aws
+    import boto3
+    with mock.patch.dict(os.environ, {'AWS_DEFAULT_REGION': 'eu-central-1'}), mock_aws():
+        table = boto3.resource('dynamodb').create_table(
+            TableName='extraction-cache',
+            KeySchema=[{'AttributeName': 's3key', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 's3key', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST')
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='my_bucket', CreateBucketConfiguration={'LocationConstraint': 'eu-central-1'})
+        with mock.patch.object(index, 'cache', table), mock.patch.object(index, 's3', s3), \
+             mock.patch.object(index, 'CACHE_POLL_SECONDS', 0), \
+             mock.patch.object(index.metrics, 'add_metric') as add_metric:
+            yield table, add_metric
+
+def upload(key, body=b'id card'):
+    """Put the image in the upload bucket, return its S3 event and its cache key"""
+    etag = index.s3.put_object(Bucket='my_bucket', Key=key, Body=body)['ETag']
+    event = {'Records': [{'s3': {'bucket': {'name': 'my_bucket'},
+                                 'object': {'key': quote_plus(key), 'eTag': etag.strip('"')}}}]}
+    return event, index.cache_key(key, etag)
+
+def hits(add_metric):
+    return [call.kwargs['value'] for call in add_metric.call_args_list if call.kwargs['name'] == 'ExtractionCacheHit']
+
+def test_extraction_started_on_upload_should_be_returned_by_the_workflow(cache):
+    table, add_metric = cache
+    event, key = upload('abc+1.jpeg')
+    with mock.patch.object(index, 'extract', return_value=IDENTITY) as extract:
+        index.upload_handler(event, mock.MagicMock())
+        index.upload_handler(event, mock.MagicMock()) # duplicate event
+        result = index.handler({'idcard': 'abc+1.jpeg'}, mock.MagicMock())
+
+    assert result == IDENTITY
+    extract.assert_called_once()
+    item = table.get_item(Key={'s3key': key})['Item']
+    assert item['status'] == index.DONE
+    assert item['expires_at'] > time.time() + 3600
+    assert hits(add_metric) == [1]
+
+def test_workflow_without_upload_event_should_extract_and_cache(cache):
+    table, add_metric = cache
+    event, key = upload('abc.jpeg')
+    with mock.patch.object(index, 'extract', return_value=IDENTITY) as extract:
+        assert index.handler({'idcard': 'abc.jpeg'}, mock.MagicMock()) == IDENTITY
+        index.upload_handler(event, mock.MagicMock()) # late event
+
+    extract.assert_called_once()
+    assert table.get_item(Key={'s3key': key})['Item']['status'] == index.DONE
+    assert hits(add_metric) == [0]
+
+def test_id_card_uploaded_again_should_be_extracted_again(cache):
+    _, add_metric = cache
+    other = dict(IDENTITY, firstnames=['MARIE'])
+    with mock.patch.object(index, 'extract', side_effect=[IDENTITY, other]) as extract:
+        index.upload_handler(upload('abc.jpeg')[0], mock.MagicMock())
+        index.upload_handler(upload('abc.jpeg', b'another id card')[0], mock.MagicMock())
+        result = index.handler({'idcard': 'abc.jpeg'}, mock.MagicMock())
+
+    assert result == other
+    assert extract.call_count == 2
+    assert hits(add_metric) == [1]
+
+def test_workflow_should_wait_for_an_extraction_in_progress(cache):
+    _, add_metric = cache
+    _, key = upload('abc.jpeg')
+    in_progress = {'s3key': key, 'status': index.IN_PROGRESS}
+    done = {'s3key': key, 'status': index.DONE, 'result': json.dumps(IDENTITY)}
+    with mock.patch.object(index, 'get_cached', side_effect=[in_progress, in_progress, done]) as get_cached, \
+         mock.patch.object(index, 'extract') as extract:
+        result = index.handler({'idcard': 'abc.jpeg'}, mock.MagicMock())
+
+    assert result == IDENTITY
+    assert get_cached.call_count == 3
+    extract.assert_not_called()
+    assert hits(add_metric) == [1]
+
+def test_extraction_in_progress_for_too_long_should_be_done_again(cache):
+    table, add_metric = cache
+    table.put_item(Item={'s3key': upload('abc.jpeg')[1], 'status': index.IN_PROGRESS})
+    with mock.patch.object(index, 'CACHE_WAIT_SECONDS', 0.05), \
+         mock.patch.object(index, 'extract', return_value=IDENTITY) as extract:
+        assert index.handler({'idcard': 'abc.jpeg'}, mock.MagicMock()) == IDENTITY
+
+    extract.assert_called_once()
+    assert hits(add_metric) == [0]
+
+def test_failed_extraction_on_upload_should_be_done_again(cache):
+    table, add_metric = cache
+    event, key = upload('abc.jpeg')
+    with mock.patch.object(index, 'extract', side_effect=[ValueError('Could not extract'), IDENTITY]) as extract:
+        index.upload_handler(event, mock.MagicMock())
+        assert table.get_item(Key={'s3key': key})['Item']['status'] == index.FAILED
+        assert index.handler({'idcard': 'abc.jpeg'}, mock.MagicMock()) == IDENTITY
+
+    assert extract.call_count == 2
+    assert hits(add_metric) == [0]
+
+def textract_stub(fixtures):
+    """Textract response of each image key, from the fixtures (a ValueError is raised)"""
+    def call(bucket, s3key, *_):
+        fixture = fixtures[s3key]
+        if isinstance(fixture, Exception):
+            raise fixture
+        return load_mock_file(fixture) if isinstance(fixture, str) else fixture()
+    return call
+
+def test_front_and_back_should_be_merged():
+    analyze = textract_stub({'front.jpeg': 'res/idcard_front.json', 'back.jpeg': 'res/idcard_back.json'})
+    with mock.patch.object(index, 'extract_info_from_id', side_effect=analyze) as extract:
+        result = index.handler({'idcard': 'front.jpeg', 'idcards': ['back.jpeg', 'front.jpeg']}, mock.MagicMock())
+
+    assert result == IDENTITY
+    assert sorted(call.args[1] for call in extract.call_args_list) == ['back.jpeg', 'front.jpeg']
+
+def test_mrz_of_the_back_should_take_precedence_over_the_printed_fields():
+    detect = textract_stub({'front.jpeg': detect_old_id_card, 'back.jpeg': detect_id_card})
+    analyze = textract_stub({'front.jpeg': 'res/idcard_front.json'})
+    with mock.patch.object(index, 'MRZ_FAST_PATH', True), \
+         mock.patch.object(index, 'detect_text', side_effect=detect), \
+         mock.patch.object(index, 'extract_info_from_id', side_effect=analyze):
+        result = index.handler({'idcard': 'front.jpeg', 'idcards': ['back.jpeg']}, mock.MagicMock())
+
+    assert result == {'firstnames': ['CORINNE', 'MARIE'], 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'}
+
+def test_reading_should_stop_once_all_fields_are_found():
+    release = threading.Event()
+    def detect_back(*_):
+        release.wait(5)
+        return detect_old_id_card()
+    detect = textract_stub({'front.jpeg': detect_id_card, 'back.jpeg': detect_back, 'other.jpeg': detect_back})
+    executor = ThreadPoolExecutor(max_workers=1)
+    with mock.patch.object(index, 'MRZ_FAST_PATH', True), mock.patch.object(index, 'executor', executor), \
+         mock.patch.object(index, 'READ_DRAIN_SECONDS', 0.05), \
+         mock.patch.object(index, 'detect_text', side_effect=detect) as detect_call, \
+         mock.patch.object(index, 'extract_info_from_id', side_effect=extract_happy_path) as extract:
+        result = index.handler({'idcard': 'front.jpeg', 'idcards': ['back.jpeg', 'other.jpeg']}, mock.MagicMock())
+        release.set()
+        executor.shutdown(wait=True)
+
+    # the MRZ of the front cannot be overridden by the other images
+    assert result == {'firstnames': ['CORINNE', 'MARIE'], 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'}
+    # the other image was still pending, the back (if being read) stopped before the form analysis
+    assert [call.args[1] for call in detect_call.call_args_list] in (['front.jpeg'], ['front.jpeg', 'back.jpeg'])
+    extract.assert_not_called()
+
+def test_images_being_read_should_be_waited_for():
+    started, read = threading.Event(), threading.Event()
+    def detect_front(*_):
+        started.wait(5)
+        return detect_id_card()
+    def detect_back(*_):
+        started.set()
+        time.sleep(0.2)
+        read.set()
+        return detect_old_id_card()
+    detect = textract_stub({'front.jpeg': detect_front, 'back.jpeg': detect_back})
+    with mock.patch.object(index, 'MRZ_FAST_PATH', True), \
+         mock.patch.object(index, 'detect_text', side_effect=detect), \
+         mock.patch.object(index, 'extract_info_from_id', side_effect=extract_happy_path) as extract:
+        index.handler({'idcard': 'front.jpeg', 'idcards': ['back.jpeg']}, mock.MagicMock())
+
+        # no Textract call is left running when the handler returns
+        assert read.is_set()
+    extract.assert_not_called()
+
+def test_mrz_of_the_back_read_last_should_take_precedence():
+    def detect_back(*_):
+        time.sleep(0.2)
+        return detect_id_card()
+    # the form of the front has all the fields and is read before the MRZ of the back
+    detect = textract_stub({'front.jpeg': detect_old_id_card, 'back.jpeg': detect_back})
+    with mock.patch.object(index, 'MRZ_FAST_PATH', True), \
+         mock.patch.object(index, 'detect_text', side_effect=detect), \
+         mock.patch.object(index, 'extract_info_from_id', side_effect=extract_happy_path) as extract:
+        result = index.handler({'idcard': 'front.jpeg', 'idcards': ['back.jpeg']}, mock.MagicMock())
+
+    assert result == {'firstnames': ['CORINNE', 'MARIE'], 'lastname': 'BERTHIER', 'birthdate': '1965-12-06'}
+    assert [call.args[1] for call in extract.call_args_list] == ['front.jpeg']
+
+def test_unreadable_image_should_not_fail_the_document():
+    analyze = textract_stub({'front.jpeg': 'res/happy_path.json',
+                             'back.jpeg': ValueError('Could not extract information from the ID Card')})
+    with mock.patch.object(index, 'extract_info_from_id', side_effect=analyze):
+        assert index.handler({'idcard': 'front.jpeg', 'idcards': ['back.jpeg']}, mock.MagicMock()) == IDENTITY
+
+    analyze = textract_stub({'front.jpeg': 'res/idcard_front.json',
+                             'back.jpeg': ValueError('Could not extract information from the ID Card')})
+    with mock.patch.object(index, 'extract_info_from_id', side_effect=analyze), \
+         pytest.raises(ValueError, match=r"Could not extract all information from the ID Card"):
+        index.handler({'idcard': 'front.jpeg', 'idcards': ['back.jpeg']}, mock.MagicMock())
+
+def test_invalid_images_should_raise_error():
+    with pytest.raises(ValueError, match=r"Invalid idcards parameter: idcards must be a list"):
+        index.handler({'idcard': 'front.jpeg', 'idcards': 'back.jpeg'}, mock.MagicMock())
@@ -14,12 +14,14 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """Lambda function that put an event on User Event Bus to notify backends"""
 import os
-import json
 import boto3
 from aws_lambda_powertools import Tracer
 from aws_lambda_powertools import Logger
+from common import serialization
+from common import eventlog
 
 logger = Logger()
+event_log = eventlog.from_env(logger)
 tracer = Tracer()
 
 eb = boto3.client('events')
@@ -31,6 +33,7 @@ EVENTBUS_NAME = os.environ['EVENTBUS_NAME']
 
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler()
+@event_log.capture
 def handler(event, _):
 
     eb.put_events(
@@ -38,10 +41,12 @@ def handler(event, _):
             {
                 'Source': 'user',
                 'DetailType': 'UserCreated',
-                'Detail': json.dumps(event),
+                # the whole user is the contract of the UserCreated event
+                'Detail': serialization.dumps(event),
                 'EventBusName': EVENTBUS_NAME
             },
         ]
     )
+    serialization.report(logger=logger)
 
     return event
@@ -26,10 +26,17 @@ if 'CONNECTION_ENDPOINT' not in os.environ or os.environ['CONNECTION_ENDPOINT']
 
 apigw = boto3.client('apigatewaymanagementapi', endpoint_url=os.environ['CONNECTION_ENDPOINT'])
 
+# connection of the registrations onboarded in bulk (same value in bulkIngest), nobody to notify
+BULK_CONNECTION_ID = 'bulk'
+
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler()
 def handler(event, _):
 
+    if event.get('connectionId') == BULK_CONNECTION_ID:
+        logger.debug('Bulk registration, no user to notify')
+        return event
+
     if 'error' in event:
         data = {
             'error': True,
@@ -13,19 +13,22 @@
 # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import os
-import json
 import re
 import boto3
 from aws_lambda_powertools import Tracer
 from aws_lambda_powertools import Logger
 from aws_lambda_powertools import Metrics
 from aws_lambda_powertools.metrics import MetricUnit
+from common import serialization
+from common import eventlog
 
 logger = Logger()
+event_log = eventlog.from_env(logger)
 tracer = Tracer()
 metrics = Metrics()
 
 sqs = boto3.client('sqs')
+s3 = boto3.client('s3')
 
 SQS_URL_PATTERN = re.compile(r"^https:\/\/sqs.[a-z]{2}((-gov)|(-iso(b?)))?-[a-z]+-\d{1}.amazonaws.com\/\d{12}\/[a-zA-Z0-9-_]+$")
 
@@ -36,22 +39,34 @@ if ('SQS_QUEUE_URL' not in os.environ
 
 SQS_QUEUE_URL = os.environ['SQS_QUEUE_URL']
 
+# Bucket where oversized values are stored (optional, message is sent as is otherwise)
+PAYLOAD_BUCKET = os.environ.get('PAYLOAD_BUCKET')
+
+# Fields needed to replay the registration
+FIELDS = ('requestId', 'firstname', 'lastname', 'birthdate', 'countrybirth', 'country', 'postalcode', 'city',
+          'street', 'email', 'idcard', 'idcards', 'connectionId')
+
 @metrics.log_metrics
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler()
+@event_log.capture
 def handler(event, _):
     """Send a message on a SQS Queue"""
     try:
+        body = serialization.project(event, FIELDS)
+        if PAYLOAD_BUCKET:
+            body = serialization.offload(body, s3, PAYLOAD_BUCKET, 'dlq/' + event.get('requestId', 'unknown'))
         sqs.send_message(
             QueueUrl=SQS_QUEUE_URL,
-            MessageBody=json.dumps({i:event[i] for i in event if i!='error'}),
+            MessageBody=serialization.dumps(body),
             MessageAttributes={
                 'error': {
                     'DataType': 'String',
-                    'StringValue': json.loads(event['error']['Cause'])['errorMessage']
+                    'StringValue': serialization.loads(event['error']['Cause'])['errorMessage']
                 }
             }
         )
+        serialization.report(metrics=metrics)
     except Exception as error:
         # catch all errors, as we don't want to fail here
         metrics.add_metric(name="ErrorSendingToDLQ", unit=MetricUnit.Count, value=1)
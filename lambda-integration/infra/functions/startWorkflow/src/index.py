@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Lambda function in charge of starting the execution of a state machine
+
+Two execution modes are available (``EXECUTION_MODE`` env var):
+ * ``async`` (default): the execution is started and only the ``requestId`` is returned,
+   the result is later pushed to the user on the WebSocket.
+ * ``sync``: the (Express) state machine is run with ``start_sync_execution`` and its
+   output or error is directly returned. If the execution does not complete within
+   ``SYNC_EXECUTION_TIMEOUT`` seconds, the execution goes on and we fall back to the
+   asynchronous behaviour (result sent on the WebSocket).
+
+The registration is validated against the registration schema (``common.schema``) before the
+execution is started, all the invalid fields are returned at once.
+"""
+import os
+import re
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ReadTimeoutError
+from aws_lambda_powertools import Tracer
+from aws_lambda_powertools import Logger
+from common import serialization
+from common import schema
+from common import eventlog
+
+logger = Logger()
+event_log = eventlog.from_env(logger)
+tracer = Tracer()
+
+PATTERN = re.compile(r"^arn:(aws[a-zA-Z-]*)?:states:[a-z]{2}((-gov)|(-iso(b?)))?-[a-z]+-\d{1}:\d{12}:stateMachine:[a-zA-Z0-9-_]+$")
+
+if ('STATE_MACHINE_ARN' not in os.environ
+    or os.environ['STATE_MACHINE_ARN'] is None
+    or not PATTERN.match(os.environ['STATE_MACHINE_ARN'])):
+    raise RuntimeError('STATE_MACHINE_ARN env var is not set or incorrect')
+
+STATE_MACHINE_ARN = os.environ['STATE_MACHINE_ARN']
+
+# Fields of the registration passed to the workflow, anything else sent by the client is dropped
+FIELDS = ('firstname', 'lastname', 'birthdate', 'countrybirth', 'country', 'postalcode', 'city',
+          'street', 'email', 'idcard', 'idcards', 'connectionId')
+
+EXECUTION_MODES = ('async', 'sync')
+
+if 'EXECUTION_MODE' in os.environ and os.environ['EXECUTION_MODE']:
+    EXECUTION_MODE = os.environ['EXECUTION_MODE']
+else:
+    EXECUTION_MODE = 'async'
+
+if EXECUTION_MODE not in EXECUTION_MODES:
+    raise RuntimeError('EXECUTION_MODE env var is incorrect, must be one of ' + ', '.join(EXECUTION_MODES))
+
+if 'SYNC_EXECUTION_TIMEOUT' in os.environ and os.environ['SYNC_EXECUTION_TIMEOUT']:
+    SYNC_EXECUTION_TIMEOUT = os.environ['SYNC_EXECUTION_TIMEOUT']
+else:
+    SYNC_EXECUTION_TIMEOUT = '8'
+
+sfn = boto3.client('stepfunctions')
+
+# No retry on the synchronous client: retrying after a read timeout would start a second execution
+sfn_sync = boto3.client('stepfunctions', config=Config(
+    read_timeout=float(SYNC_EXECUTION_TIMEOUT),
+    retries={'total_max_attempts': 1}
+))
+
+@logger.inject_lambda_context
+@tracer.capture_lambda_handler
+@event_log.capture
+def handler(event, context):
+    """Start the execution of a state machine"""
+    event = serialization.project(event, FIELDS)
+    schema.registration.validate(event)
+    event['requestId'] = context.aws_request_id
+
+    if EXECUTION_MODE == 'sync':
+        try:
+            response = start_sync_execution(event)
+        except ReadTimeoutError:
+            logger.warning('Synchronous execution did not complete in time, the result will be sent on the WebSocket')
+            return {
+                "requestId" : event['requestId']
+            }
+        return map_sync_execution(event['requestId'], response)
+
+    try:
+        sfn.start_execution(
+            stateMachineArn=STATE_MACHINE_ARN,
+            input=serialization.dumps(event)
+        )
+        serialization.report(logger=logger)
+
+        return {
+            "requestId" : event['requestId']
+        }
+    except Exception as error:
+        logger.exception(error)
+        raise RuntimeError('Internal Error - cannot start the creation workflow') from error
+
+def start_sync_execution(event):
+    """Run the state machine and wait for its result"""
+    try:
+        response = sfn_sync.start_sync_execution(
+            stateMachineArn=STATE_MACHINE_ARN,
+            name=event['requestId'],
+            input=serialization.dumps(event)
+        )
+        serialization.report(logger=logger)
+        return response
+    except ReadTimeoutError:
+        raise
+    except Exception as error:
+        logger.exception(error)
+        raise RuntimeError('Internal Error - cannot start the creation workflow') from error
+
+def map_sync_execution(request_id, response):
+    """Map the result of a synchronous execution to the API response, raise an error if it failed"""
+    if response['status'] == 'SUCCEEDED':
+        return {
+            "requestId" : request_id,
+            "status": response['status'],
+            "output": serialization.loads(response['output']) if 'output' in response else None
+        }
+
+    logger.info({'status': response['status'], 'error': response.get('error'), 'cause': response.get('cause')})
+    raise ValueError('Account creation failed: ' + (response.get('cause') or response['status'].lower().replace('_', ' ')))
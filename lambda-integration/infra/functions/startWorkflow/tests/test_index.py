@@ -0,0 +1,130 @@
+import json
+import os
+from importlib import reload
+from unittest import mock
+from dataclasses import dataclass
+import pytest
+from botocore.stub import Stubber, ANY
+from botocore.exceptions import ReadTimeoutError
+
+STATE_MACHINE_ARN = 'arn:aws:states:eu-west-1:123456789012:stateMachine:accountCreation'
+
+REGISTRATION = {
+    'firstname': 'Corinne', 'lastname': 'BERTHIER', 'birthdate': '1965-12-06', 'countrybirth': 'FR',
+    'country': 'FR', 'postalcode': '80000', 'city': 'Amiens', 'street': '8 Boulevard du Port',
+    'email': 'corinne.berthier@example.com', 'idcard': 'berthier.jpeg', 'connectionId': 'abc='
+}
+
+@pytest.fixture
+def lambda_context():
+    """ mock Lambda context """
+    @dataclass
+    class LambdaContext:
+        function_name: str = "test"
+        memory_limit_in_mb: int = 128
+        invoked_function_arn: str = "arn:aws:lambda:eu-west-1:809313241:function:test"
+        aws_request_id: str = "52fdfc07-2182-154f-163f-5f0f9a621d72"
+
+    return LambdaContext()
+
+def mockenv(**envvars):
+    """ mock os.environ """
+    return mock.patch.dict(os.environ, envvars, clear=True)
+
+def load_index(mode):
+    with mockenv(STATE_MACHINE_ARN=STATE_MACHINE_ARN, EXECUTION_MODE=mode, AWS_DEFAULT_REGION='eu-west-1'):
+        from src import index
+        return reload(index) # avoid reusing previous config
+
+def sync_response(**kwargs):
+    response = {
+        'executionArn': STATE_MACHINE_ARN.replace('stateMachine', 'express') + ':52fdfc07',
+        'startDate': '2022-03-01T10:00:00Z',
+        'stopDate': '2022-03-01T10:00:01Z'
+    }
+    response.update(kwargs)
+    return response
+
+def test_async_mode_should_start_execution(lambda_context):
+    index = load_index('async')
+    with Stubber(index.sfn) as stubber:
+        stubber.add_response('start_execution',
+            {'executionArn': 'arn', 'startDate': '2022-03-01T10:00:00Z'},
+            {'stateMachineArn': STATE_MACHINE_ARN, 'input': ANY})
+
+        with mock.patch('common.serialization.dumps', wraps=json.dumps) as dumps:
+            result = index.handler(dict(REGISTRATION, unexpected='x' * 1000), lambda_context)
+
+        stubber.assert_no_pending_responses()
+    # unknown fields are not passed to the workflow
+    dumps.assert_called_once_with(dict(REGISTRATION, requestId=lambda_context.aws_request_id))
+    assert result == {'requestId': lambda_context.aws_request_id}
+
+def test_async_mode_error_should_raise_error(lambda_context):
+    index = load_index('async')
+    with Stubber(index.sfn) as stubber:
+        stubber.add_client_error('start_execution', 'StateMachineDoesNotExist')
+        with pytest.raises(RuntimeError, match=r"Internal Error.*"):
+            index.handler(dict(REGISTRATION), lambda_context)
+
+def test_sync_mode_should_return_output(lambda_context):
+    index = load_index('sync')
+    with Stubber(index.sfn_sync) as stubber:
+        stubber.add_response('start_sync_execution',
+            sync_response(status='SUCCEEDED', output=json.dumps([{'id': 'abc'}, {}])),
+            {'stateMachineArn': STATE_MACHINE_ARN, 'name': lambda_context.aws_request_id, 'input': ANY})
+
+        result = index.handler(dict(REGISTRATION), lambda_context)
+
+    assert result['requestId'] == lambda_context.aws_request_id
+    assert result['status'] == 'SUCCEEDED'
+    assert result['output'][0]['id'] == 'abc'
+
+def test_sync_mode_failure_should_raise_cause(lambda_context):
+    index = load_index('sync')
+    with Stubber(index.sfn_sync) as stubber:
+        stubber.add_response('start_sync_execution',
+            sync_response(status='FAILED', error='IncorrectAddress', cause='Address could not be verified'))
+        with pytest.raises(ValueError, match=r"Account creation failed: Address could not be verified"):
+            index.handler(dict(REGISTRATION), lambda_context)
+
+def test_sync_mode_timed_out_execution_should_raise_error(lambda_context):
+    index = load_index('sync')
+    with Stubber(index.sfn_sync) as stubber:
+        stubber.add_response('start_sync_execution', sync_response(status='TIMED_OUT'))
+        with pytest.raises(ValueError, match=r"Account creation failed: timed out"):
+            index.handler(dict(REGISTRATION), lambda_context)
+
+def test_sync_mode_read_timeout_should_fall_back_to_async(lambda_context):
+    index = load_index('sync')
+    with mock.patch.object(index.sfn_sync, 'start_sync_execution',
+                           side_effect=ReadTimeoutError(endpoint_url='https://sync-states')) as start_sync, \
+         mock.patch.object(index.sfn, 'start_execution') as start_async:
+        result = index.handler(dict(REGISTRATION), lambda_context)
+
+    assert start_sync.call_count == 1
+    start_async.assert_not_called() # execution keeps running, no second execution
+    assert result == {'requestId': lambda_context.aws_request_id}
+
+def test_sync_mode_error_should_raise_error(lambda_context):
+    index = load_index('sync')
+    with Stubber(index.sfn_sync) as stubber:
+        stubber.add_client_error('start_sync_execution', 'InvalidArn')
+        with pytest.raises(RuntimeError, match=r"Internal Error.*"):
+            index.handler(dict(REGISTRATION), lambda_context)
+
+def test_invalid_registration_should_return_all_errors_without_starting(lambda_context):
+    index = load_index('async')
+    registration = dict(REGISTRATION, birthdate='06/12/1965', postalcode='8000', email=None, country='BE')
+    with mock.patch.object(index.sfn, 'start_execution') as start:
+        with pytest.raises(ValueError) as error:
+            index.handler(registration, lambda_context)
+
+    start.assert_not_called()
+    assert str(error.value).startswith('Invalid registration: ')
+    assert error.value.errors == ['email is required', r'birthdate must match ^\d{4}-\d{2}-\d{2}$',
+                                  'country must be one of FR', r'postalcode must match ^\d{2}[ ]?\d{3}$']
+
+def test_invalid_mode_should_raise_error():
+    with pytest.raises(RuntimeError, match=r"EXECUTION_MODE env var is incorrect.*"):
+        load_index('whatever')
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Lambda function that runs all the input checks of the workflow in a single task
+
+Fused version of the 'Input checks' parallel state: the ID card extraction (Textract), the check
+of an existing user (DynamoDB) and the address validation (HTTP API) run concurrently with asyncio,
+the identity crosscheck runs as soon as the extraction is done. The logic of each step is the one
+of its own function (loaded from the sibling directories). Their errors are raised with the same
+message, as an IdCardError, IdentityError or AddressError the workflow routes on; the errors it
+retries (RateLimitExceeded, CircuitOpen) are raised as is.
+"""
+import os
+import asyncio
+import inspect
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from aws_lambda_powertools import Tracer
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools import Metrics
+from common import eventlog
+from common.ratelimit import RateLimitExceeded
+from common.circuitbreaker import CircuitOpen
+
+logger = Logger()
+event_log = eventlog.from_env(logger)
+tracer = Tracer()
+# flushes the metrics the steps add (e.g. the address API circuit breaker transitions)
+metrics = Metrics()
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+def load_step(name, path):
+    """Load the module of a step function from its own directory"""
+    spec = importlib.util.spec_from_file_location('steps.' + name, os.path.join(FUNCTIONS_DIR, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+extract_step = load_step('extract_info_from_id_card', 'extractInfoFromIdCard/src/index.py')
+identity_step = load_step('verify_identity', 'verifyIdentity/index.py')
+user_step = load_step('check_existing_user', 'checkExistingUser/index.py')
+address_step = load_step('verify_address', 'verifyAddress/src/index.py')
+
+# one thread per I/O bound step
+executor = ThreadPoolExecutor(max_workers=3)
+
+# errors retried by the workflow, not wrapped
+RETRIED_ERRORS = (RateLimitExceeded, CircuitOpen)
+
+class IdCardError(ValueError):
+    """ID card missing or unreadable (the registration is sent to the DLQ)"""
+
+class IdentityError(ValueError):
+    """Identity not matching the ID card, or user already existing"""
+
+class AddressError(ValueError):
+    """Address incorrect or not verifiable"""
+
+@tracer.capture_lambda_handler()
+@logger.inject_lambda_context
+@metrics.log_metrics
+@event_log.capture
+def handler(event, _):
+    """Run the input checks, return the same result as the 'Input checks' parallel state"""
+    return asyncio.run(validate(event))
+
+async def validate(event):
+    results = await asyncio.gather(
+        check_identity(event),
+        run_step(user_step, dict(event), IdentityError),
+        run_step(address_step, dict(event), AddressError),
+        return_exceptions=True
+    )
+
+    # same precedence as the sequential identity branch, then the address branch
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    return {
+        'user': results[2],
+        'duplicateCandidates': results[1]['duplicateCandidates']
+    }
+
+async def check_identity(event):
+    """Extract info from the ID card and crosscheck it with the user input"""
+    info = await run_step(extract_step, {'idcard': event.get('idcard'), 'idcards': event.get('idcards')}, IdCardError)
+
+    # same selection as the 'Extract info from ID' task
+    checked = dict(event, identity={
+        'firstname': info['firstnames'][0],
+        'lastname': info['lastname'],
+        'birthdate': info['birthdate']
+    })
+    try:
+        return inspect.unwrap(identity_step.handler)(checked, None)
+    except Exception as error:
+        raise IdentityError(str(error)) from error
+
+async def run_step(module, event, error_type):
+    """Run the handler of a step, its errors (except the retried ones) raised as error_type"""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, inspect.unwrap(module.handler), event, None)
+    except RETRIED_ERRORS:
+        raise
+    except Exception as error:
+        raise error_type(str(error)) from error
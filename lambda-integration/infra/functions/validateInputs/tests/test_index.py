@@ -0,0 +1,163 @@
+import os
+import json
+import time
+from unittest import mock
+from dataclasses import dataclass
+import pytest
+import responses
+
+@pytest.fixture
+def lambda_context():
+    """ mock Lambda context """
+    @dataclass
+    class LambdaContext:
+        function_name: str = "test"
+        memory_limit_in_mb: int = 128
+        invoked_function_arn: str = "arn:aws:lambda:eu-west-1:809313241:function:test"
+        aws_request_id: str = "52fdfc07-2182-154f-163f-5f0f9a621d72"
+
+    return LambdaContext()
+
+def load_mock_file(path):
+    expected_response_file = open(os.path.join(os.path.dirname(__file__), '..', '..', 'extractInfoFromIdCard', 'tests', path), 'r')
+    return json.load(expected_response_file)
+
+def extract_happy_path(*_):
+    time.sleep(0.2)
+    return load_mock_file('res/happy_path.json')
+
+def extract_no_id(*_):
+    return load_mock_file('res/no_id.json')
+
+def query_no_user(**_):
+    time.sleep(0.2)
+    return {'Count': 0}
+
+def query_similar_users(items):
+    """No user with the exact name, the items on the phonetic index"""
+    def query(**kwargs):
+        return {'Count': len(items), 'Items': items} if kwargs['IndexName'] == 'phonetic' else {'Count': 0}
+    return query
+
+def query_existing_user(**_):
+    return {'Count': 1}
+
+with mock.patch.dict(os.environ, {'UPLOAD_BUCKET':'my_bucket', 'USER_TABLE':'users', 'AWS_REGION':'eu-central-1',
+                                  'AWS_DEFAULT_REGION':'eu-central-1'}, clear=True):
+    from src import index
+
+REGISTRATION = {
+    "firstname": "Corinne",
+    "lastname": "Berthier",
+    "birthdate": "1965-12-06",
+    "street": "8 Boulevard du Port",
+    "postalcode": "80000",
+    "city": "Amiens",
+    "idcard": "id_card.jpeg"
+}
+
+def add_address_response(score=0.89):
+    def callback(_):
+        time.sleep(0.2)
+        return (200, {}, json.dumps({"features": [{"properties": {"label": "8 Boulevard du Port 80000 Amiens", "score": score}}]}))
+    responses.add_callback(responses.GET, index.address_step.ADDRESS_API, callback=callback)
+
+@responses.activate
+@mock.patch.object(index.user_step.table, 'query', side_effect=query_no_user)
+@mock.patch.object(index.extract_step, 'extract_info_from_id', side_effect=extract_happy_path)
+def test_happy_path_should_return_user(_, __, lambda_context):
+    add_address_response()
+
+    start = time.perf_counter()
+    result = index.handler(dict(REGISTRATION), lambda_context)
+    elapsed = time.perf_counter() - start
+
+    assert result['user']['address'] == "8 Boulevard du Port 80000 Amiens"
+    assert result['user']['idcard'] == "id_card.jpeg"
+    # the 3 calls (200ms each) run concurrently
+    assert elapsed < 0.5
+
+@responses.activate
+@mock.patch.object(index.user_step.table, 'query', side_effect=query_no_user)
+@mock.patch.object(index.extract_step, 'extract_info_from_id', side_effect=extract_no_id)
+def test_extraction_error_should_raise_extraction_error(_, __, lambda_context):
+    add_address_response(score=0.1)
+    with pytest.raises(index.IdCardError, match=r"Could not extract all information from the ID Card"):
+        index.handler(dict(REGISTRATION), lambda_context)
+
+@responses.activate
+@mock.patch.object(index.user_step.table, 'query', side_effect=query_no_user)
+@mock.patch.object(index.extract_step, 'extract_info_from_id', side_effect=extract_happy_path)
+def test_identity_mismatch_should_raise_error(_, __, lambda_context):
+    add_address_response()
+    with pytest.raises(index.IdentityError, match=r"Birthdate does not match with ID card.*"):
+        index.handler(dict(REGISTRATION, birthdate='1965-12-07'), lambda_context)
+
+@responses.activate
+@mock.patch.object(index.user_step.table, 'query', side_effect=query_existing_user)
+@mock.patch.object(index.extract_step, 'extract_info_from_id', side_effect=extract_happy_path)
+def test_existing_user_should_raise_error(_, __, lambda_context):
+    add_address_response()
+    with pytest.raises(index.IdentityError, match=r"User already exists"):
+        index.handler(dict(REGISTRATION), lambda_context)
+
+@responses.activate
+@mock.patch.object(index.user_step.table, 'query', side_effect=query_no_user)
+@mock.patch.object(index.extract_step, 'extract_info_from_id', side_effect=extract_happy_path)
+def test_invalid_address_should_raise_error(_, __, lambda_context):
+    add_address_response(score=0.5)
+    with pytest.raises(index.AddressError, match=r"Address is incorrect.*"):
+        index.handler(dict(REGISTRATION), lambda_context)
+
+def test_missing_idcard_should_raise_error(lambda_context):
+    registration = dict(REGISTRATION)
+    del registration['idcard']
+    with mock.patch.object(index.user_step.table, 'query', side_effect=query_no_user), \
+         mock.patch.object(index.address_step.requests, 'get', side_effect=Exception('Connection Error')):
+        with pytest.raises(index.IdCardError, match=r"Missing idcard parameter"):
+            index.handler(registration, lambda_context)
+
+@responses.activate
+@mock.patch.object(index.user_step, 'FUZZY_MATCHING', True)
+@mock.patch.object(index.extract_step, 'extract_info_from_id', side_effect=extract_happy_path)
+def test_similar_users_should_be_returned_as_duplicate_candidates(_, lambda_context):
+    add_address_response()
+    similar = [{'id': 'abc', 'lastname': 'BERTHIER', 'firstname': 'Corinne Marie', 'birthdate': '1965-12-06'}]
+    with mock.patch.object(index.user_step.table, 'query', side_effect=query_similar_users(similar)) as query:
+        result = index.handler(dict(REGISTRATION), lambda_context)
+
+    assert [call.kwargs['IndexName'] for call in query.call_args_list] == ['fullname', 'phonetic']
+    assert result['duplicateCandidates'] == [{'id': 'abc', 'score': 0.95, 'sameBirthdate': True}]
+
+@responses.activate
+@mock.patch.object(index.user_step, 'FUZZY_MATCHING', True)
+@mock.patch.object(index.extract_step, 'extract_info_from_id', side_effect=extract_happy_path)
+def test_user_with_the_same_normalized_name_should_exist(_, lambda_context):
+    add_address_response()
+    same = [{'id': 'abc', 'lastname': 'BERTHIER', 'firstname': 'corinne', 'birthdate': '1970-01-01'}]
+    with mock.patch.object(index.user_step.table, 'query', side_effect=query_similar_users(same)):
+        with pytest.raises(index.IdentityError, match=r"User already exists"):
+            index.handler(dict(REGISTRATION), lambda_context)
+
+@responses.activate
+@mock.patch.object(index.user_step, 'FUZZY_MATCHING', True)
+@mock.patch.object(index.extract_step, 'extract_info_from_id', side_effect=extract_happy_path)
+def test_user_without_phonetic_key_should_exist(_, lambda_context):
+    add_address_response()
+    with mock.patch.object(index.user_step.table, 'query', side_effect=query_existing_user) as query:
+        with pytest.raises(index.IdentityError, match=r"User already exists"):
+            index.handler(dict(REGISTRATION), lambda_context)
+
+    assert [call.kwargs['IndexName'] for call in query.call_args_list] == ['fullname']
+
+@mock.patch.object(index.user_step.table, 'query', side_effect=query_no_user)
+@mock.patch.object(index.extract_step, 'extract_info_from_id', side_effect=extract_happy_path)
+def test_open_circuit_should_raise_circuit_open(_, __, lambda_context):
+    from common.circuitbreaker import CircuitOpen
+    breaker = mock.Mock()
+    breaker.call.side_effect = CircuitOpen('Circuit open for address-api, retry later')
+    # the fused task has no 'pending verification' branch, the workflow retries it on CircuitOpen
+    with mock.patch.object(index.address_step, 'breaker', breaker), \
+         mock.patch.object(index.address_step, 'DEGRADED_MODE', 'fail'):
+        with pytest.raises(CircuitOpen):
+            index.handler(dict(REGISTRATION), lambda_context)
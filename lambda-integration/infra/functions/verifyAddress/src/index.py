@@ -12,50 +12,144 @@
 # NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
 # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-"""Lambda function that verifies an address is valid, use a 3rd party API to check"""
+"""Lambda function that verifies an address is valid, use a 3rd party API to check
+
+The API is called with a session kept by the container, so the connection is reused by the next
+invocations. With PRIME_CONNECTIONS, it is opened in the init phase (see common.priming).
+"""
 import os
 import requests
 from aws_lambda_powertools import Tracer
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools import Metrics
+from common import ratelimit
+from common import circuitbreaker
+from common import schema
+from common.addressindex import AddressIndex
+from common import eventlog
+from common import priming
 
 logger = Logger()
+event_log = eventlog.from_env(logger)
 tracer = Tracer()
+metrics = Metrics()
 
 ADDRESS_API="https://api-adresse.data.gouv.fr/search/"
 
+# connection to the API reused by the invocations of the container
+session = requests.Session()
+
 if 'CONFIDENCE_THRESHOLD' in os.environ and os.environ['CONFIDENCE_THRESHOLD'] is not None:
     THRESHOLD = os.environ['CONFIDENCE_THRESHOLD']
 else:
     THRESHOLD = '0.82'
 
+# address API rate shared by all the containers (disabled if ADDRESS_API_RATE_LIMIT is not set)
+limiter = ratelimit.from_env('address-api', 'ADDRESS_API_RATE_LIMIT')
+
+# time kept for the API call itself when waiting for a token
+API_CALL_SECONDS = 5
+
+def is_api_failure(error):
+    """Timeouts, connection errors and 5xx responses are failures of the API, not the 4xx (invalid input)"""
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code >= 500
+
+# the API is not called while it fails or is too slow (disabled if CIRCUIT_BREAKER_TABLE is not set)
+breaker = circuitbreaker.from_env('address-api', metrics, is_failure=is_api_failure)
+
+# when the circuit is open: 'fail' raises CircuitOpen, 'pending' accepts the address as it was entered,
+# with an addressStatus the workflow checks to verify it later
+DEGRADED_MODE = os.environ.get('ADDRESS_DEGRADED_MODE', 'fail')
+if DEGRADED_MODE not in ('fail', 'pending'):
+    raise RuntimeError('ADDRESS_DEGRADED_MODE env var is incorrect, must be "fail" or "pending"')
+
+# local BAN index (see common.addressindex), the API is only called when it has no confident match
+address_index = AddressIndex(os.environ['ADDRESS_INDEX_PATH']) if os.environ.get('ADDRESS_INDEX_PATH') else None
+
+# fields of the registration schema this step receives
+ADDRESS = schema.registration.subset(('street', 'city', 'postalcode'))
+
+VERIFIED = 'VERIFIED'
+PENDING_VERIFICATION = 'PENDING_VERIFICATION'
+
+# connections of the first invocation, opened in the init phase (PRIME_CONNECTIONS) or by a warm-up event
+primer = priming.from_env(logger, metrics).add(
+    'addressApi', lambda: session.head(ADDRESS_API, timeout=API_CALL_SECONDS))
+if limiter is not None:
+    primer.add('rateLimitTable', lambda: limiter.table.get_item(Key={'bucket': 'priming'}))
+if breaker is not None:
+    primer.add('circuitBreakerTable', lambda: breaker.table.get_item(Key={'circuit': 'priming'}))
+primer.init()
+
+def search_address(params):
+    """Call the address API, a timeout or an error status counts as a failure for the circuit breaker"""
+    response = session.get(ADDRESS_API, params=params, timeout=API_CALL_SECONDS)
+    response.raise_for_status()
+    return response.json()
+
+def degraded(event):
+    """Circuit open: raise CircuitOpen, or accept the address pending verification (DEGRADED_MODE)"""
+    if DEGRADED_MODE == 'fail':
+        raise circuitbreaker.CircuitOpen('Circuit open for address-api, retry later')
+    logger.warning('Address API unavailable, address accepted pending verification')
+    event['address'] = ' '.join([event['street'], event['postalcode'], event['city']])
+    event['addressStatus'] = PENDING_VERIFICATION
+    return event
+
+def is_valid(response):
+    """True if the best address found (API or local index) has a good enough score"""
+    return (response is not None
+        and 'features' in response
+        and len(response['features']) > 0
+        and response['features'][0]['properties']['score'] > float(THRESHOLD))
+
+def verified(event, response):
+    event['address'] = response['features'][0]['properties']['label']
+    event['addressStatus'] = VERIFIED
+    return event
+
 @tracer.capture_lambda_handler()
 @logger.inject_lambda_context
-def handler(event, _):
+@metrics.log_metrics
+@event_log.capture
+@primer.warmup
+def handler(event, context):
 
-    try:
-        if not event['street'] or not event['city'] or not event['postalcode']:
-            raise KeyError('missing parameters')
-    except KeyError as error:
-        raise ValueError('Invalid parameters: you must provide "street", "city" and "postalcode"') from error
+    ADDRESS.validate(event, 'Invalid parameters')
+
+    if address_index is not None:
+        response = address_index.search(event['street'], event['postalcode'], event['city'])
+        if is_valid(response):
+            return verified(event, response)
+        logger.debug({'lowConfidenceLocalMatch': response['features'][:1]})
+
+    params = {
+        'q': event['street'] + ' ' + event['city'],
+        'autocomplete': '0',
+        'postcode': event['postalcode'],
+        'limit': '1'
+    }
+    if breaker is not None:
+        try:
+            # no token taken while the circuit is open
+            breaker.check()
+        except circuitbreaker.CircuitOpen:
+            return degraded(event)
+
+    if limiter is not None:
+        limiter.acquire(ratelimit.time_left(context, API_CALL_SECONDS))
 
     response = None
     try:
-        response = requests.get(ADDRESS_API, params={
-            'q': event['street'] + ' ' + event['city'],
-            'autocomplete': '0',
-            'postcode': event['postalcode'],
-            'limit': '1'
-        }).json()
+        response = search_address(params) if breaker is None else breaker.call(search_address, params)
+    except circuitbreaker.CircuitOpen:
+        return degraded(event)
     except Exception as error:
         raise RuntimeError('Request Error') from error
 
-    if (response is not None
-        and 'features' in response
-        and len(response['features']) > 0
-        and response['features'][0]['properties']['score'] > float(THRESHOLD)):
-
-        event['address'] = response['features'][0]['properties']['label']
-        return event
+    if is_valid(response):
+        return verified(event, response)
 
     raise ValueError('Address is incorrect, please verify your input')
 
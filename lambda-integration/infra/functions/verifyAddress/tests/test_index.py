@@ -57,6 +57,7 @@ def test_happy_path_should_return_valid_address(lambda_context):
     }, lambda_context)
 
     assert result['address'] == "8 Boulevard du Port 80000 Amiens"
+    assert result['addressStatus'] == index.VERIFIED
 
 @responses.activate
 def test_low_confidence_should_raise_error(lambda_context):
@@ -128,4 +129,150 @@ def test_threshold_configuration(lambda_context):
         "city": "Amiens"
     }, lambda_context)
 
-    assert result['address'] == "8 Boulevard du Port 80000 Amiens"
\ No newline at end of file
+    assert result['address'] == "8 Boulevard du Port 80000 Amiens"
+
+@responses.activate
+def test_rate_limit_exceeded_should_not_call_api(lambda_context):
+    from common.ratelimit import RateLimitExceeded
+    limiter = mock.Mock()
+    limiter.acquire.side_effect = RateLimitExceeded('Rate limit of 10/s reached for address-api')
+    with mock.patch.object(index, 'limiter', limiter):
+        with pytest.raises(RateLimitExceeded):
+            index.handler({
+                "street": "8 Boulevard du Port",
+                "postalcode": "80000",
+                "city": "Amiens"
+            }, lambda_context)
+    assert len(responses.calls) == 0
+
+def open_circuit():
+    from common.circuitbreaker import CircuitOpen
+    breaker = mock.Mock()
+    breaker.call.side_effect = CircuitOpen('Circuit open for address-api, retry later')
+    return breaker
+
+@responses.activate
+def test_open_circuit_should_fail_fast(lambda_context):
+    from common.circuitbreaker import CircuitOpen
+    with mock.patch.object(index, 'breaker', open_circuit()):
+        with pytest.raises(CircuitOpen):
+            index.handler({
+                "street": "8 Boulevard du Port",
+                "postalcode": "80000",
+                "city": "Amiens"
+            }, lambda_context)
+    assert len(responses.calls) == 0
+
+@responses.activate
+def test_open_circuit_in_pending_mode_should_accept_address_pending_verification(lambda_context):
+    with mock.patch.object(index, 'breaker', open_circuit()), mock.patch.object(index, 'DEGRADED_MODE', 'pending'):
+        result = index.handler({
+            "street": "8 Boulevard du Port",
+            "postalcode": "80000",
+            "city": "Amiens"
+        }, lambda_context)
+
+    assert result['address'] == "8 Boulevard du Port 80000 Amiens"
+    assert result['addressStatus'] == index.PENDING_VERIFICATION
+    assert len(responses.calls) == 0
+
+@responses.activate
+def test_server_error_should_be_recorded_as_failure(lambda_context):
+    responses.add(responses.GET, index.ADDRESS_API, status=503)
+    breaker = mock.Mock()
+    breaker.call.side_effect = lambda function, params: function(params)
+    with mock.patch.object(index, 'breaker', breaker):
+        with pytest.raises(RuntimeError, match=r"Request Error.*"):
+            index.handler({
+                "street": "8 Boulevard du Port",
+                "postalcode": "80000",
+                "city": "Amiens"
+            }, lambda_context)
+    breaker.call.assert_called_once()
+
+def test_open_circuit_should_not_take_a_token(lambda_context):
+    from common.circuitbreaker import CircuitOpen
+    breaker = mock.Mock()
+    breaker.check.side_effect = CircuitOpen('Circuit open for address-api, retry later')
+    limiter = mock.Mock()
+    with mock.patch.object(index, 'breaker', breaker), mock.patch.object(index, 'limiter', limiter):
+        with pytest.raises(CircuitOpen):
+            index.handler({
+                "street": "8 Boulevard du Port",
+                "postalcode": "80000",
+                "city": "Amiens"
+            }, lambda_context)
+    limiter.acquire.assert_not_called()
+    breaker.call.assert_not_called()
+
+@responses.activate
+def test_only_server_errors_should_be_api_failures():
+    import requests
+    responses.add(responses.GET, index.ADDRESS_API, status=400)
+    with pytest.raises(requests.HTTPError) as client_error:
+        index.search_address({'q': ''})
+    assert not index.is_api_failure(client_error.value)
+    assert index.is_api_failure(requests.Timeout())
+
+@mockenv(ADDRESS_DEGRADED_MODE="whatever")
+def test_invalid_degraded_mode_should_raise_error():
+    with pytest.raises(RuntimeError, match=r"ADDRESS_DEGRADED_MODE env var is incorrect.*"):
+        reload(index)
+
+@pytest.fixture
+def address_index(tmp_path):
+    from common import addressindex
+    path = str(tmp_path / 'ban.idx')
+    addressindex.build([os.path.join(os.path.dirname(__file__), '..', '..', 'commonLayer', 'tests', 'res',
+                                     'ban-sample.csv')], path)
+    with mockenv(ADDRESS_INDEX_PATH=path):
+        reload(index)
+    yield index.address_index
+    index.address_index.close()
+    reload(index)
+
+@responses.activate
+def test_local_match_should_not_call_api(lambda_context, address_index):
+    result = index.handler({
+        "street": "8 bd du Port",
+        "postalcode": "80000",
+        "city": "Amiens"
+    }, lambda_context)
+
+    assert result['address'] == "8 Boulevard du Port 80000 Amiens"
+    assert result['addressStatus'] == index.VERIFIED
+    assert len(responses.calls) == 0
+
+@responses.activate
+def test_low_confidence_local_match_should_call_api(lambda_context, address_index):
+    responses.add(responses.GET, index.ADDRESS_API,
+                json={
+                    "features":[
+                        {
+                            "properties":{
+                                "label":"8 Rue Nouvelle 80000 Amiens",
+                                "score":0.91
+                            }
+                        }
+                    ]
+                }, status=200)
+    result = index.handler({
+        "street": "8 Rue Nouvelle",
+        "postalcode": "80000",
+        "city": "Amiens"
+    }, lambda_context)
+
+    assert result['address'] == "8 Rue Nouvelle 80000 Amiens"
+    assert len(responses.calls) == 1
+
+@responses.activate
+def test_warmup_event_should_open_the_api_connection_without_verifying(lambda_context):
+    responses.add(responses.HEAD, index.ADDRESS_API, status=405)
+    index.primer.report = None
+
+    with mock.patch.object(index.primer, 'metrics') as metrics:
+        result = index.handler({"warmup": True}, lambda_context)
+
+    assert set(result['warmup']['primed']) == {'addressApi'}
+    assert [call.request.method for call in responses.calls] == ['HEAD', 'HEAD']
+    assert metrics.add_metric.call_count == 2
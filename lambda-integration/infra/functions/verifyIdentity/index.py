@@ -15,12 +15,15 @@
 """Lambda function that check identity provided by the user versus the one extracted in the ID"""
 from aws_lambda_powertools import Tracer
 from aws_lambda_powertools import Logger
+from common import eventlog
 
 logger = Logger()
+event_log = eventlog.from_env(logger)
 tracer = Tracer()
 
 @tracer.capture_lambda_handler()
 @logger.inject_lambda_context
+@event_log.capture
 def handler(event, _):
     """Cross check identity"""
     if event['firstname'].lower() != event['identity']['firstname'].lower():
@@ -16,15 +16,27 @@
  * SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
  */
 import { Alarm, ComparisonOperator, Metric, Unit } from '@aws-cdk/aws-cloudwatch';
-import { Table } from '@aws-cdk/aws-dynamodb';
+import { AttributeType, BillingMode, Table } from '@aws-cdk/aws-dynamodb';
 import { Effect, PolicyStatement } from '@aws-cdk/aws-iam';
-import { Code, Function, LayerVersion, Runtime, Tracing } from '@aws-cdk/aws-lambda';
-import { PythonFunction } from '@aws-cdk/aws-lambda-python/';
+import { Code, Function, ILayerVersion, LayerVersion, Runtime, Tracing } from '@aws-cdk/aws-lambda';
+import { PythonFunction, PythonLayerVersion } from '@aws-cdk/aws-lambda-python/';
 import { RetentionDays } from '@aws-cdk/aws-logs';
-import { Bucket } from '@aws-cdk/aws-s3';
-import { IChainable, Parallel, Pass, Fail } from '@aws-cdk/aws-stepfunctions';
+import { BlockPublicAccess, Bucket, BucketEncryption, EventType } from '@aws-cdk/aws-s3';
+import { LambdaDestination } from '@aws-cdk/aws-s3-notifications';
+import {
+  Choice,
+  Condition,
+  IChainable,
+  Parallel,
+  Pass,
+  Fail,
+  TaskInput,
+  Wait,
+  WaitTime,
+} from '@aws-cdk/aws-stepfunctions';
 import { LambdaInvocationType, LambdaInvoke } from '@aws-cdk/aws-stepfunctions-tasks';
 import { Construct, Duration, Stack } from '@aws-cdk/core';
+import * as path from 'path';
 import { LambdaToEventbridge } from '@aws-solutions-constructs/aws-lambda-eventbridge';
 import { LambdaToSqs } from '@aws-solutions-constructs/aws-lambda-sqs';
 
@@ -32,12 +44,23 @@ export interface AccountCreationWorkflowProps {
   readonly uploadBucket: Bucket;
   readonly userTable: Table;
   readonly notifyLambda: PythonFunction;
+  // run all input checks in a single function (validateInputs) instead of the 'Input checks' parallel state
+  readonly fusedValidation?: boolean;
+  // also look for users with a similar name (phonetic index of the user table)
+  readonly fuzzyDuplicates?: boolean;
+  // open the connections (Textract, DynamoDB, address API) in the init phase of the latency-critical functions
+  readonly primeConnections?: boolean;
+  // BAN address index built with common.addressindex, addresses are checked locally before calling the API
+  readonly addressIndexFile?: string;
 }
 
 const SERVICE_NAME = 'BankAccountCreation';
+// share of the invocations logging their (redacted) event, failed invocations always log it (see common.eventlog)
+const EVENT_LOG_SAMPLE_RATE = '0.05';
 
 export class AccountCreationWorkflow extends Construct {
   public readonly definition: IChainable;
+  public readonly commonLayer: PythonLayerVersion;
 
   constructor(scope: Construct, id: string, props: AccountCreationWorkflowProps) {
     super(scope, id);
@@ -48,32 +71,144 @@ export class AccountCreationWorkflow extends Construct {
       `arn:aws:lambda:${Stack.of(this).region}:017000801446:layer:AWSLambdaPowertoolsPython:3`,
     );
 
+    this.commonLayer = new PythonLayerVersion(this, 'commonLayer', {
+      entry: 'functions/commonLayer/src',
+      description: 'Code shared by the account creation functions',
+      compatibleRuntimes: [Runtime.PYTHON_3_9],
+    });
+
+    // oversized payloads offloaded by the functions (see common.serialization)
+    const payloadBucket = new Bucket(this, 'payloadBucket', {
+      encryption: BucketEncryption.S3_MANAGED,
+      blockPublicAccess: BlockPublicAccess.BLOCK_ALL,
+      enforceSSL: true,
+      lifecycleRules: [{ expiration: Duration.days(14) }],
+    });
+
+    // tokens of the rate limited APIs, shared by all containers (see common.ratelimit)
+    const rateLimitTable = new Table(this, 'rateLimitTable', {
+      partitionKey: { name: 'bucket', type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: 'expires_at',
+    });
+    const rateLimitEnvironment = {
+      RATE_LIMIT_TABLE: rateLimitTable.tableName,
+      TEXTRACT_RATE_LIMIT: '10',
+      TEXTRACT_DETECT_RATE_LIMIT: '10',
+      ADDRESS_API_RATE_LIMIT: '40',
+    };
+
+    // state of the address API circuit breaker, shared by all containers (see common.circuitbreaker)
+    const circuitBreakerTable = new Table(this, 'circuitBreakerTable', {
+      partitionKey: { name: 'circuit', type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: 'expires_at',
+    });
+    const addressApiCooldown = Duration.seconds(30);
+    const circuitBreakerEnvironment = {
+      CIRCUIT_BREAKER_TABLE: circuitBreakerTable.tableName,
+      CIRCUIT_BREAKER_COOLDOWN: addressApiCooldown.toSeconds().toString(),
+      // accept the address pending verification when the API is down, the workflow checks it again later
+      ADDRESS_DEGRADED_MODE: 'pending',
+      POWERTOOLS_METRICS_NAMESPACE: SERVICE_NAME,
+    };
+
+    // the index file is deployed in a layer, mapped in memory from /opt by the functions
+    const addressLayers: ILayerVersion[] = [];
+    const addressIndexEnvironment: { [key: string]: string } = {};
+    if (props.addressIndexFile) {
+      addressLayers.push(
+        new LayerVersion(this, 'addressIndex', {
+          code: Code.fromAsset(path.dirname(props.addressIndexFile), {
+            exclude: ['*', `!${path.basename(props.addressIndexFile)}`],
+          }),
+          description: 'Index of the French addresses (BAN)',
+        }),
+      );
+      addressIndexEnvironment.ADDRESS_INDEX_PATH = `/opt/${path.basename(props.addressIndexFile)}`;
+    }
+
+    // connections opened in the init phase, or by a warm-up event ({"warmup": true}), see common.priming
+    const primingEnvironment = { PRIME_CONNECTIONS: (props.primeConnections || false).toString() };
+
+    // ID card extractions started as soon as the card is uploaded, read by the workflow
+    const extractionCacheTable = new Table(this, 'extractionCacheTable', {
+      partitionKey: { name: 's3key', type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: 'expires_at',
+    });
+    const extractionCacheEnvironment = {
+      EXTRACTION_CACHE_TABLE: extractionCacheTable.tableName,
+      EXTRACTION_CACHE_TTL: Duration.days(1).toSeconds().toString(),
+      POWERTOOLS_METRICS_NAMESPACE: SERVICE_NAME,
+    };
+
     const extractInfoFromIdCardLambda = new PythonFunction(this, 'extractInfoFromIdCard', {
       entry: 'functions/extractInfoFromIdCard/src',
       description: 'Function that extracts information from an ID card image',
       runtime: Runtime.PYTHON_3_9,
       environment: {
         UPLOAD_BUCKET: props.uploadBucket.bucketName,
+        // read the MRZ with text detection, the form analysis is only used for documents without MRZ
+        MRZ_FAST_PATH: 'true',
         LOG_LEVEL: 'INFO',
         POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
-        POWERTOOLS_LOGGER_LOG_EVENT: 'true',
+        EVENT_LOG_SAMPLE_RATE: EVENT_LOG_SAMPLE_RATE,
+        ...rateLimitEnvironment,
+        ...extractionCacheEnvironment,
+        ...primingEnvironment,
       },
       tracing: Tracing.ACTIVE,
       logRetention: RetentionDays.ONE_WEEK,
       timeout: Duration.seconds(30),
       memorySize: 256,
-      layers: [powertoolsLayer],
+      layers: [powertoolsLayer, this.commonLayer],
     });
     props.uploadBucket.grantRead(extractInfoFromIdCardLambda);
+    rateLimitTable.grant(extractInfoFromIdCardLambda, 'dynamodb:GetItem', 'dynamodb:UpdateItem');
+    extractionCacheTable.grant(extractInfoFromIdCardLambda, 'dynamodb:GetItem', 'dynamodb:UpdateItem');
 
     extractInfoFromIdCardLambda.addToRolePolicy(
       new PolicyStatement({
         effect: Effect.ALLOW,
-        actions: ['textract:AnalyzeDocument'],
+        // GetDocumentAnalysis (of a job that does not exist) opens the connection
+        actions: ['textract:AnalyzeDocument', 'textract:DetectDocumentText', 'textract:GetDocumentAnalysis'],
         resources: ['*'],
       }),
     );
 
+    // same code, started by the upload of the ID card, before the user submits the form
+    const extractOnUploadLambda = new PythonFunction(this, 'extractInfoFromIdCardOnUpload', {
+      entry: 'functions/extractInfoFromIdCard/src',
+      handler: 'upload_handler',
+      description: 'Function that extracts information from an ID card image as soon as it is uploaded',
+      runtime: Runtime.PYTHON_3_9,
+      environment: {
+        UPLOAD_BUCKET: props.uploadBucket.bucketName,
+        MRZ_FAST_PATH: 'true',
+        LOG_LEVEL: 'INFO',
+        POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
+        ...rateLimitEnvironment,
+        ...extractionCacheEnvironment,
+      },
+      tracing: Tracing.ACTIVE,
+      logRetention: RetentionDays.ONE_WEEK,
+      timeout: Duration.seconds(30),
+      memorySize: 256,
+      layers: [powertoolsLayer, this.commonLayer],
+    });
+    props.uploadBucket.grantRead(extractOnUploadLambda);
+    rateLimitTable.grant(extractOnUploadLambda, 'dynamodb:UpdateItem');
+    extractionCacheTable.grant(extractOnUploadLambda, 'dynamodb:UpdateItem');
+    extractOnUploadLambda.addToRolePolicy(
+      new PolicyStatement({
+        effect: Effect.ALLOW,
+        actions: ['textract:AnalyzeDocument', 'textract:DetectDocumentText'],
+        resources: ['*'],
+      }),
+    );
+    props.uploadBucket.addEventNotification(EventType.OBJECT_CREATED, new LambdaDestination(extractOnUploadLambda));
+
     const validateIdentityLambda = new PythonFunction(this, 'validateIdentity', {
       entry: 'functions/verifyIdentity/',
       handler: 'index.handler',
@@ -82,12 +217,12 @@ export class AccountCreationWorkflow extends Construct {
       environment: {
         LOG_LEVEL: 'INFO',
         POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
-        POWERTOOLS_LOGGER_LOG_EVENT: 'true',
+        EVENT_LOG_SAMPLE_RATE: EVENT_LOG_SAMPLE_RATE,
       },
       tracing: Tracing.ACTIVE,
       logRetention: RetentionDays.ONE_WEEK,
       timeout: Duration.seconds(10),
-      layers: [powertoolsLayer],
+      layers: [powertoolsLayer, this.commonLayer],
     });
 
     const validateAddressLambda = new PythonFunction(this, 'validateAddress', {
@@ -97,15 +232,23 @@ export class AccountCreationWorkflow extends Construct {
       environment: {
         LOG_LEVEL: 'INFO',
         POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
-        POWERTOOLS_LOGGER_LOG_EVENT: 'true',
+        EVENT_LOG_SAMPLE_RATE: EVENT_LOG_SAMPLE_RATE,
         CONFIDENCE_THRESHOLD: '0.82',
+        ...rateLimitEnvironment,
+        ...circuitBreakerEnvironment,
+        ...addressIndexEnvironment,
+        ...primingEnvironment,
       },
       tracing: Tracing.ACTIVE,
       logRetention: RetentionDays.ONE_WEEK,
       timeout: Duration.seconds(30),
       memorySize: 256,
-      layers: [powertoolsLayer],
+      layers: [powertoolsLayer, this.commonLayer, ...addressLayers],
     });
+    rateLimitTable.grant(validateAddressLambda, 'dynamodb:GetItem', 'dynamodb:UpdateItem');
+    circuitBreakerTable.grant(validateAddressLambda, 'dynamodb:GetItem', 'dynamodb:UpdateItem');
+
+    const fuzzyMatchingEnvironment = { FUZZY_MATCHING: (props.fuzzyDuplicates || false).toString() };
 
     const checkExistingUserLambda = new PythonFunction(this, 'checkExistingUser', {
       entry: 'functions/checkExistingUser/',
@@ -114,14 +257,16 @@ export class AccountCreationWorkflow extends Construct {
       description: 'Function that checks if a user already exists in database',
       environment: {
         USER_TABLE: props.userTable.tableName,
+        ...fuzzyMatchingEnvironment,
+        ...primingEnvironment,
         LOG_LEVEL: 'INFO',
         POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
-        POWERTOOLS_LOGGER_LOG_EVENT: 'true',
+        EVENT_LOG_SAMPLE_RATE: EVENT_LOG_SAMPLE_RATE,
       },
       tracing: Tracing.ACTIVE,
       logRetention: RetentionDays.ONE_WEEK,
       timeout: Duration.seconds(10),
-      layers: [powertoolsLayer],
+      layers: [powertoolsLayer, this.commonLayer],
     });
     props.userTable.grant(checkExistingUserLambda, 'dynamodb:Query');
 
@@ -131,14 +276,16 @@ export class AccountCreationWorkflow extends Construct {
       description: 'Function that create user in database',
       environment: {
         USER_TABLE: props.userTable.tableName,
+        USER_SHARDS: '8',
+        ...primingEnvironment,
         LOG_LEVEL: 'INFO',
         POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
-        POWERTOOLS_LOGGER_LOG_EVENT: 'true',
+        EVENT_LOG_SAMPLE_RATE: EVENT_LOG_SAMPLE_RATE,
       },
       tracing: Tracing.ACTIVE,
       logRetention: RetentionDays.ONE_WEEK,
       timeout: Duration.seconds(10),
-      layers: [powertoolsLayer],
+      layers: [powertoolsLayer, this.commonLayer],
     });
     props.userTable.grant(createUserLambda, 'dynamodb:DescribeTable', 'dynamodb:PutItem');
 
@@ -151,13 +298,15 @@ export class AccountCreationWorkflow extends Construct {
         LOG_LEVEL: 'INFO',
         POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
         POWERTOOLS_METRICS_NAMESPACE: SERVICE_NAME,
-        POWERTOOLS_LOGGER_LOG_EVENT: 'true',
+        EVENT_LOG_SAMPLE_RATE: EVENT_LOG_SAMPLE_RATE,
+        PAYLOAD_BUCKET: payloadBucket.bucketName,
       },
       tracing: Tracing.ACTIVE,
       logRetention: RetentionDays.ONE_WEEK,
       timeout: Duration.seconds(10),
-      layers: [powertoolsLayer],
+      layers: [powertoolsLayer, this.commonLayer],
     });
+    payloadBucket.grantPut(sendToDLQLambda);
 
     const dlq = new LambdaToSqs(this, 'deadLetterQueue', {
       deployDeadLetterQueue: false, // this is the dlq
@@ -196,12 +345,12 @@ export class AccountCreationWorkflow extends Construct {
       environment: {
         LOG_LEVEL: 'INFO',
         POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
-        POWERTOOLS_LOGGER_LOG_EVENT: 'true',
+        EVENT_LOG_SAMPLE_RATE: EVENT_LOG_SAMPLE_RATE,
       },
       tracing: Tracing.ACTIVE,
       logRetention: RetentionDays.ONE_WEEK,
       timeout: Duration.seconds(10),
-      layers: [powertoolsLayer],
+      layers: [powertoolsLayer, this.commonLayer],
     });
 
     new LambdaToEventbridge(this, 'userEventBus', {
@@ -213,8 +362,15 @@ export class AccountCreationWorkflow extends Construct {
 
     // WORKFLOW STATES DEFINITION
 
-    const identityCheckFail = new Fail(this, 'Account creation failed, incorrect identity');
-    const addressCheckFail = new Fail(this, 'Account creation failed, incorrect address');
+    // error and cause are returned to the caller when the workflow is run synchronously
+    const identityCheckFail = new Fail(this, 'Account creation failed, incorrect identity', {
+      error: 'IncorrectIdentity',
+      cause: 'Identity could not be verified, please verify your input',
+    });
+    const addressCheckFail = new Fail(this, 'Account creation failed, incorrect address', {
+      error: 'IncorrectAddress',
+      cause: 'Address could not be verified, please verify your input',
+    });
 
     const notifyIdError = new LambdaInvoke(this, 'Inform User of an identity error', {
       lambdaFunction: props.notifyLambda,
@@ -248,6 +404,8 @@ export class AccountCreationWorkflow extends Construct {
 
     const extractInfoFromIdCard = new LambdaInvoke(this, 'Extract info from ID', {
       lambdaFunction: extractInfoFromIdCardLambda,
+      // whole registration: the other images of the ID card ('idcards') are optional, a missing path fails the task
+      payload: TaskInput.fromJsonPathAt('$'),
       resultSelector: {
         'firstname.$': '$.Payload.firstnames[0]',
         'lastname.$': '$.Payload.lastname',
@@ -255,6 +413,12 @@ export class AccountCreationWorkflow extends Construct {
       },
       resultPath: '$.identity',
     });
+    extractInfoFromIdCard.addRetry({
+      errors: ['RateLimitExceeded'],
+      interval: Duration.seconds(2),
+      backoffRate: 2,
+      maxAttempts: 4,
+    });
     extractInfoFromIdCard.addCatch(sendIdCardToDLQ, {
       errors: ['States.ALL'],
       resultPath: '$.error',
@@ -291,11 +455,50 @@ export class AccountCreationWorkflow extends Construct {
     validateAddress.addRetry({
       errors: ['Request Error'],
     });
+    validateAddress.addRetry({
+      errors: ['RateLimitExceeded'],
+      interval: Duration.seconds(2),
+      backoffRate: 2,
+      maxAttempts: 4,
+    });
+    validateAddress.addRetry({
+      errors: ['CircuitOpen'],
+      interval: addressApiCooldown,
+      maxAttempts: 1,
+    });
     validateAddress.addCatch(addressErrorToJson, {
       errors: ['States.ALL'],
       resultPath: '$.error',
     });
 
+    // address accepted while the API was unavailable: verify it again once the circuit may be closed,
+    // the user is created with the address still pending verification if the API is still down
+    const revalidateAddress = new LambdaInvoke(this, 'Validate Address again', {
+      lambdaFunction: validateAddressLambda,
+      outputPath: '$.Payload',
+    });
+    revalidateAddress.addRetry({
+      errors: ['RateLimitExceeded'],
+      interval: Duration.seconds(2),
+      backoffRate: 2,
+      maxAttempts: 4,
+    });
+    revalidateAddress.addCatch(addressErrorToJson, {
+      errors: ['States.ALL'],
+      resultPath: '$.error',
+    });
+    const addressVerification = new Choice(this, 'Address pending verification?')
+      .when(
+        Condition.and(
+          Condition.isPresent('$.addressStatus'),
+          Condition.stringEquals('$.addressStatus', 'PENDING_VERIFICATION'),
+        ),
+        new Wait(this, 'Wait for the address API', { time: WaitTime.duration(addressApiCooldown) }).next(
+          revalidateAddress,
+        ),
+      )
+      .otherwise(new Pass(this, 'Address verified'));
+
     const createUser = new LambdaInvoke(this, 'Create User', {
       lambdaFunction: createUserLambda,
       outputPath: '$.Payload',
@@ -313,15 +516,143 @@ export class AccountCreationWorkflow extends Construct {
     const inputChecks = new Parallel(this, 'Input checks', {
       resultSelector: {
         'user.$': '$[1]',
+        'duplicateCandidates.$': '$[0].duplicateCandidates',
       },
     });
 
+    const notifications = new Parallel(this, 'notifications').branch(notifyBackends).branch(notifySucess);
+
     // WORKFLOW DEFINITION
 
-    this.definition = inputChecks
-      .branch(extractInfoFromIdCard.next(checkId).next(checkExistingUser))
-      .branch(validateAddress)
-      .next(createUser)
-      .next(new Parallel(this, 'notifications').branch(notifyBackends).branch(notifySucess));
+    if (props.fusedValidation) {
+      this.definition = this.fusedInputChecks(
+        props,
+        [powertoolsLayer, this.commonLayer, ...addressLayers],
+        [rateLimitTable, circuitBreakerTable, extractionCacheTable],
+        {
+          ...rateLimitEnvironment,
+          ...circuitBreakerEnvironment,
+          ...addressIndexEnvironment,
+          ...extractionCacheEnvironment,
+          ...fuzzyMatchingEnvironment,
+          ...primingEnvironment,
+        },
+        sendIdCardToDLQ,
+        idErrorToJson,
+        addressErrorToJson,
+        notifyIdError,
+      )
+        .next(createUser)
+        .next(notifications);
+    } else {
+      this.definition = inputChecks
+        .branch(extractInfoFromIdCard.next(checkId).next(checkExistingUser))
+        .branch(validateAddress.next(addressVerification))
+        .next(createUser)
+        .next(notifications);
+    }
+  }
+
+  private fusedInputChecks(
+    props: AccountCreationWorkflowProps,
+    layers: ILayerVersion[],
+    sharedTables: Table[],
+    sharedEnvironment: { [key: string]: string },
+    sendIdCardToDLQ: IChainable,
+    idErrorToJson: IChainable,
+    addressErrorToJson: IChainable,
+    notifyIdError: IChainable,
+  ): LambdaInvoke {
+    // the function reuses the code of the step functions, bundled next to it
+    const validateInputsLambda = new Function(this, 'validateInputs', {
+      code: Code.fromAsset('functions', {
+        bundling: {
+          image: Runtime.PYTHON_3_9.bundlingImage,
+          command: [
+            'bash',
+            '-c',
+            'pip install -r validateInputs/src/requirements.txt -t /asset-output && ' +
+              'cp -r extractInfoFromIdCard verifyIdentity checkExistingUser verifyAddress validateInputs ' +
+              '/asset-output && ' +
+              // test fixtures (Textract responses) are not needed at runtime
+              'rm -rf /asset-output/*/tests',
+          ],
+        },
+      }),
+      handler: 'validateInputs/src/index.handler',
+      runtime: Runtime.PYTHON_3_9,
+      description: 'Function that runs all the input checks concurrently',
+      environment: {
+        UPLOAD_BUCKET: props.uploadBucket.bucketName,
+        MRZ_FAST_PATH: 'true',
+        USER_TABLE: props.userTable.tableName,
+        LOG_LEVEL: 'INFO',
+        POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
+        EVENT_LOG_SAMPLE_RATE: EVENT_LOG_SAMPLE_RATE,
+        CONFIDENCE_THRESHOLD: '0.82',
+        ...sharedEnvironment,
+        // no 'pending verification' branch after the fused task: reject the address while the circuit is open,
+        // the task is retried once the circuit may be closed
+        ADDRESS_DEGRADED_MODE: 'fail',
+      },
+      tracing: Tracing.ACTIVE,
+      logRetention: RetentionDays.ONE_WEEK,
+      timeout: Duration.seconds(30),
+      memorySize: 256,
+      layers: layers,
+    });
+    props.uploadBucket.grantRead(validateInputsLambda);
+    sharedTables.forEach((table) => table.grant(validateInputsLambda, 'dynamodb:GetItem', 'dynamodb:UpdateItem'));
+    props.userTable.grant(validateInputsLambda, 'dynamodb:Query');
+    validateInputsLambda.addToRolePolicy(
+      new PolicyStatement({
+        effect: Effect.ALLOW,
+        actions: ['textract:AnalyzeDocument', 'textract:DetectDocumentText', 'textract:GetDocumentAnalysis'],
+        resources: ['*'],
+      }),
+    );
+
+    const validateInputs = new LambdaInvoke(this, 'Validate inputs', {
+      lambdaFunction: validateInputsLambda,
+      outputPath: '$.Payload',
+    });
+    validateInputs.addRetry({
+      errors: ['RateLimitExceeded'],
+      interval: Duration.seconds(2),
+      backoffRate: 2,
+      maxAttempts: 4,
+    });
+    validateInputs.addRetry({
+      errors: ['CircuitOpen'],
+      interval: Duration.seconds(Number(sharedEnvironment.CIRCUIT_BREAKER_COOLDOWN)),
+      maxAttempts: 1,
+    });
+
+    // the function raises typed errors (see validateInputs/src/index.py), the other ones (e.g. timeout) have
+    // no JSON cause to notify the user with
+    const internalError = new Pass(this, 'Input checks internal error', {
+      parameters: {
+        'connectionId.$': '$.connectionId',
+        error: { errorMessage: 'Internal error, please try again later' },
+      },
+    }).next(notifyIdError);
+    const errorType = '$.error.Error';
+    const whichCheckFailed = new Choice(this, 'Which input check failed')
+      .when(Condition.stringEquals(errorType, 'IdCardError'), sendIdCardToDLQ)
+      .when(
+        Condition.or(
+          Condition.stringEquals(errorType, 'AddressError'),
+          Condition.stringEquals(errorType, 'CircuitOpen'),
+        ),
+        addressErrorToJson,
+      )
+      .when(Condition.stringEquals(errorType, 'IdentityError'), idErrorToJson)
+      .otherwise(internalError);
+
+    validateInputs.addCatch(whichCheckFailed, {
+      errors: ['States.ALL'],
+      resultPath: '$.error',
+    });
+    return validateInputs;
   }
 }
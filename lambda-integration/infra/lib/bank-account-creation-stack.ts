@@ -15,13 +15,15 @@
  * SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
  */
 import { JsonSchemaType, JsonSchemaVersion, LambdaIntegration, RequestValidator, ResponseType } from '@aws-cdk/aws-apigateway';
-import { AttributeType, BillingMode, Table } from '@aws-cdk/aws-dynamodb';
+import { AttributeType, BillingMode, ProjectionType, Table } from '@aws-cdk/aws-dynamodb';
+import { Effect, PolicyStatement } from '@aws-cdk/aws-iam';
 import { Code, Function, LayerVersion, Runtime, Tracing } from '@aws-cdk/aws-lambda';
 import { RetentionDays } from '@aws-cdk/aws-logs';
 import { StateMachineType } from '@aws-cdk/aws-stepfunctions';
 import { Construct, Duration, Stack, StackProps } from '@aws-cdk/core';
 import { LambdaToStepfunctions } from '@aws-solutions-constructs/aws-lambda-stepfunctions';
 import { AccountCreationWorkflow } from './account-creation-workflow';
+import { BulkOnboarding } from './bulk-onboarding';
 import { S3UploadPresignedUrlAPI } from './s3-upload-presigned-url-api';
 import { UserWebSocketAPI } from './websocket-api';
 
@@ -37,6 +39,23 @@ export class BankAccountCreationStack extends Stack {
 
     const expiration: number = this.node.tryGetContext('expiration') || 300;
 
+    // 'async' (default): result sent on the WebSocket, 'sync': result returned in the HTTP response
+    const executionMode: string = this.node.tryGetContext('executionMode') || 'async';
+
+    const fusedValidation: boolean = [true, 'true'].includes(this.node.tryGetContext('fusedValidation'));
+
+    // similar names also checked (phonetic index), run tools/userBackfill on the users created before
+    const fuzzyDuplicates: boolean = [true, 'true'].includes(this.node.tryGetContext('fuzzyDuplicates'));
+
+    // connections of the latency-critical functions opened in the init phase (see common/priming.py)
+    const primeConnections: boolean = [true, 'true'].includes(this.node.tryGetContext('primeConnections'));
+
+    // DynamoDB creates a single GSI per update: 'false' postpones the 'created' index to a second deploy
+    const createdIndex: boolean = ![false, 'false'].includes(this.node.tryGetContext('createdIndex'));
+
+    // path of a BAN address index file (see functions/commonLayer/src/common/addressindex.py)
+    const addressIndexFile: string | undefined = this.node.tryGetContext('addressIndex');
+
     const uploadAPI = new S3UploadPresignedUrlAPI(this, 'uploadAPI', {
       allowedOrigins: origins,
       expiration: expiration,
@@ -54,22 +73,42 @@ export class BankAccountCreationStack extends Stack {
       partitionKey: { name: 'lastname', type: AttributeType.STRING },
       sortKey: { name: 'firstname', type: AttributeType.STRING },
     });
+    userTable.addGlobalSecondaryIndex({
+      indexName: 'phonetic',
+      partitionKey: { name: 'name_key', type: AttributeType.STRING },
+      projectionType: ProjectionType.INCLUDE,
+      nonKeyAttributes: ['firstname', 'birthdate'],
+    });
+    // users by creation time (ids are ULIDs prefixed with the shard), see tools/userExport
+    if (createdIndex) {
+      userTable.addGlobalSecondaryIndex({
+        indexName: 'created',
+        partitionKey: { name: 'shard', type: AttributeType.STRING },
+        sortKey: { name: 'id', type: AttributeType.STRING },
+      });
+    }
 
     const workflow = new AccountCreationWorkflow(this, 'workflow', {
       uploadBucket: uploadAPI.uploadBucket,
       userTable: userTable,
       notifyLambda: userNotifAPI.notifyUserLambda,
+      fusedValidation: fusedValidation,
+      fuzzyDuplicates: fuzzyDuplicates,
+      primeConnections: primeConnections,
+      addressIndexFile: addressIndexFile,
     });
 
     const startWorkflowLambda = new Function(this, 'startWorkflow', {
-      code: Code.fromAsset('functions/startWorkflow/'),
+      code: Code.fromAsset('functions/startWorkflow/src'),
       handler: 'index.handler',
       runtime: Runtime.PYTHON_3_9,
       description: 'Function that starts the account creation workflow',
       environment: {
         LOG_LEVEL: 'INFO',
         POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
-        POWERTOOLS_LOGGER_LOG_EVENT: 'true',
+        EVENT_LOG_SAMPLE_RATE: '0.05',
+        EXECUTION_MODE: executionMode,
+        SYNC_EXECUTION_TIMEOUT: '8',
       },
       tracing: Tracing.ACTIVE,
       logRetention: RetentionDays.ONE_WEEK,
@@ -77,10 +116,11 @@ export class BankAccountCreationStack extends Stack {
       memorySize: 256,
       layers: [
         LayerVersion.fromLayerVersionArn(this, 'powertool', `arn:aws:lambda:${Stack.of(this).region}:017000801446:layer:AWSLambdaPowertoolsPython:3`),
+        workflow.commonLayer,
       ],
     });
 
-    new LambdaToStepfunctions(this, 'accountCreation', {
+    const accountCreation = new LambdaToStepfunctions(this, 'accountCreation', {
       existingLambdaObj: startWorkflowLambda,
       stateMachineProps: {
         definition: workflow.definition,
@@ -89,6 +129,21 @@ export class BankAccountCreationStack extends Stack {
       },
     });
 
+    new BulkOnboarding(this, 'bulkOnboarding', {
+      stateMachine: accountCreation.stateMachine,
+      commonLayer: workflow.commonLayer,
+    });
+
+    if (executionMode === 'sync') {
+      startWorkflowLambda.addToRolePolicy(
+        new PolicyStatement({
+          effect: Effect.ALLOW,
+          actions: ['states:StartSyncExecution'],
+          resources: [accountCreation.stateMachine.stateMachineArn],
+        }),
+      );
+    }
+
     const userModel = uploadAPI.restApi.addModel('UserModel', {
       contentType: 'application/json',
       modelName: 'UserModel',
@@ -109,6 +164,7 @@ export class BankAccountCreationStack extends Stack {
           street: { type: JsonSchemaType.STRING },
           email: { type: JsonSchemaType.STRING, format: 'email', minLength: 6 },
           idcard: { type: JsonSchemaType.STRING },
+          idcards: { type: JsonSchemaType.ARRAY, items: { type: JsonSchemaType.STRING }, maxItems: 3 },
         },
       },
     });
@@ -136,6 +192,18 @@ export class BankAccountCreationStack extends Stack {
             statusCode: '202',
             responseParameters: corsIntegResponseParameters,
           },
+          {
+            selectionPattern: 'Invalid registration.*',
+            statusCode: '400',
+            responseParameters: corsIntegResponseParameters,
+            responseTemplates: { 'application/json': "$input.path('$.errorMessage')" },
+          },
+          {
+            selectionPattern: 'Account creation failed.*',
+            statusCode: '400',
+            responseParameters: corsIntegResponseParameters,
+            responseTemplates: { 'application/json': "$input.path('$.errorMessage')" },
+          },
           {
             selectionPattern: '.*Error.*',
             statusCode: '500',
@@ -161,6 +229,10 @@ export class BankAccountCreationStack extends Stack {
             statusCode: '202',
             responseParameters: corsMethodResponseParameters,
           },
+          {
+            statusCode: '400',
+            responseParameters: corsMethodResponseParameters,
+          },
           {
             statusCode: '500',
             responseParameters: corsMethodResponseParameters,
@@ -0,0 +1,131 @@
+/**
+ * Copyright 2022 Amazon Web Services (AWS)
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ * software and associated documentation files (the "Software"), to deal in the Software
+ * without restriction, including without limitation the rights to use, copy, modify,
+ * merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+ * permit persons to whom the Software is furnished to do so.
+
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ * INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+ * PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+ * HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+ * OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+ * SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+ */
+import { Code, Function, ILayerVersion, LayerVersion, Runtime, Tracing } from '@aws-cdk/aws-lambda';
+import { RetentionDays } from '@aws-cdk/aws-logs';
+import { BlockPublicAccess, Bucket, BucketEncryption, EventType } from '@aws-cdk/aws-s3';
+import { LambdaDestination } from '@aws-cdk/aws-s3-notifications';
+import { IStateMachine, Map as MapState, StateMachine, StateMachineType } from '@aws-cdk/aws-stepfunctions';
+import { LambdaInvoke } from '@aws-cdk/aws-stepfunctions-tasks';
+import { Construct, Duration, Stack } from '@aws-cdk/core';
+
+const SERVICE_NAME = 'BankAccountCreation';
+
+export interface BulkOnboardingProps {
+  /**
+   * Account creation workflow, started for each employee
+   */
+  readonly stateMachine: IStateMachine;
+
+  /**
+   * Layer with the code shared by the functions (common package)
+   */
+  readonly commonLayer: ILayerVersion;
+
+  /**
+   * Optional number of employees per chunk (iteration of the Map state)
+   *
+   * @default 500
+   */
+  readonly chunkSize?: number;
+}
+
+/**
+ * Onboarding of the employees listed in CSV or JSONL files uploaded in the bulk bucket, under 'incoming/'.
+ * The ID card of each employee ('idcard' column) must be uploaded in the upload bucket.
+ */
+export class BulkOnboarding extends Construct {
+  public readonly bulkBucket: Bucket;
+
+  constructor(scope: Construct, id: string, props: BulkOnboardingProps) {
+    super(scope, id);
+
+    this.bulkBucket = new Bucket(this, 'bulkBucket', {
+      encryption: BucketEncryption.S3_MANAGED,
+      blockPublicAccess: BlockPublicAccess.BLOCK_ALL,
+      enforceSSL: true,
+      lifecycleRules: [{ prefix: 'output/', expiration: Duration.days(30) }],
+    });
+
+    const layers = [
+      LayerVersion.fromLayerVersionArn(
+        this,
+        'powertools',
+        `arn:aws:lambda:${Stack.of(this).region}:017000801446:layer:AWSLambdaPowertoolsPython:3`,
+      ),
+      props.commonLayer,
+    ];
+    const code = Code.fromAsset('functions/bulkIngest/src');
+
+    const startChunkLambda = new Function(this, 'startBulkChunk', {
+      code: code,
+      handler: 'index.start_chunk_handler',
+      runtime: Runtime.PYTHON_3_9,
+      description: 'Function that starts the account creation workflow of each employee of a chunk',
+      environment: {
+        STATE_MACHINE_ARN: props.stateMachine.stateMachineArn,
+        LOG_LEVEL: 'INFO',
+        POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
+      },
+      tracing: Tracing.ACTIVE,
+      logRetention: RetentionDays.ONE_WEEK,
+      timeout: Duration.minutes(5),
+      memorySize: 256,
+      layers: layers,
+    });
+    this.bulkBucket.grantReadWrite(startChunkLambda);
+    props.stateMachine.grantStartExecution(startChunkLambda);
+
+    const startChunk = new LambdaInvoke(this, 'Start the workflows of a chunk', {
+      lambdaFunction: startChunkLambda,
+      outputPath: '$.Payload',
+    });
+    const chunks = new MapState(this, 'Chunks', {
+      itemsPath: '$.chunks',
+      maxConcurrency: 4,
+      resultPath: '$.results',
+    }).iterator(startChunk);
+
+    const bulkStateMachine = new StateMachine(this, 'bulkOnboarding', {
+      definition: chunks,
+      stateMachineType: StateMachineType.STANDARD,
+      tracingEnabled: true,
+    });
+
+    const ingestLambda = new Function(this, 'bulkIngest', {
+      code: code,
+      handler: 'index.handler',
+      runtime: Runtime.PYTHON_3_9,
+      description: 'Function that validates a bulk onboarding file and splits it in chunks',
+      environment: {
+        BULK_STATE_MACHINE_ARN: bulkStateMachine.stateMachineArn,
+        CHUNK_SIZE: (props.chunkSize || 500).toString(),
+        LOG_LEVEL: 'INFO',
+        POWERTOOLS_SERVICE_NAME: SERVICE_NAME,
+      },
+      tracing: Tracing.ACTIVE,
+      logRetention: RetentionDays.ONE_WEEK,
+      timeout: Duration.minutes(15),
+      memorySize: 256,
+      layers: layers,
+    });
+    this.bulkBucket.grantReadWrite(ingestLambda);
+    bulkStateMachine.grantStartExecution(ingestLambda);
+    this.bulkBucket.addEventNotification(EventType.OBJECT_CREATED, new LambdaDestination(ingestLambda), {
+      prefix: 'incoming/',
+    });
+  }
+}
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Redrive the registrations sent to the dead letter queue (failed ID card extractions)
+
+Messages are received with long polling, filtered on their error, and the registration is
+restarted through the same path as a new one (startWorkflow). A message is only deleted once
+its registration has been restarted; the others become visible again after the visibility timeout.
+Messages that are not a valid registration (``common.schema``, as validated by startWorkflow, e.g.
+the ones of the direct integration, with only the ID card) are not redrivable: they are skipped and
+counted apart.
+The skipped messages become visible again after the visibility timeout: the redrive stops when a
+receive only brings messages it has already seen.
+"""
+import re
+import time
+import uuid
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from common import serialization
+from common import schema
+
+# same fields as startWorkflow
+FIELDS = ('firstname', 'lastname', 'birthdate', 'countrybirth', 'country', 'postalcode', 'city',
+          'street', 'email', 'idcard', 'idcards', 'connectionId')
+
+SQS_BATCH_SIZE = 10
+
+class LambdaRestarter:
+    """Restart a registration by invoking the startWorkflow function (lambda-integration)"""
+
+    def __init__(self, lambda_client, function_name):
+        self.client = lambda_client
+        self.function_name = function_name
+
+    def __call__(self, registration):
+        response = self.client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='RequestResponse',
+            Payload=serialization.dumps(registration).encode('utf-8')
+        )
+        payload = serialization.loads(response['Payload'].read())
+        if 'FunctionError' in response:
+            raise RuntimeError(payload.get('errorMessage', 'startWorkflow failed'))
+        return payload['requestId']
+
+class StateMachineRestarter:
+    """Restart a registration by starting the state machine with the same input startWorkflow builds"""
+
+    def __init__(self, sfn, state_machine_arn):
+        self.client = sfn
+        self.state_machine_arn = state_machine_arn
+
+    def __call__(self, registration):
+        event = serialization.project(registration, FIELDS)
+        event['requestId'] = str(uuid.uuid4())
+        self.client.start_execution(
+            stateMachineArn=self.state_machine_arn,
+            input=serialization.dumps(event)
+        )
+        return event['requestId']
+
+class RateLimiter:
+    """Space calls so that at most `rate` calls per second are made, across threads"""
+
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else 0
+        self.next_call = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            call_at = max(now, self.next_call)
+            self.next_call = call_at + self.interval
+        time.sleep(max(0.0, call_at - now))
+
+class Progress:
+    """Counters and restart latencies of a redrive"""
+
+    def __init__(self):
+        self.received = 0
+        self.skipped = 0
+        self.not_redrivable = 0
+        self.restarted = 0
+        self.failed = 0
+        self.deleted = 0
+        self.latencies = []
+        self.started_at = time.monotonic()
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self.started_at
+        quantiles = statistics.quantiles(self.latencies, n=100) if len(self.latencies) > 1 else self.latencies * 99
+        return {
+            'received': self.received,
+            'skipped': self.skipped,
+            'not_redrivable': self.not_redrivable,
+            'restarted': self.restarted,
+            'failed': self.failed,
+            'deleted': self.deleted,
+            'elapsed_s': round(elapsed, 1),
+            'restarts_per_s': round(self.restarted / elapsed, 2) if elapsed else None,
+            'p50_ms': round(quantiles[49] * 1000) if quantiles else None,
+            'p95_ms': round(quantiles[94] * 1000) if quantiles else None
+        }
+
+class Redrive:
+    """Drain a dead letter queue and restart the matching registrations"""
+
+    def __init__(self, sqs, queue_url, restart, error_pattern=None, concurrency=5, rate=None,
+                 visibility_timeout=300, wait_time=20, s3=None, payload_bucket=None, dry_run=False,
+                 on_progress=None, progress_every=100):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.restart = restart
+        self.error_pattern = re.compile(error_pattern) if error_pattern else None
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.visibility_timeout = visibility_timeout
+        self.wait_time = wait_time
+        self.s3 = s3
+        self.payload_bucket = payload_bucket
+        self.dry_run = dry_run
+        self.on_progress = on_progress
+        self.progress_every = progress_every
+        self.progress = Progress()
+        self.to_delete = []
+        self.seen = set()
+
+    def run(self, max_messages=None):
+        """Redrive until the queue is empty (or max_messages have been received), return the progress"""
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while max_messages is None or self.progress.received < max_messages:
+                messages = self.receive(max_messages)
+                new_messages = [message for message in messages if message['MessageId'] not in self.seen]
+                if not new_messages:
+                    # empty queue, or a full pass over the messages left in it
+                    break
+                self.seen.update(message['MessageId'] for message in new_messages)
+                for message in new_messages:
+                    self.progress.received += 1
+                    if not self.matches(error_of(message)):
+                        # stays invisible until the end of the redrive, so it is not received again
+                        self.progress.skipped += 1
+                    elif not is_redrivable(message):
+                        # restarting it would fail again, or create a partial user
+                        self.progress.not_redrivable += 1
+                    elif not self.dry_run:
+                        pending.add(executor.submit(self.restart_message, message))
+                    if self.on_progress and self.progress.received % self.progress_every == 0:
+                        self.on_progress(self.progress.as_dict())
+                # bound the number of messages in flight
+                while len(pending) >= 2 * self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self.collect(done)
+            self.collect(wait(pending).done)
+        self.delete(flush=True)
+        if self.on_progress:
+            self.on_progress(self.progress.as_dict())
+        return self.progress
+
+    def receive(self, max_messages):
+        count = SQS_BATCH_SIZE if max_messages is None else min(SQS_BATCH_SIZE, max_messages - self.progress.received)
+        return self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=count,
+            WaitTimeSeconds=self.wait_time,
+            VisibilityTimeout=self.visibility_timeout,
+            MessageAttributeNames=['error']
+        ).get('Messages', [])
+
+    def matches(self, error):
+        return self.error_pattern is None or (error is not None and self.error_pattern.search(error) is not None)
+
+    def restart_message(self, message):
+        """Restart the registration of a message, return the message and the restart latency (None if failed)"""
+        registration = serialization.loads(message['Body'])
+        if self.s3 is not None and self.payload_bucket:
+            registration = serialization.resolve(registration, self.s3, self.payload_bucket)
+        self.limiter.wait()
+        start = time.monotonic()
+        try:
+            self.restart(registration)
+        except Exception: # pylint: disable=broad-except
+            return message, None
+        return message, time.monotonic() - start
+
+    def collect(self, futures):
+        for future in futures:
+            message, latency = future.result()
+            if latency is None:
+                self.progress.failed += 1
+            else:
+                self.progress.restarted += 1
+                self.progress.latencies.append(latency)
+                self.to_delete.append(message['ReceiptHandle'])
+        self.delete()
+
+    def delete(self, flush=False):
+        while len(self.to_delete) >= SQS_BATCH_SIZE or (flush and self.to_delete):
+            batch, self.to_delete = self.to_delete[:SQS_BATCH_SIZE], self.to_delete[SQS_BATCH_SIZE:]
+            response = self.sqs.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{'Id': str(i), 'ReceiptHandle': handle} for i, handle in enumerate(batch)]
+            )
+            self.progress.deleted += len(response.get('Successful', []))
+
+def error_of(message):
+    """Error of a DLQ message: 'error' attribute (sendToDLQ) or 'error' field of the body (direct integration)"""
+    attributes = message.get('MessageAttributes') or {}
+    if 'error' in attributes:
+        return attributes['error'].get('StringValue')
+    try:
+        error = serialization.loads(message['Body']).get('error')
+        if isinstance(error, str) and error.startswith('{'):
+            error = serialization.loads(error).get('errorMessage', error)
+        return error
+    except (ValueError, AttributeError):
+        return None
+
+def is_redrivable(message):
+    """True if the body of a DLQ message is a valid registration"""
+    try:
+        body = serialization.loads(message['Body'])
+    except ValueError:
+        return False
+    return isinstance(body, dict) and not schema.registration.errors(serialization.project(body, FIELDS))
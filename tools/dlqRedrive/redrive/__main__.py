@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Command line interface of the DLQ redrive
+
+    python -m redrive --queue-url https://sqs... --function-name <startWorkflow function> --error 'Could not extract' --rate 5
+    python -m redrive --queue-url https://sqs... --state-machine-arn arn:aws:states:... --dry-run
+"""
+import sys
+import json
+import argparse
+import boto3
+from . import Redrive, LambdaRestarter, StateMachineRestarter
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='redrive', description=__doc__.splitlines()[0])
+    parser.add_argument('--queue-url', required=True, help='URL of the dead letter queue')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--function-name', help='restart through the startWorkflow function')
+    target.add_argument('--state-machine-arn', help='restart by starting the state machine directly')
+    parser.add_argument('--error', help='only redrive messages whose error matches this regular expression')
+    parser.add_argument('--concurrency', type=int, default=5, help='maximum number of restarts in parallel')
+    parser.add_argument('--rate', type=float, help='maximum number of restarts per second')
+    parser.add_argument('--max-messages', type=int, help='stop after this number of messages received')
+    parser.add_argument('--visibility-timeout', type=int, default=300, help='seconds a received message stays invisible')
+    parser.add_argument('--payload-bucket', help='bucket of the payloads offloaded by sendToDLQ')
+    parser.add_argument('--dry-run', action='store_true', help='receive and filter messages, without restarting or deleting them')
+    return parser.parse_args(argv)
+
+def main(argv=None, out=None):
+    args = parse_args(argv)
+    out = out or sys.stderr
+    if args.function_name:
+        restart = LambdaRestarter(boto3.client('lambda'), args.function_name)
+    else:
+        restart = StateMachineRestarter(boto3.client('stepfunctions'), args.state_machine_arn)
+
+    redrive = Redrive(boto3.client('sqs'), args.queue_url, restart,
+                      error_pattern=args.error,
+                      concurrency=args.concurrency,
+                      rate=args.rate,
+                      visibility_timeout=args.visibility_timeout,
+                      s3=boto3.client('s3') if args.payload_bucket else None,
+                      payload_bucket=args.payload_bucket,
+                      dry_run=args.dry_run,
+                      on_progress=lambda progress: print(json.dumps(progress), file=out))
+    progress = redrive.run(args.max_messages)
+    return 1 if progress.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import json
+import time
+import threading
+import boto3
+import pytest
+from moto import mock_aws
+from redrive import Redrive, StateMachineRestarter, RateLimiter, error_of
+from redrive.__main__ import main
+
+REGISTRATION = {
+    "requestId": "52fdfc07-2182-154f-163f-5f0f9a621d72",
+    "firstname": "Corinne",
+    "lastname": "Berthier",
+    "birthdate": "1965-12-06",
+    "countrybirth": "FR",
+    "country": "FR",
+    "email": "corinne.berthier@example.com",
+    "street": "8 Boulevard du Port",
+    "postalcode": "80000",
+    "city": "Amiens",
+    "idcard": "id_card.jpeg"
+}
+
+@pytest.fixture
+def sqs():
+    with mock_aws():
+        client = boto3.client('sqs', region_name='eu-west-1')
+        yield client, client.create_queue(QueueName='dlq')['QueueUrl']
+
+def send(client, queue_url, count, error, **fields):
+    for i in range(count):
+        client.send_message(
+            QueueUrl=queue_url,
+            MessageBody=json.dumps(dict(REGISTRATION, lastname=f'Berthier{i}', **fields)),
+            MessageAttributes={'error': {'DataType': 'String', 'StringValue': error}}
+        )
+
+def queue_size(client, queue_url):
+    attributes = client.get_queue_attributes(QueueUrl=queue_url, AttributeNames=['All'])['Attributes']
+    return int(attributes['ApproximateNumberOfMessages']) + int(attributes['ApproximateNumberOfMessagesNotVisible'])
+
+class RecordingRestarter:
+    def __init__(self, delay=0.0, fail_for=()):
+        self.delay = delay
+        self.fail_for = fail_for
+        self.restarted = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, registration):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        if registration['lastname'] in self.fail_for:
+            raise RuntimeError('Internal Error - cannot start the creation workflow')
+        self.restarted.append(registration)
+        return 'id'
+
+def test_should_restart_and_delete_matching_messages(sqs):
+    client, queue_url = sqs
+    send(client, queue_url, 25, 'Could not extract all information from the ID Card')
+    send(client, queue_url, 5, 'Address is incorrect, please verify your input')
+    restart = RecordingRestarter(delay=0.05)
+
+    progress = Redrive(client, queue_url, restart, error_pattern='^Could not extract', concurrency=4, wait_time=1).run()
+
+    assert progress.received == 30
+    assert progress.skipped == 5
+    assert progress.restarted == progress.deleted == 25
+    assert len(restart.restarted) == 25
+    assert restart.max_running <= 4
+    assert restart.restarted[0]['idcard'] == 'id_card.jpeg'
+    # only the skipped messages are left
+    assert queue_size(client, queue_url) == 5
+
+def test_skipped_messages_seen_again_should_stop_redrive(sqs):
+    client, queue_url = sqs
+    send(client, queue_url, 3, 'Address is incorrect, please verify your input')
+
+    # the skipped messages are visible again at once
+    progress = Redrive(client, queue_url, RecordingRestarter(), error_pattern='^Could not extract',
+                       visibility_timeout=0, wait_time=1).run()
+
+    assert progress.received == progress.skipped == 3
+    assert queue_size(client, queue_url) == 3
+
+def test_failed_restart_should_keep_message(sqs):
+    client, queue_url = sqs
+    send(client, queue_url, 3, 'Could not extract all information from the ID Card')
+    restart = RecordingRestarter(fail_for=('Berthier1',))
+
+    progress = Redrive(client, queue_url, restart, wait_time=1).run()
+
+    assert progress.restarted == progress.deleted == 2
+    assert progress.failed == 1
+    assert queue_size(client, queue_url) == 1
+
+def test_dry_run_should_not_restart(sqs):
+    client, queue_url = sqs
+    send(client, queue_url, 3, 'Could not extract all information from the ID Card')
+    restart = RecordingRestarter()
+
+    progress = Redrive(client, queue_url, restart, dry_run=True, wait_time=1).run()
+
+    assert progress.received == 3
+    assert not restart.restarted
+    assert queue_size(client, queue_url) == 3
+
+def test_max_messages_should_stop_redrive(sqs):
+    client, queue_url = sqs
+    send(client, queue_url, 15, 'Could not extract all information from the ID Card')
+
+    progress = Redrive(client, queue_url, RecordingRestarter(), wait_time=1).run(max_messages=12)
+
+    assert progress.received == 12
+    assert progress.deleted == 12
+
+def test_rate_limiter_should_space_calls():
+    limiter = RateLimiter(rate=50)
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.wait()
+    assert time.monotonic() - start >= 0.19
+
+def test_state_machine_restarter_should_start_execution_like_start_workflow(sqs):
+    client, queue_url = sqs
+    send(client, queue_url, 2, 'Could not extract all information from the ID Card', connectionId='abc=',
+         idcards=['id_card_back.jpeg'])
+    sfn = boto3.client('stepfunctions', region_name='eu-west-1')
+    arn = sfn.create_state_machine(name='accountCreation', definition='{}',
+                                   roleArn='arn:aws:iam::123456789012:role/sfn')['stateMachineArn']
+
+    progress = Redrive(client, queue_url, StateMachineRestarter(sfn, arn), wait_time=1).run()
+
+    assert progress.restarted == 2
+    executions = sfn.list_executions(stateMachineArn=arn)['executions']
+    assert len(executions) == 2
+    execution_input = json.loads(sfn.describe_execution(executionArn=executions[0]['executionArn'])['input'])
+    assert execution_input['connectionId'] == 'abc='
+    assert execution_input['idcards'] == ['id_card_back.jpeg']
+    assert execution_input['requestId'] != REGISTRATION['requestId']
+
+def test_error_of_direct_integration_message():
+    message = {'Body': json.dumps({'requestId': '1', 'idcard': 'id.jpeg',
+                                   'error': json.dumps({'errorMessage': 'Could not extract information from the ID Card'})})}
+    assert error_of(message) == 'Could not extract information from the ID Card'
+
+def test_direct_integration_message_should_not_be_redriven(sqs):
+    client, queue_url = sqs
+    send(client, queue_url, 2, 'Could not extract all information from the ID Card')
+    client.send_message(QueueUrl=queue_url, MessageBody=json.dumps({
+        'requestId': '1', 'idcard': 'id.jpeg',
+        'error': json.dumps({'errorMessage': 'Could not extract information from the ID Card'})}))
+    # all the fields, but rejected by startWorkflow
+    send(client, queue_url, 1, 'Could not extract all information from the ID Card', postalcode='Amiens')
+    restart = RecordingRestarter()
+
+    progress = Redrive(client, queue_url, restart, wait_time=1).run()
+
+    assert progress.received == 4
+    assert progress.not_redrivable == 2
+    assert progress.restarted == progress.deleted == 2
+    assert queue_size(client, queue_url) == 2
+
+def test_cli_should_report_progress(sqs, capsys, monkeypatch):
+    client, queue_url = sqs
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'eu-west-1')
+    send(client, queue_url, 2, 'Could not extract all information from the ID Card')
+
+    code = main(['--queue-url', queue_url, '--state-machine-arn', 'arn:aws:states:eu-west-1:123456789012:stateMachine:x',
+                 '--dry-run', '--max-messages', '2'])
+
+    assert code == 0
+    assert json.loads(capsys.readouterr().err.splitlines()[-1])['received'] == 2
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Analyze Step Functions execution histories: per-state latency, retries and critical path"""
+from .timeline import build_timeline, normalize, Execution, StateRun
+from .stats import LatencyHistogram, Report
+from .sources import read_files, read_live
+
+__all__ = ['analyze', 'build_timeline', 'normalize', 'Execution', 'StateRun', 'LatencyHistogram', 'Report',
+           'read_files', 'read_live']
+
+def analyze(histories):
+    """Build a report from ``(execution_arn, events)`` pairs, one execution in memory at a time"""
+    report = Report()
+    for arn, events in histories:
+        report.add(build_timeline(events, arn))
+    return report
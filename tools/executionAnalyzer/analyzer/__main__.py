@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Command line interface of the execution analyzer
+
+    python -m analyzer histories/ more.jsonl
+    python -m analyzer --state-machine-arn arn:aws:states:...:stateMachine:xxx --max-executions 500
+    python -m analyzer --execution-arn arn:aws:states:...:execution:xxx:yyy --format json
+"""
+import sys
+import json
+import argparse
+from . import analyze, read_files, read_live
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='analyzer', description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', help='saved histories (.json / .jsonl files or directories)')
+    parser.add_argument('--execution-arn', action='append', default=[], help='execution to read with the API (repeatable)')
+    parser.add_argument('--state-machine-arn', help='read the executions of this state machine with the API')
+    parser.add_argument('--status', choices=['SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED'], help='filter executions by status')
+    parser.add_argument('--max-executions', type=int, help='maximum number of executions read with the API')
+    parser.add_argument('--top', type=int, default=5, help='number of critical paths displayed')
+    parser.add_argument('--format', choices=['text', 'json'], default='text')
+    args = parser.parse_args(argv)
+    if not args.paths and not args.execution_arn and not args.state_machine_arn:
+        parser.error('provide history files, --execution-arn or --state-machine-arn')
+    return args
+
+def histories(args):
+    yield from read_files(args.paths)
+    if args.execution_arn or args.state_machine_arn:
+        import boto3 # only needed for live analysis
+        yield from read_live(boto3.client('stepfunctions'), args.execution_arn, args.state_machine_arn,
+                             args.status, args.max_executions)
+
+def format_ms(value):
+    return '-' if value is None else f'{value:.0f}'
+
+def print_text(report, out):
+    print(f"{report['executions']} executions {report['statuses']} "
+          f"p50={format_ms(report['p50'])}ms p95={format_ms(report['p95'])}ms p99={format_ms(report['p99'])}ms", file=out)
+    print(f"\n{'state':<45}{'runs':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'retries':>9}{'caught':>8}{'critical':>10}", file=out)
+    for state in report['states']:
+        print(f"{state['state'][:44]:<45}{state['runs']:>7}{format_ms(state['p50']):>8}{format_ms(state['p95']):>8}"
+              f"{format_ms(state['p99']):>8}{state['retries']:>9}{state['caught']:>8}{state['critical']:>10}", file=out)
+    print('\ncritical paths:', file=out)
+    for critical_path in report['critical_paths']:
+        print(f"{critical_path['count']:>7}  " + ' > '.join(critical_path['path']), file=out)
+
+def main(argv=None, out=sys.stdout):
+    args = parse_args(argv)
+    report = analyze(histories(args)).as_dict(args.top)
+    if args.format == 'json':
+        json.dump(report, out, indent=2)
+        print(file=out)
+    else:
+        print_text(report, out)
+
+if __name__ == '__main__':
+    main()
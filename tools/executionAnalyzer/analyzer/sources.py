@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Sources of execution histories, each one yields ``(execution_arn, events)`` one execution at a time"""
+import os
+import json
+from .timeline import TERMINAL_EVENTS
+
+def read_files(paths):
+    """Read saved histories
+
+    * ``.json``: output of ``aws stepfunctions get-execution-history`` (``{"events": [...]}``),
+      a list of events or a list of such outputs.
+    * ``.jsonl``: one ``get-execution-history`` output per line, or Express execution log records
+      (CloudWatch Logs), grouped by execution until its terminal event.
+    Directories are read recursively.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                yield from read_files(os.path.join(root, f) for f in sorted(files) if f.endswith(('.json', '.jsonl')))
+        elif path.endswith('.jsonl'):
+            with open(path, 'r', encoding='utf-8') as lines:
+                yield from read_lines(lines, path)
+        else:
+            with open(path, 'r', encoding='utf-8') as file:
+                yield from read_document(json.load(file), path)
+
+def read_document(document, path):
+    if isinstance(document, dict):
+        yield document.get('executionArn', path), document['events']
+    elif document and isinstance(document[0], dict) and 'events' in document[0]:
+        for history in document:
+            yield history.get('executionArn', path), history['events']
+    else:
+        yield path, document
+
+def read_lines(lines, path):
+    pending = {}
+    for number, line in enumerate(lines):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if 'events' in record:
+            yield record.get('executionArn', f'{path}:{number + 1}'), record['events']
+            continue
+        # Express log records of concurrent executions are interleaved
+        arn = record['execution_arn']
+        pending.setdefault(arn, []).append(record)
+        if record['type'] in TERMINAL_EVENTS:
+            yield arn, pending.pop(arn)
+    # incomplete executions (still running or truncated logs)
+    yield from pending.items()
+
+def read_live(sfn, execution_arns=(), state_machine_arn=None, status=None, max_executions=None):
+    """Read histories with the Step Functions API (``GetExecutionHistory`` is only available for Standard workflows)"""
+    if state_machine_arn:
+        execution_arns = list_executions(sfn, state_machine_arn, status, max_executions)
+    for arn in execution_arns:
+        events = []
+        for page in sfn.get_paginator('get_execution_history').paginate(executionArn=arn, includeExecutionData=False):
+            events.extend(page['events'])
+        yield arn, events
+
+def list_executions(sfn, state_machine_arn, status=None, max_executions=None):
+    params = {'stateMachineArn': state_machine_arn}
+    if status:
+        params['statusFilter'] = status
+    if max_executions:
+        params['PaginationConfig'] = {'MaxItems': max_executions}
+    for page in sfn.get_paginator('list_executions').paginate(**params):
+        for execution in page['executions']:
+            yield execution['executionArn']
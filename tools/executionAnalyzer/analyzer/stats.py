@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Aggregation of execution timelines with bounded memory
+
+Latencies are kept in log-scale histograms (1% relative error) instead of raw values, so the
+memory used does not depend on the number of executions analyzed.
+"""
+import math
+from collections import Counter
+
+class LatencyHistogram:
+    """Histogram with logarithmic buckets, to compute percentiles of latencies (milliseconds)"""
+
+    def __init__(self, relative_error=0.01):
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        # values under 1ms share the first bucket
+        self.buckets[math.ceil(math.log(max(value, 1.0)) / self.log_gamma)] += 1
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return None
+        rank = percent / 100 * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # middle of the bucket, bounded by the observed extremes
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+class StateStats:
+    """Statistics of one state across executions"""
+
+    def __init__(self, name, state_type):
+        self.name = name
+        self.type = state_type
+        self.latency = LatencyHistogram()
+        self.runs = 0
+        self.retries = 0
+        self.caught = 0
+        self.failed = 0
+        self.critical = 0
+
+    def as_dict(self):
+        return {
+            'state': self.name,
+            'type': self.type,
+            'runs': self.runs,
+            'p50': self.latency.percentile(50),
+            'p95': self.latency.percentile(95),
+            'p99': self.latency.percentile(99),
+            'max': self.latency.max,
+            'retries': self.retries,
+            'caught': self.caught,
+            'failed': self.failed,
+            'critical': self.critical
+        }
+
+class Report:
+    """Aggregate the timelines of many executions"""
+
+    def __init__(self):
+        self.executions = 0
+        self.statuses = Counter()
+        self.latency = LatencyHistogram()
+        self.states = {}
+        self.critical_paths = Counter()
+
+    def add(self, execution):
+        self.executions += 1
+        self.statuses[execution.status] += 1
+        if execution.duration_ms is not None:
+            self.latency.add(execution.duration_ms)
+
+        for run in execution.runs:
+            stats = self.states.get(run.name)
+            if stats is None:
+                stats = self.states[run.name] = StateStats(run.name, run.type)
+            stats.runs += 1
+            stats.retries += run.retries
+            if run.duration_ms is not None:
+                stats.latency.add(run.duration_ms)
+            if run.outcome == 'caught':
+                stats.caught += 1
+            elif run.outcome == 'failed':
+                stats.failed += 1
+
+        for run in execution.critical_path:
+            self.states[run.name].critical += 1
+        self.critical_paths[tuple(run.name for run in execution.critical_path)] += 1
+
+    def as_dict(self, top=5):
+        return {
+            'executions': self.executions,
+            'statuses': dict(self.statuses),
+            'p50': self.latency.percentile(50),
+            'p95': self.latency.percentile(95),
+            'p99': self.latency.percentile(99),
+            'states': sorted((s.as_dict() for s in self.states.values()), key=lambda s: -(s['p95'] or 0)),
+            'critical_paths': [{'count': count, 'path': list(path)} for path, count in self.critical_paths.most_common(top)]
+        }
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Rebuild the state timeline of a Step Functions execution from its history events
+
+Works with the events returned by ``GetExecutionHistory`` (Standard workflows) and with the
+execution log records written in CloudWatch Logs by Express workflows (normalized by ``normalize``).
+"""
+from datetime import datetime
+
+TERMINAL_EVENTS = ('ExecutionSucceeded', 'ExecutionFailed', 'ExecutionTimedOut', 'ExecutionAborted')
+
+# events that schedule an attempt of a task (more than one per state means retries)
+SCHEDULED_EVENTS = ('LambdaFunctionScheduled', 'TaskScheduled', 'ActivityScheduled')
+
+class StateRun:
+    """One run of a state within an execution"""
+
+    def __init__(self, order, name, state_type, entered_at, parent=None):
+        self.order = order
+        self.name = name
+        self.type = state_type
+        self.entered_at = entered_at
+        self.exited_at = None
+        self.parent = parent
+        self.attempts = 0
+        self.failures = 0
+        self.last_attempt_failed = False
+
+    @property
+    def duration_ms(self):
+        if self.exited_at is None:
+            return None
+        return (self.exited_at - self.entered_at) * 1000
+
+    @property
+    def retries(self):
+        return max(0, self.attempts - 1)
+
+    @property
+    def outcome(self):
+        if self.exited_at is None:
+            return 'failed'
+        if self.last_attempt_failed:
+            return 'caught'
+        return 'succeeded'
+
+    def __repr__(self):
+        return f'StateRun({self.name!r}, {self.outcome}, {self.duration_ms}ms)'
+
+class Execution:
+    """Timeline of an execution: state runs in the order they were entered, and the critical path"""
+
+    def __init__(self, arn, status, started_at, stopped_at, runs, critical_path):
+        self.arn = arn
+        self.status = status
+        self.started_at = started_at
+        self.stopped_at = stopped_at
+        self.runs = runs
+        self.critical_path = critical_path
+
+    @property
+    def duration_ms(self):
+        if self.started_at is None or self.stopped_at is None:
+            return None
+        return (self.stopped_at - self.started_at) * 1000
+
+def to_seconds(timestamp):
+    """Convert a history timestamp (datetime, ISO 8601 string, epoch seconds or milliseconds) to epoch seconds"""
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    if isinstance(timestamp, (int, float)):
+        return timestamp / 1000 if timestamp > 1e11 else float(timestamp)
+    if timestamp.isdigit():
+        return to_seconds(int(timestamp))
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+
+def normalize(record):
+    """Convert an Express execution log record to the GetExecutionHistory event format"""
+    if 'execution_arn' not in record:
+        return record
+    event = {
+        'id': int(record['id']),
+        'previousEventId': int(record.get('previous_event_id') or 0),
+        'type': record['type'],
+        'timestamp': record['event_timestamp']
+    }
+    details = record.get('details') or {}
+    if record['type'].endswith('StateEntered'):
+        event['stateEnteredEventDetails'] = {'name': details.get('name')}
+    elif record['type'].endswith('StateExited'):
+        event['stateExitedEventDetails'] = {'name': details.get('name')}
+    return event
+
+def build_timeline(events, arn=None):
+    """Rebuild the timeline of one execution from its (complete) list of history events"""
+    owners = {}
+    open_runs = []
+    runs = []
+    status = None
+    started_at = stopped_at = None
+    terminal_id = None
+
+    events = sorted((normalize(e) for e in events), key=lambda e: e['id'])
+    for event in events:
+        event_type = event['type']
+        timestamp = to_seconds(event['timestamp'])
+        run = None
+
+        if event_type == 'ExecutionStarted':
+            started_at = timestamp
+        elif event_type in TERMINAL_EVENTS:
+            stopped_at = timestamp
+            status = event_type[len('Execution'):].upper().replace('TIMEDOUT', 'TIMED_OUT')
+            terminal_id = event['id']
+        elif event_type.endswith('StateEntered'):
+            parents = [r for r in open_runs if r.type == 'Parallel']
+            run = StateRun(len(runs), event['stateEnteredEventDetails']['name'], event_type[:-len('StateEntered')], timestamp,
+                           parents[-1] if parents else None)
+            runs.append(run)
+            open_runs.append(run)
+        elif event_type.endswith('StateExited'):
+            name = event['stateExitedEventDetails']['name']
+            run = next((r for r in reversed(open_runs) if r.name == name), None)
+            if run is not None:
+                run.exited_at = timestamp
+                open_runs.remove(run)
+        elif event_type.startswith('ParallelState'):
+            run = next((r for r in reversed(open_runs) if r.type == 'Parallel'), None)
+        else:
+            run = owners.get(event.get('previousEventId'))
+
+        if run is not None:
+            owners[event['id']] = run
+            if event_type in SCHEDULED_EVENTS:
+                run.attempts += 1
+            elif event_type.endswith('Failed') or event_type.endswith('TimedOut'):
+                run.failures += 1
+                run.last_attempt_failed = True
+            elif event_type.endswith('Succeeded'):
+                run.last_attempt_failed = False
+
+    return Execution(arn, status, started_at, stopped_at, runs, critical_path(events, owners, terminal_id))
+
+def critical_path(events, owners, terminal_id):
+    """Follow the previous events from the end of the execution, the runs met are on the critical path
+
+    For a parallel state, the event that closes it follows the branch that finished last.
+    """
+    previous = {e['id']: e.get('previousEventId') for e in events}
+    path = []
+    event_id = terminal_id
+    while event_id:
+        run = owners.get(event_id)
+        if run is not None and run not in path:
+            path.append(run)
+        event_id = previous.get(event_id)
+    return sorted(path, key=lambda r: r.order)
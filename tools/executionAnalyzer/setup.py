@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+from setuptools import find_packages, setup
+
+with open('requirements.txt') as f:
+    requirements = f.readlines()
+
+setup(
+    author="Jerome Van Der Linden",
+    license="MIT-0",
+    name="executionAnalyzer",
+    packages=find_packages(exclude=["tests"]),
+    install_requires=requirements,
+    setup_requires=["pytest-runner"],
+    test_suite="tests",
+    tests_require=["pytest", "pytest-cov"] + requirements,
+    entry_points={"console_scripts": ["execution-analyzer=analyzer.__main__:main"]},
+    version="0.1.2"
+)
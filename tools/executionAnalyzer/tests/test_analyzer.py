@@ -0,0 +1,130 @@
+import io
+import os
+import json
+import random
+import pytest
+from analyzer import analyze, build_timeline, read_files, LatencyHistogram
+from analyzer.__main__ import main
+
+RES = os.path.join(os.path.dirname(__file__), 'res')
+
+def load_mock_file(path):
+    with open(os.path.join(RES, path), 'r') as file:
+        return json.load(file)
+
+def test_happy_path_timeline():
+    execution = build_timeline(load_mock_file('happy_path.json')['events'])
+
+    assert execution.status == 'SUCCEEDED'
+    assert round(execution.duration_ms) == 1762
+    runs = {run.name: run for run in execution.runs}
+    assert runs['Validate Address'].retries == 1
+    assert runs['Extract info from ID'].parent is runs['Input checks']
+    assert runs['Notify Backends'].parent is runs['notifications']
+    assert round(runs['Extract info from ID'].duration_ms) == 1500
+
+def test_happy_path_critical_path_should_follow_slowest_branch():
+    execution = build_timeline(load_mock_file('happy_path.json')['events'])
+
+    assert [run.name for run in execution.critical_path] == [
+        'Input checks', 'Extract info from ID', 'Crosscheck Identity', 'Check user exists',
+        'Create User', 'notifications', 'Inform User of success']
+
+def test_caught_error_timeline():
+    execution = build_timeline(load_mock_file('address_error.json')['events'])
+
+    assert execution.status == 'FAILED'
+    runs = {run.name: run for run in execution.runs}
+    assert runs['Validate Address'].outcome == 'caught'
+    assert runs['Input checks'].outcome == 'failed'
+    assert [run.name for run in execution.critical_path] == [
+        'Input checks', 'Validate Address', 'Convert Address Error Cause to JSON',
+        'Inform User of an address error', 'Account creation failed, incorrect address']
+
+def test_express_logs_should_be_grouped_by_execution(tmp_path):
+    histories = [load_mock_file('happy_path.json'), load_mock_file('address_error.json')]
+    records = []
+    for history in histories:
+        for event in history['events']:
+            details = event.get('stateEnteredEventDetails') or event.get('stateExitedEventDetails') or {}
+            records.append({
+                'id': str(event['id']),
+                'previous_event_id': str(event['previousEventId']),
+                'type': event['type'],
+                'details': details,
+                'event_timestamp': event['timestamp'],
+                'execution_arn': history['executionArn']
+            })
+    # concurrent executions are interleaved in the logs
+    records.sort(key=lambda r: r['event_timestamp'])
+    logs = tmp_path / 'logs.jsonl'
+    logs.write_text('\n'.join(json.dumps(r) for r in records))
+
+    report = analyze(read_files([str(logs)]))
+
+    assert report.executions == 2
+    assert report.statuses == {'SUCCEEDED': 1, 'FAILED': 1}
+    assert report.states['Validate Address'].caught == 1
+    assert report.states['Validate Address'].retries == 1
+
+def test_histogram_percentiles_should_be_within_relative_error():
+    histogram = LatencyHistogram()
+    values = [random.uniform(10, 5000) for _ in range(20000)]
+    for value in values:
+        histogram.add(value)
+    values.sort()
+
+    for percent in (50, 95, 99):
+        expected = values[int(percent / 100 * (len(values) - 1))]
+        assert histogram.percentile(percent) == pytest.approx(expected, rel=0.02)
+    assert len(histogram.buckets) < 500
+
+def test_cli_report(tmp_path):
+    history = load_mock_file('happy_path.json')
+    with open(tmp_path / 'day.jsonl', 'w') as file:
+        for i in range(100):
+            file.write(json.dumps(dict(history, executionArn=f'arn:{i}')) + '\n')
+    out = io.StringIO()
+
+    main([str(tmp_path), os.path.join(RES, 'address_error.json'), '--format', 'json'], out)
+
+    report = json.loads(out.getvalue())
+    assert report['executions'] == 101
+    assert report['statuses'] == {'SUCCEEDED': 100, 'FAILED': 1}
+    assert report['critical_paths'][0]['count'] == 100
+    extract = next(s for s in report['states'] if s['state'] == 'Extract info from ID')
+    assert extract['p99'] == pytest.approx(1500, rel=0.01)
+    assert extract['critical'] == 100
+
+def test_cli_text_report():
+    out = io.StringIO()
+    main([os.path.join(RES, 'happy_path.json')], out)
+
+    assert 'Extract info from ID' in out.getvalue()
+    assert 'Input checks > Extract info from ID' in out.getvalue()
+
+def test_cli_without_input_should_fail():
+    with pytest.raises(SystemExit):
+        main([])
+
+def test_live_histories_should_be_paginated():
+    import boto3
+    from datetime import datetime
+    from botocore.stub import Stubber
+    from analyzer import read_live
+
+    sfn = boto3.client('stepfunctions', region_name='eu-west-1')
+    events = load_mock_file('happy_path.json')['events']
+    for event in events:
+        event['timestamp'] = datetime.fromisoformat(event['timestamp'])
+    with Stubber(sfn) as stubber:
+        stubber.add_response('list_executions', {'executions': [
+            {'executionArn': 'arn:aws:states:eu-west-1:123456789012:execution:sm:1', 'name': '1', 'status': 'SUCCEEDED',
+             'stateMachineArn': 'arn:aws:states:eu-west-1:123456789012:stateMachine:sm', 'startDate': datetime.now()}]})
+        stubber.add_response('get_execution_history', {'events': events[:10], 'nextToken': 'next'})
+        stubber.add_response('get_execution_history', {'events': events[10:]})
+
+        report = analyze(read_live(sfn, state_machine_arn='arn:aws:states:eu-west-1:123456789012:stateMachine:sm'))
+
+    assert report.executions == 1
+    assert report.statuses == {'SUCCEEDED': 1}
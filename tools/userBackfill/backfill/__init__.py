@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Backfill of the phonetic key (``name_key``) of the users created before the phonetic index
+
+The user table is scanned in parallel segments and the key of each user without one (or of all
+the users with ``recompute``, when the phonetic rules change) is written with a conditional
+update, so a user deleted in the meantime is not created again.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from common import phonetic
+
+class Progress:
+    """Counters of a backfill, updated by the segment threads"""
+
+    def __init__(self):
+        self.scanned = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.started_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, **counters):
+        with self.lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self.started_at
+        return {
+            'scanned': self.scanned,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'elapsed_s': round(elapsed, 1),
+            'users_per_s': round(self.scanned / elapsed, 1) if elapsed else None
+        }
+
+class Backfill:
+    """Write the phonetic key of the users of a table"""
+
+    def __init__(self, dynamodb, table_name, segments=4, recompute=False, dry_run=False, on_progress=None):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.segments = segments
+        self.recompute = recompute
+        self.dry_run = dry_run
+        self.on_progress = on_progress
+        self.progress = Progress()
+
+    def run(self):
+        """Backfill all the segments, return the progress"""
+        with ThreadPoolExecutor(max_workers=self.segments) as executor:
+            for _ in executor.map(self.backfill_segment, range(self.segments)):
+                if self.on_progress:
+                    self.on_progress(self.progress.as_dict())
+        return self.progress
+
+    def backfill_segment(self, segment):
+        scan = {
+            'TableName': self.table_name,
+            'Segment': segment,
+            'TotalSegments': self.segments,
+            'ProjectionExpression': 'id, lastname, firstname, name_key'
+        }
+        if not self.recompute:
+            scan['FilterExpression'] = 'attribute_not_exists(name_key)'
+        for page in self.dynamodb.get_paginator('scan').paginate(**scan):
+            self.progress.add(scanned=page['ScannedCount'])
+            for item in page['Items']:
+                self.backfill_user(item)
+
+    def backfill_user(self, item):
+        key = phonetic.name_key(item['lastname']['S'], item['firstname']['S'])
+        if item.get('name_key', {}).get('S') == key:
+            self.progress.add(unchanged=1)
+            return
+        if self.dry_run:
+            self.progress.add(updated=1)
+            return
+        try:
+            self.dynamodb.update_item(
+                TableName=self.table_name,
+                Key={'id': item['id'], 'lastname': item['lastname']},
+                UpdateExpression='SET name_key = :name_key',
+                ConditionExpression='attribute_exists(id)',
+                ExpressionAttributeValues={':name_key': {'S': key}}
+            )
+            self.progress.add(updated=1)
+        except self.dynamodb.exceptions.ConditionalCheckFailedException:
+            self.progress.add(unchanged=1) # deleted since the scan
+        except Exception: # pylint: disable=broad-except
+            self.progress.add(failed=1)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Command line interface of the user backfill
+
+    python -m backfill --table <user table> --segments 8
+    python -m backfill --table <user table> --recompute --dry-run
+"""
+import sys
+import json
+import argparse
+import boto3
+from . import Backfill
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='backfill', description=__doc__.splitlines()[0])
+    parser.add_argument('--table', required=True, help='name of the user table')
+    parser.add_argument('--segments', type=int, default=4, help='number of segments scanned in parallel')
+    parser.add_argument('--recompute', action='store_true', help='also update the users that already have a key')
+    parser.add_argument('--dry-run', action='store_true', help='count the users to update, without updating them')
+    return parser.parse_args(argv)
+
+def main(argv=None, out=None):
+    args = parse_args(argv)
+    out = out or sys.stderr
+    backfill = Backfill(boto3.client('dynamodb'), args.table,
+                        segments=args.segments,
+                        recompute=args.recompute,
+                        dry_run=args.dry_run,
+                        on_progress=lambda progress: print(json.dumps(progress), file=out))
+    progress = backfill.run()
+    return 1 if progress.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+from setuptools import find_packages, setup
+
+setup(
+    author="Jerome Van Der Linden",
+    license="MIT-0",
+    name="userBackfill",
+    packages=find_packages(exclude=["tests"]),
+    install_requires=["boto3"], # + common layer, see requirements.txt
+    setup_requires=["pytest-runner"],
+    test_suite="tests",
+    tests_require=["pytest", "pytest-cov", "moto"],
+    entry_points={"console_scripts": ["user-backfill=backfill.__main__:main"]},
+    version="0.1.2"
+)
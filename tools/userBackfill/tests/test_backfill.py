@@ -0,0 +1,69 @@
+import os
+import json
+from unittest import mock
+import boto3
+import pytest
+from moto import mock_aws
+from common import phonetic
+from backfill import Backfill
+from backfill.__main__ import main
+
+USERS = [('Berthier', 'Corinne'), ('Lefèvre', 'Chloé'), ('Le Gall', 'Jean-Pierre'), ('Martin', 'Jeanne'),
+         ('Dupont', 'Philippe')]
+
+@pytest.fixture
+def dynamodb():
+    with mock.patch.dict(os.environ, {'AWS_DEFAULT_REGION': 'eu-west-1'}), mock_aws():
+        client = boto3.client('dynamodb')
+        client.create_table(
+            TableName='users',
+            KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}, {'AttributeName': 'lastname', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'},
+                                  {'AttributeName': 'lastname', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST')
+        for i, (lastname, firstname) in enumerate(USERS):
+            client.put_item(TableName='users', Item={'id': {'S': str(i)}, 'lastname': {'S': lastname},
+                                                    'firstname': {'S': firstname}})
+        yield client
+
+def name_keys(client):
+    items = client.scan(TableName='users')['Items']
+    return {item['id']['S']: item.get('name_key', {}).get('S') for item in items}
+
+def test_backfill_should_write_the_missing_keys(dynamodb):
+    dynamodb.update_item(TableName='users', Key={'id': {'S': '0'}, 'lastname': {'S': 'Berthier'}},
+                         UpdateExpression='SET name_key = :key', ExpressionAttributeValues={':key': {'S': 'old'}})
+
+    progress = Backfill(dynamodb, 'users', segments=3).run()
+
+    assert (progress.scanned, progress.updated, progress.failed) == (5, 4, 0)
+    keys = name_keys(dynamodb)
+    assert keys['0'] == 'old' # only the missing keys
+    assert keys['2'] == phonetic.name_key('Le Gall', 'Jean-Pierre')
+
+def test_recompute_should_update_the_outdated_keys(dynamodb):
+    Backfill(dynamodb, 'users').run()
+    dynamodb.update_item(TableName='users', Key={'id': {'S': '0'}, 'lastname': {'S': 'Berthier'}},
+                         UpdateExpression='SET name_key = :key', ExpressionAttributeValues={':key': {'S': 'old'}})
+
+    progress = Backfill(dynamodb, 'users', recompute=True).run()
+
+    assert (progress.updated, progress.unchanged) == (1, 4)
+    assert name_keys(dynamodb)['0'] == 'BRT#KRN'
+
+def test_deleted_user_should_not_be_created_again(dynamodb):
+    backfill = Backfill(dynamodb, 'users')
+    item = dynamodb.get_item(TableName='users', Key={'id': {'S': '0'}, 'lastname': {'S': 'Berthier'}})['Item']
+    dynamodb.delete_item(TableName='users', Key={'id': {'S': '0'}, 'lastname': {'S': 'Berthier'}})
+
+    backfill.backfill_user(item)
+
+    assert backfill.progress.unchanged == 1
+    assert '0' not in name_keys(dynamodb)
+
+def test_cli_dry_run_should_report_progress(dynamodb, capsys):
+    code = main(['--table', 'users', '--segments', '2', '--dry-run'])
+
+    assert code == 0
+    assert json.loads(capsys.readouterr().err.splitlines()[-1])['updated'] == 5
+    assert set(name_keys(dynamodb).values()) == {None}
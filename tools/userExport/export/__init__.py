@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Export of the users created in a time range
+
+The ids of the users are ULIDs prefixed with their shard (see createUser and common.ulid), the
+``created`` index of the user table is partitioned by shard and sorted by id: the users of a time
+range are read with one query per shard, run in parallel, and merged by creation time.
+"""
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.types import TypeDeserializer
+from common import ulid
+
+class Export:
+    """Read the users of a time range from the 'created' index"""
+
+    def __init__(self, dynamodb, table_name, shards=8, index_name='created'):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.shards = shards
+        self.index_name = index_name
+        self.deserializer = TypeDeserializer()
+        self.read = 0
+        self.lock = threading.Lock()
+
+    def run(self, since, until):
+        """Users created between since and until (datetimes, included), oldest first"""
+        with ThreadPoolExecutor(max_workers=self.shards) as executor:
+            shards = list(executor.map(lambda shard: self.query_shard('%02d' % shard, since, until), range(self.shards)))
+        return heapq.merge(*shards, key=lambda user: user['id'].split('-', 1)[1])
+
+    def query_shard(self, shard, since, until):
+        """Users of a shard created in the time range, oldest first"""
+        prefix = shard + '-'
+        query = {
+            'TableName': self.table_name,
+            'IndexName': self.index_name,
+            'KeyConditionExpression': 'shard = :shard AND id BETWEEN :since AND :until',
+            'ExpressionAttributeValues': {
+                ':shard': {'S': shard},
+                ':since': {'S': ulid.lower_bound(since, prefix)},
+                ':until': {'S': ulid.upper_bound(until, prefix)}
+            }
+        }
+        users = []
+        for page in self.dynamodb.get_paginator('query').paginate(**query):
+            users.extend({name: self.deserializer.deserialize(value) for name, value in item.items()}
+                         for item in page['Items'])
+        with self.lock:
+            self.read += len(users)
+        return users
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Copyright 2022 Amazon Web Services
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""Command line interface of the user export
+
+    python -m export --table <user table> --since 2022-03-01T00:00:00+00:00 > users.jsonl
+    python -m export --table <user table> --since 2022-03-01 --until 2022-03-02 --output users.jsonl
+"""
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+import boto3
+from . import Export
+
+def moment(text):
+    value = datetime.fromisoformat(text)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='export', description=__doc__.splitlines()[0])
+    parser.add_argument('--table', required=True, help='name of the user table')
+    parser.add_argument('--since', type=moment, required=True, help='ISO date of the oldest users (UTC by default)')
+    parser.add_argument('--until', type=moment, default=datetime.now(timezone.utc), help='ISO date of the newest users')
+    parser.add_argument('--shards', type=int, default=8, help='number of shards (USER_SHARDS of createUser)')
+    parser.add_argument('--output', help='JSONL file of the users, standard output by default')
+    return parser.parse_args(argv)
+
+def serialize(value):
+    return sorted(value) if isinstance(value, set) else str(value)
+
+def main(argv=None, out=None):
+    args = parse_args(argv)
+    out = out or sys.stderr
+    start = time.monotonic()
+    export = Export(boto3.client('dynamodb'), args.table, shards=args.shards)
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for user in export.run(args.since, args.until):
+            output.write(json.dumps(user, default=serialize) + '\n')
+    finally:
+        if args.output:
+            output.close()
+    print(json.dumps({'exported': export.read, 'elapsed_s': round(time.monotonic() - start, 1)}), file=out)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
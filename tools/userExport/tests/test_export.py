@@ -0,0 +1,90 @@
+import os
+import json
+import time
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+import boto3
+import pytest
+from moto import mock_aws
+from common import ulid
+from export import Export
+from export.__main__ import main
+
+START = datetime(2022, 3, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def dynamodb():
+    with mock.patch.dict(os.environ, {'AWS_DEFAULT_REGION': 'eu-west-1'}), mock_aws():
+        client = boto3.client('dynamodb')
+        client.create_table(
+            TableName='users',
+            KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}, {'AttributeName': 'lastname', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': name, 'AttributeType': 'S'} for name in ('id', 'lastname', 'shard')],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'created',
+                'KeySchema': [{'AttributeName': 'shard', 'KeyType': 'HASH'}, {'AttributeName': 'id', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
+            BillingMode='PAY_PER_REQUEST')
+        yield client
+
+def create_users(client, count, days, shards=8):
+    """Users created like createUser does, spread over days"""
+    moments = [START + timedelta(days=days) * i / count for i in range(count)]
+    clock = iter(moment.timestamp() for moment in moments)
+    generator = ulid.Generator(clock=lambda: next(clock))
+    for i, moment in enumerate(moments):
+        shard = ulid.shard_of(f'request-{i}', shards)
+        client.put_item(TableName='users', Item={
+            'id': {'S': generator.new(shard + '-')}, 'lastname': {'S': f'Berthier{i}'}, 'shard': {'S': shard},
+            'created_at': {'S': moment.isoformat()}, 'duplicate_of': {'SS': ['a', 'b']}
+        })
+
+def test_export_should_return_the_users_of_the_range_oldest_first(dynamodb):
+    create_users(dynamodb, 100, days=10)
+    export = Export(dynamodb, 'users')
+
+    users = list(export.run(START + timedelta(days=2), START + timedelta(days=4)))
+
+    assert [user['lastname'] for user in users] == [f'Berthier{i}' for i in range(20, 41)]
+    assert export.read == 21
+    assert len({user['shard'] for user in users}) > 1
+
+def test_cli_should_write_jsonl(dynamodb, tmp_path, capsys):
+    create_users(dynamodb, 20, days=1)
+
+    code = main(['--table', 'users', '--since', '2022-03-01T12:00:00', '--until', '2022-03-02',
+                 '--output', str(tmp_path / 'users.jsonl')])
+
+    assert code == 0
+    users = [json.loads(line) for line in (tmp_path / 'users.jsonl').read_text().splitlines()]
+    assert [user['lastname'] for user in users] == [f'Berthier{i}' for i in range(10, 20)]
+    assert users[0]['duplicate_of'] == ['a', 'b']
+    assert json.loads(capsys.readouterr().err)['exported'] == 10
+
+def test_benchmark_export_vs_scan(dynamodb):
+    """Users of 1 day out of 30, sharded queries vs scan (run with -s to see the results)
+
+    Items read are what DynamoDB bills and what the time depends on; the time measured with moto,
+    which filters a whole index for each query, is not representative.
+    """
+    create_users(dynamodb, 3000, days=30)
+    since, until = START + timedelta(days=10), START + timedelta(days=11)
+
+    start = time.perf_counter()
+    export = Export(dynamodb, 'users')
+    exported = list(export.run(since, until))
+    query_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scanned, found = 0, []
+    for page in dynamodb.get_paginator('scan').paginate(
+            TableName='users', FilterExpression='created_at BETWEEN :since AND :until',
+            ExpressionAttributeValues={':since': {'S': since.isoformat()}, ':until': {'S': until.isoformat()}}):
+        scanned += page['ScannedCount']
+        found.extend(page['Items'])
+    scan_seconds = time.perf_counter() - start
+
+    print(f"\nexport: {len(exported)} users read in {query_seconds * 1000:.0f}ms, "
+          f"scan: {scanned} users read for {len(found)} in {scan_seconds * 1000:.0f}ms")
+    assert len(exported) == len(found) == export.read